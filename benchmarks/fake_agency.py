@@ -0,0 +1,228 @@
+import random
+import threading
+import time
+import uuid
+
+import requests
+from flask import Flask, jsonify, request, Response
+from werkzeug.exceptions import Unauthorized, NotFound, InternalServerError
+from werkzeug.serving import make_server
+
+AUTHORIZATION_COOKIE_KEY = 'authorization_cookie'
+
+
+class FakeAgency:
+    def __init__(
+        self, latency=0.0, failure_rate=0.0, batch_failure_rate=0.0, queue_time=0.5, run_time=2.0, nodes=None,
+        result_outputs=1
+    ):
+        """
+        A local stand-in for cc-agency. Accepts red submissions and simulates the connectors of the started
+        containers: the input notebook is fetched from the jupyter service and a result notebook is posted back.
+
+        :param latency: The mean latency in seconds, that is added to every agency request
+        :type latency: float
+        :param failure_rate: The probability that an agency request fails with status code 500
+        :type failure_rate: float
+        :param batch_failure_rate: The probability that a started batch fails instead of posting a result
+        :type batch_failure_rate: float
+        :param queue_time: The seconds a batch waits, before its container fetches the input notebook
+        :type queue_time: float
+        :param run_time: The seconds between fetching the input notebook and posting the result
+        :type run_time: float
+        :param nodes: The nodes returned by the /nodes endpoint. Defaults to one node with one gpu.
+        :type nodes: list[dict] or None
+        :param result_outputs: The number of outputs added to every code cell of the result notebook
+        :type result_outputs: int
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.batch_failure_rate = batch_failure_rate
+        self.queue_time = queue_time
+        self.run_time = run_time
+        self.nodes = nodes if nodes is not None else [
+            {'nodeName': 'node1', 'state': 'online', 'ram': 256000, 'cpus': 32, 'gpus': [{'id': 0, 'vram': 16000}]}
+        ]
+        self.result_outputs = result_outputs
+
+        self.batches = {}
+        self.cookies = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.app = self._create_app()
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(self._server.host, self._server.port)
+
+    def start(self, host='127.0.0.1', port=0):
+        self._server = make_server(host, port, self.app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _simulate_request(self):
+        if self.latency > 0:
+            time.sleep(random.expovariate(1.0 / self.latency))
+        if random.random() < self.failure_rate:
+            raise InternalServerError('Simulated agency failure')
+
+    def _check_cookie(self):
+        if request.cookies.get(AUTHORIZATION_COOKIE_KEY) not in self.cookies:
+            raise Unauthorized('Invalid authorization cookie')
+
+    def _get_batch(self, batch_id):
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            raise NotFound('Batch {} not found'.format(batch_id))
+        return batch
+
+    def _nodes_with_batches(self):
+        nodes = []
+        with self._lock:
+            running_batches = [batch for batch in self.batches.values() if batch['state'] == 'processing']
+        for node in self.nodes:
+            node = dict(node)
+            node['currentBatches'] = [
+                {'batchId': batch['_id'], 'ram': batch['ram'], 'usedGPUs': batch['usedGPUs']}
+                for batch in running_batches
+                if batch['node'] == node['nodeName']
+            ]
+            nodes.append(node)
+        return nodes
+
+    def _create_app(self):
+        app = Flask(__name__)
+
+        @app.route('/nodes', methods=['GET'])
+        def nodes():
+            self._simulate_request()
+            if request.authorization is None:
+                self._check_cookie()
+                response = jsonify(self._nodes_with_batches())
+            else:
+                response = jsonify(self._nodes_with_batches())
+                cookie = str(uuid.uuid4())
+                self.cookies.add(cookie)
+                response.set_cookie(AUTHORIZATION_COOKIE_KEY, cookie)
+            return response
+
+        @app.route('/red', methods=['POST'])
+        def post_red():
+            self._simulate_request()
+            self._check_cookie()
+            red_data = request.json
+            experiment_id = str(uuid.uuid4())
+            batch = {
+                '_id': str(uuid.uuid4()),
+                'experimentId': experiment_id,
+                'state': 'processing',
+                'node': self.nodes[0]['nodeName'],
+                'ram': red_data['container']['settings'].get('ram', 0),
+                'usedGPUs': [],
+                'history': [{'state': 'registered', 'time': time.time(), 'debugInfo': None}],
+                'stderr': ''
+            }
+            with self._lock:
+                self.batches[batch['_id']] = batch
+            threading.Thread(target=self._run_batch, args=(batch, red_data), daemon=True).start()
+            return jsonify({'experimentId': experiment_id})
+
+        @app.route('/batches', methods=['GET'])
+        def get_batches():
+            self._simulate_request()
+            self._check_cookie()
+            experiment_id = request.args.get('experimentId')
+            with self._lock:
+                batches = [
+                    {'_id': batch['_id'], 'experimentId': batch['experimentId'], 'state': batch['state']}
+                    for batch in self.batches.values()
+                    if experiment_id is None or batch['experimentId'] == experiment_id
+                ]
+            return jsonify(batches)
+
+        @app.route('/batches/<batch_id>', methods=['GET'])
+        def get_batch(batch_id):
+            self._simulate_request()
+            self._check_cookie()
+            batch = self._get_batch(batch_id)
+            return jsonify({'_id': batch['_id'], 'state': batch['state'], 'history': batch['history']})
+
+        @app.route('/batches/<batch_id>', methods=['DELETE'])
+        def delete_batch(batch_id):
+            self._simulate_request()
+            self._check_cookie()
+            batch = self._get_batch(batch_id)
+            with self._lock:
+                if batch['state'] == 'processing':
+                    batch['state'] = 'cancelled'
+            return jsonify({'_id': batch_id, 'state': batch['state']})
+
+        @app.route('/batches/<batch_id>/stderr', methods=['GET'])
+        def get_batch_stderr(batch_id):
+            self._simulate_request()
+            self._check_cookie()
+            return Response(self._get_batch(batch_id)['stderr'], mimetype='text/plain')
+
+        return app
+
+    def _finish_batch(self, batch, state, debug_info=None, stderr=''):
+        with self._lock:
+            if batch['state'] != 'processing':
+                return
+            batch['state'] = state
+            batch['stderr'] = stderr
+            batch['history'].append({'state': state, 'time': time.time(), 'debugInfo': debug_info})
+
+    def _run_batch(self, batch, red_data):
+        """
+        Simulates the container of a batch like the red connectors would do.
+        """
+        time.sleep(self.queue_time)
+        input_access = red_data['inputs']['inputNotebook']['connector']['access']
+        output_access = red_data['outputs']['outputNotebook']['connector']['access']
+        try:
+            r = requests.get(
+                input_access['url'],
+                auth=(input_access['auth']['username'], input_access['auth']['password'])
+            )
+            r.raise_for_status()
+            notebook = r.json()
+
+            requirements = red_data['inputs'].get('pythonRequirements')
+            if requirements is not None:
+                requirements_access = requirements['connector']['access']
+                requests.get(
+                    requirements_access['url'],
+                    auth=(requirements_access['auth']['username'], requirements_access['auth']['password'])
+                ).raise_for_status()
+
+            time.sleep(self.run_time)
+            if batch['state'] != 'processing':
+                return
+
+            if random.random() < self.batch_failure_rate:
+                self._finish_batch(batch, 'failed', stderr='Simulated notebook failure\n')
+                return
+
+            for cell in notebook.get('cells', []):
+                if cell.get('cell_type') == 'code':
+                    cell['outputs'] = [
+                        {'output_type': 'stream', 'name': 'stdout', 'text': ['simulated output\n']}
+                        for _ in range(self.result_outputs)
+                    ]
+            r = requests.post(
+                output_access['url'],
+                json=notebook,
+                auth=(output_access['auth']['username'], output_access['auth']['password'])
+            )
+            r.raise_for_status()
+        except requests.RequestException as e:
+            self._finish_batch(batch, 'failed', debug_info='Connector failed: {}'.format(str(e)))
+            return
+
+        self._finish_batch(batch, 'succeeded')
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark of the jupyter service.
+
+Starts the service created by create_app() and a FakeAgency on localhost and simulates users, that submit notebooks,
+poll the result list like the browser does and download the results. Reports latency percentiles and throughput per
+endpoint.
+
+Example:
+    python benchmarks/load_test.py --users 20 --duration 120 --output load.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_agency import FakeAgency  # noqa: E402
+
+POLL_INTERVAL = 4.0  # the refresh interval of the frontend
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self._samples = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self._samples.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+
+    def report(self, duration):
+        report = {}
+        with self._lock:
+            for endpoint, samples in sorted(self._samples.items()):
+                samples = sorted(samples)
+                report[endpoint] = {
+                    'requests': len(samples),
+                    'errors': self._errors.get(endpoint, 0),
+                    'requests_per_second': len(samples) / duration,
+                    'p50': percentile(samples, 50),
+                    'p95': percentile(samples, 95),
+                    'p99': percentile(samples, 99),
+                    'max': samples[-1]
+                }
+        return report
+
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, int(round(p / 100.0 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def create_notebook(num_cells, cell_source_size):
+    source = '# ' + 'x' * max(0, cell_source_size - 2)
+    return {
+        'cells': [
+            {'cell_type': 'code', 'execution_count': None, 'metadata': {}, 'outputs': [], 'source': [source]}
+            for _ in range(num_cells)
+        ],
+        'metadata': {},
+        'nbformat': 4,
+        'nbformat_minor': 4
+    }
+
+
+class SimulatedUser(threading.Thread):
+    def __init__(self, index, service_url, agency_url, recorder, args, stop_time):
+        super().__init__(daemon=True)
+        self.index = index
+        self.service_url = service_url
+        self.agency_url = agency_url
+        self.recorder = recorder
+        self.args = args
+        self.stop_time = stop_time
+        self.session = requests.Session()
+        self.downloaded = set()
+
+    def request(self, endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        response = None
+        try:
+            response = self.session.request(method, self.service_url + path, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            pass
+        self.recorder.record(endpoint, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    def run(self):
+        self.request('POST /auth/login', 'POST', 'auth/login', data={
+            'agencyUrl': self.agency_url,
+            'agencyUsername': 'user{}'.format(self.index),
+            'agencyPassword': 'password'
+        })
+        notebook = create_notebook(self.args.cells, self.args.cell_size)
+        next_submission = time.time()
+        while time.time() < self.stop_time:
+            if time.time() >= next_submission:
+                self.request('POST /executeNotebook', 'POST', 'executeNotebook', json={
+                    'jupyterNotebooks': [
+                        {'data': notebook, 'filename': 'benchmark{}.ipynb'.format(i)}
+                        for i in range(self.args.notebooks_per_submission)
+                    ],
+                    'dependencies': {'custom': True, 'predefinedImage': '', 'customImage': 'benchmark-image'},
+                    'pythonRequirements': None,
+                    'gpuRequirements': [],
+                    'externalData': []
+                })
+                next_submission = time.time() + random.expovariate(1.0 / self.args.submission_interval)
+
+            response = self.request('GET /list_results', 'GET', 'list_results')
+            if response is not None:
+                for entry in response.json():
+                    notebook_id = entry['notebook_id']
+                    if entry['process_status'] == 'success' and notebook_id not in self.downloaded:
+                        self.downloaded.add(notebook_id)
+                        self.request('GET /result/<id>', 'GET', 'result/{}'.format(notebook_id))
+            time.sleep(POLL_INTERVAL)
+
+
+def start_service(work_directory):
+    """
+    Creates the configuration in the given directory and starts the jupyter service from create_app().
+
+    :return: The server and the url of the service
+    """
+    notebook_directory = os.path.join(work_directory, 'notebooks')
+    with open(os.path.join(work_directory, 'cc-jupyter-service-config.yml'), 'w') as f:
+        f.write('notebookDirectory: {}\nflaskSecretKey: benchmark\npreventLocalhost: false\n'.format(
+            json.dumps(notebook_directory)
+        ))
+    os.chdir(work_directory)
+
+    from cc_jupyter_service.service.app import create_app
+    from cc_jupyter_service.service.db import init_db
+
+    app = create_app()
+    app.config['DATABASE'] = os.path.join(work_directory, 'benchmark.sqlite')
+    with app.app_context():
+        init_db()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}/'.format(server.port)
+
+
+def print_report(report):
+    print('{:<26} {:>9} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        'endpoint', 'requests', 'errors', 'req/s', 'p50', 'p95', 'p99'
+    ))
+    for endpoint, stats in report['endpoints'].items():
+        print('{:<26} {:>9} {:>7} {:>9.2f} {:>9.4f} {:>9.4f} {:>9.4f}'.format(
+            endpoint, stats['requests'], stats['errors'], stats['requests_per_second'], stats['p50'], stats['p95'],
+            stats['p99']
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end load benchmark of the jupyter service')
+    parser.add_argument('--users', type=int, default=10, help='Number of simulated users')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to generate load')
+    parser.add_argument('--submission-interval', type=float, default=20, help='Mean seconds between submissions')
+    parser.add_argument('--notebooks-per-submission', type=int, default=1)
+    parser.add_argument('--cells', type=int, default=20, help='Number of cells per notebook')
+    parser.add_argument('--cell-size', type=int, default=1000, help='Source bytes per cell')
+    parser.add_argument('--agency-latency', type=float, default=0.05, help='Mean latency of agency requests')
+    parser.add_argument('--agency-failure-rate', type=float, default=0.0)
+    parser.add_argument('--batch-failure-rate', type=float, default=0.05)
+    parser.add_argument('--queue-time', type=float, default=1.0, help='Seconds a batch waits in the agency queue')
+    parser.add_argument('--run-time', type=float, default=5.0, help='Seconds a notebook runs')
+    parser.add_argument('--result-outputs', type=int, default=1, help='Outputs per code cell of the result')
+    parser.add_argument('--output', help='Write the report as json to this file')
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    agency = FakeAgency(
+        latency=args.agency_latency, failure_rate=args.agency_failure_rate, batch_failure_rate=args.batch_failure_rate,
+        queue_time=args.queue_time, run_time=args.run_time, result_outputs=args.result_outputs
+    )
+    agency.start()
+
+    with tempfile.TemporaryDirectory() as work_directory:
+        server, service_url = start_service(work_directory)
+
+        recorder = LatencyRecorder()
+        start_time = time.time()
+        stop_time = start_time + args.duration
+        users = [SimulatedUser(i, service_url, agency.url, recorder, args, stop_time) for i in range(args.users)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        duration = time.time() - start_time
+
+        server.shutdown()
+        agency.stop()
+
+    report = {
+        'parameters': vars(args),
+        'duration': duration,
+        'endpoints': recorder.report(duration)
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the storage, database and serialization primitives of the jupyter service.
+
+Every benchmark is run repeatedly and the results are written as json, so results of different branches can be
+compared with --compare.
+
+Example:
+    python benchmarks/micro_benchmarks.py --output master.json
+    python benchmarks/micro_benchmarks.py --output branch.json --compare master.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from werkzeug.security import generate_password_hash, check_password_hash  # noqa: E402
+
+from cc_jupyter_service.common.execution import _create_red_data  # noqa: E402
+from cc_jupyter_service.common.execution_profile import ExecutionProfile, CellProfile  # noqa: E402
+from cc_jupyter_service.common.notebook_database import NotebookDatabase  # noqa: E402
+from cc_jupyter_service.common.result_index import CellIndexEntry, OutputIndexEntry  # noqa: E402
+from cc_jupyter_service.common.result_summary import ResultSummary  # noqa: E402
+from cc_jupyter_service.service.db import DatabaseAPI  # noqa: E402
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cc_jupyter_service', 'service',
+                           'schema.sql')
+DEFAULT_NOTEBOOK_SIZES = [10 * 1024, 1024 ** 2, 100 * 1024 ** 2]
+DEFAULT_ROW_COUNTS = [10 ** 3, 10 ** 4, 10 ** 5]
+DEFAULT_EXTERNAL_DATA_COUNTS = [10, 100, 1000]
+USERS_PER_ROW_COUNT = 100
+
+
+class BenchmarkRunner:
+    def __init__(self, min_time, min_iterations):
+        """
+        Runs benchmark functions repeatedly until min_time seconds passed and at least min_iterations runs are done.
+        """
+        self.min_time = min_time
+        self.min_iterations = min_iterations
+        self.results = []
+
+    def run(self, name, parameters, function, setup=None):
+        """
+        :param name: The name of the benchmark
+        :type name: str
+        :param parameters: The parameters of this run, for example the notebook size
+        :type parameters: dict
+        :param function: The function to measure. Gets the return value of setup as argument, if setup is given.
+        :param setup: A function, that is called before every run and is not measured
+        """
+        durations = []
+        start = time.perf_counter()
+        while len(durations) < self.min_iterations or time.perf_counter() - start < self.min_time:
+            argument = setup() if setup is not None else None
+            run_start = time.perf_counter()
+            if setup is not None:
+                function(argument)
+            else:
+                function()
+            durations.append(time.perf_counter() - run_start)
+
+        result = {
+            'name': name,
+            'parameters': parameters,
+            'iterations': len(durations),
+            'mean': statistics.mean(durations),
+            'median': statistics.median(durations),
+            'min': min(durations),
+            'stdev': statistics.stdev(durations) if len(durations) > 1 else 0.0
+        }
+        self.results.append(result)
+        print('{:<40} {:<28} {:>7} {:>12.6f} {:>12.6f}'.format(
+            name, json.dumps(parameters, sort_keys=True), result['iterations'], result['median'], result['min']
+        ), flush=True)
+
+
+def create_notebook_data(size):
+    """
+    Creates a notebook, that is approximately size bytes large, when serialized.
+    """
+    cell_size = min(size, 64 * 1024)
+    cell = {
+        'cell_type': 'code', 'execution_count': 1, 'metadata': {},
+        'outputs': [{'output_type': 'stream', 'name': 'stdout', 'text': ['x' * cell_size]}],
+        'source': ['print("x")']
+    }
+    return {
+        'cells': [cell] * max(1, size // cell_size),
+        'metadata': {},
+        'nbformat': 4,
+        'nbformat_minor': 4
+    }
+
+
+def benchmark_notebook_database(runner, work_directory, sizes):
+    notebook_database = NotebookDatabase(os.path.join(work_directory, 'notebooks'))
+    for size in sizes:
+        parameters = {'size': size}
+        notebook_data = create_notebook_data(size)
+        notebook_id = str(uuid.uuid4())
+
+        runner.run('NotebookDatabase.save_notebook', parameters,
+                   lambda: notebook_database.save_notebook(notebook_data, notebook_id))
+        runner.run('NotebookDatabase.get_notebook', parameters,
+                   lambda: notebook_database.get_notebook(notebook_id))
+
+        def read_notebook_file():
+            with notebook_database.open_notebook_file(notebook_id) as notebook_file:
+                while notebook_file.read(1024 * 1024):
+                    pass
+
+        runner.run('NotebookDatabase.open_notebook_file', parameters, read_notebook_file)
+        os.remove(notebook_database.notebook_id_to_path(notebook_id, False))
+
+
+def create_database(path, row_count):
+    """
+    Creates a database at the given path, that contains row_count notebooks and one cookie per user.
+
+    :return: The database api and the list of notebook ids
+    :rtype: tuple[DatabaseAPI, list[str]]
+    """
+    db = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+    with open(SCHEMA_PATH, 'r') as f:
+        db.executescript(f.read())
+
+    user_count = min(USERS_PER_ROW_COUNT, row_count)
+    db.executemany(
+        'INSERT INTO user (agency_username, agency_url) VALUES (?, ?)',
+        [('user{}'.format(i), 'https://agency.example/') for i in range(user_count)]
+    )
+    token_hash = generate_password_hash('token')
+    notebook_ids = [str(uuid.uuid4()) for _ in range(row_count)]
+    db.executemany(
+        'INSERT INTO notebook (notebook_id, notebook_token, experiment_id, status, notebook_filename, execution_time, '
+        'user_id, agency_url) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        [
+            (notebook_id, '{}{}'.format(token_hash, i), str(uuid.uuid4()), i % 4, 'notebook.ipynb', i,
+             i % user_count + 1, 'https://agency.example/')
+            for i, notebook_id in enumerate(notebook_ids)
+        ]
+    )
+    db.executemany(
+        'INSERT INTO cookie (cookie_text, creation_time, user_id, agency_url) VALUES (?, ?, ?, ?)',
+        [(str(uuid.uuid4()), float(i), i + 1, 'https://agency.example/') for i in range(user_count)]
+    )
+    db.commit()
+    return DatabaseAPI(db), notebook_ids
+
+
+def _create_notebook_ids(database_api, user_id, count, status=DatabaseAPI.NotebookStatus.PROCESSING):
+    """
+    Creates count new notebooks of the given user, that are queued, if the status is QUEUED.
+
+    :return: The ids of the created notebooks
+    :rtype: list[str]
+    """
+    notebook_ids = []
+    for _ in range(count):
+        notebook_id = str(uuid.uuid4())
+        database_api.create_notebook(
+            notebook_id, None, user_id, str(uuid.uuid4()), 'new.ipynb', int(time.time()), 'https://agency.example/',
+            status=status, docker_image='image'
+        )
+        if status == DatabaseAPI.NotebookStatus.QUEUED:
+            database_api.queue_notebook(notebook_id, user_id, {'dockerImage': 'image', 'gpuRequirements': None})
+        notebook_ids.append(notebook_id)
+    return notebook_ids
+
+
+def benchmark_database_api(runner, work_directory, row_counts):
+    """
+    Benchmarks every public method of DatabaseAPI. Methods, that change a notebook only once, like the release of a
+    queued notebook, get a new notebook from their setup function in every run.
+
+    :raise ValueError: If a public method of DatabaseAPI is not benchmarked
+    """
+    benchmarked_methods = set()
+
+    def run(name, parameters, function, setup=None):
+        benchmarked_methods.add(name.split('(', 1)[0])
+        runner.run('DatabaseAPI.{}'.format(name), parameters, function, setup)
+
+    for row_count in row_counts:
+        path = os.path.join(work_directory, 'benchmark{}.sqlite'.format(row_count))
+        database_api, notebook_ids = create_database(path, row_count)
+        parameters = {'rows': row_count}
+        notebook_id = notebook_ids[len(notebook_ids) // 2]
+        user_id = 1
+
+        def new_notebook():
+            return _create_notebook_ids(database_api, user_id, 1)[0]
+
+        def new_started_notebook():
+            started_notebook_id = new_notebook()
+            database_api.record_lifecycle_event(started_notebook_id, 'started', time.time() - 60)
+            return started_notebook_id
+
+        def new_queued_notebook():
+            return _create_notebook_ids(database_api, user_id, 1, DatabaseAPI.NotebookStatus.QUEUED)[0]
+
+        # notebooks
+        run('create_notebook', parameters, lambda: database_api.create_notebook(
+            str(uuid.uuid4()), str(uuid.uuid4()), user_id, str(uuid.uuid4()), 'new.ipynb', int(time.time()),
+            'https://agency.example/'
+        ))
+        run('update_notebook_status', parameters, lambda: database_api.update_notebook_status(
+            notebook_id, DatabaseAPI.NotebookStatus.PROCESSING
+        ))
+        # the final status records the finished event and updates the usage rollups
+        run('update_notebook_status(final)', parameters, lambda started_notebook_id: (
+            database_api.update_notebook_status(started_notebook_id, DatabaseAPI.NotebookStatus.SUCCESS)
+        ), new_started_notebook)
+        run('cancel_processing_notebooks', parameters, database_api.cancel_processing_notebooks,
+            lambda: _create_notebook_ids(database_api, user_id, 10))
+        run('set_notebook_token', parameters, lambda: database_api.set_notebook_token(notebook_id, 'token'))
+        run('get_notebook', parameters, lambda: database_api.get_notebook(notebook_id))
+        run('get_notebooks', parameters, lambda: database_api.get_notebooks(user_id))
+        run('get_notebooks(status)', parameters, lambda: database_api.get_notebooks(
+            user_id, DatabaseAPI.NotebookStatus.PROCESSING
+        ))
+
+        # debug info
+        run('update_notebook_debug_info', parameters,
+            lambda: database_api.update_notebook_debug_info(notebook_id, 'debug info\n' * 1000))
+        run('get_debug_info', parameters, lambda: database_api.get_debug_info(notebook_id))
+        run('get_debug_info_sizes', parameters, lambda: database_api.get_debug_info_sizes(user_id))
+
+        # lifecycle and usage rollups
+        run('record_lifecycle_event', parameters, lambda new_notebook_id: database_api.record_lifecycle_event(
+            new_notebook_id, 'started'
+        ), new_notebook)
+        run('get_lifecycle', parameters, lambda: database_api.get_lifecycle(notebook_id))
+        run('get_lifecycles', parameters, lambda: database_api.get_lifecycles(user_id))
+        run('get_usage_rollups', parameters, lambda: database_api.get_usage_rollups('1970-01-01'))
+        run('get_runtime_buckets', parameters, lambda: database_api.get_runtime_buckets('1970-01-01'))
+
+        # progress and profiles
+        run('update_notebook_progress', parameters,
+            lambda: database_api.update_notebook_progress(notebook_id, 1, 10, 1.0))
+        run('get_notebook_progress', parameters, lambda: database_api.get_notebook_progress(notebook_id))
+        run('get_progresses', parameters, lambda: database_api.get_progresses(user_id))
+        execution_profile = ExecutionProfile(1.0, 10.0, [CellProfile(i, 1.0, 0.5, 1024 ** 2) for i in range(100)])
+        run('save_execution_profile', parameters,
+            lambda: database_api.save_execution_profile(notebook_id, execution_profile))
+        run('get_execution_profile', parameters, lambda: database_api.get_execution_profile(notebook_id))
+        run('get_cell_profile_summary', parameters,
+            lambda: database_api.get_cell_profile_summary(user_id, 'notebook.ipynb'))
+
+        # result index and summaries
+        cell_entries = [
+            CellIndexEntry(i, 'code', i * 1000, 1000, i * 1000 + 10, 100, [
+                OutputIndexEntry(i, j, 'display_data', ['text/plain', 'image/png'], i * 1000 + 200 + j * 300, 300)
+                for j in range(2)
+            ])
+            for i in range(100)
+        ]
+        run('save_result_index', parameters, lambda: database_api.save_result_index(notebook_id, cell_entries))
+        run('get_result_index', parameters, lambda: database_api.get_result_index(notebook_id, 10, 20))
+        run('has_result_index', parameters, lambda: database_api.has_result_index(notebook_id))
+        result_summary = ResultSummary(100, 1, 50, 'ValueError: invalid value', 60.0, 1024 ** 2, 10, False)
+        run('save_result_summary', parameters,
+            lambda: database_api.save_result_summary(notebook_id, result_summary))
+        run('get_result_summaries', parameters, lambda: database_api.get_result_summaries(user_id))
+
+        # uploads and execution cache
+        content_hashes = [uuid.uuid4().hex for _ in range(100)]
+        run('save_upload', parameters, lambda: database_api.save_upload(user_id, uuid.uuid4().hex, 10 * 1024, 3600.0))
+        run('get_uploaded_hashes', parameters, lambda: database_api.get_uploaded_hashes(user_id, content_hashes))
+        execution_key = uuid.uuid4().hex
+        run('save_cached_result', parameters, lambda: database_api.save_cached_result(
+            user_id, execution_key, notebook_id, 3600.0, 1000
+        ))
+        run('get_cached_result', parameters, lambda: database_api.get_cached_result(user_id, execution_key, 3600.0))
+
+        # submission queue
+        run('queue_notebook', parameters, lambda new_notebook_id: database_api.queue_notebook(
+            new_notebook_id, user_id, {'dockerImage': 'image', 'gpuRequirements': None}
+        ), new_notebook)
+        run('get_queued_submissions', parameters, lambda: database_api.get_queued_submissions(300.0))
+        queued_notebook_id = new_queued_notebook()
+        run('claim_queued_submission', parameters,
+            lambda: database_api.claim_queued_submission(queued_notebook_id, 0.0))
+        run('unclaim_queued_submission', parameters,
+            lambda: database_api.unclaim_queued_submission(queued_notebook_id))
+        run('release_notebook', parameters, lambda new_queued_notebook_id: database_api.release_notebook(
+            new_queued_notebook_id, str(uuid.uuid4()), 'https://agency.example/'
+        ), new_queued_notebook)
+        run('dequeue_notebook', parameters, lambda new_queued_notebook_id: database_api.dequeue_notebook(
+            new_queued_notebook_id, DatabaseAPI.NotebookStatus.CANCELLED
+        ), new_queued_notebook)
+        run('dequeue_notebooks', parameters, lambda queued_notebook_ids: database_api.dequeue_notebooks(
+            queued_notebook_ids, DatabaseAPI.NotebookStatus.CANCELLED
+        ), lambda: _create_notebook_ids(database_api, user_id, 10, DatabaseAPI.NotebookStatus.QUEUED))
+        run('count_notebooks_by_user', parameters,
+            lambda: database_api.count_notebooks_by_user(DatabaseAPI.NotebookStatus.PROCESSING))
+
+        # users, cookies and quotas
+        run('create_user', parameters, lambda: database_api.create_user(str(uuid.uuid4()), 'https://agency.example/'))
+        run('get_user(user_id)', parameters, lambda: database_api.get_user(user_id=user_id))
+        run('get_user(agency_username_url)', parameters, lambda: database_api.get_user(
+            agency_username_url=('user1', 'https://agency.example/')
+        ))
+        run('set_current_cookie', parameters, lambda: database_api.set_current_cookie(
+            str(uuid.uuid4()), user_id, 'https://agency.example/', time.time() + 3600
+        ))
+        run('get_current_cookies', parameters, lambda: database_api.get_current_cookies(user_id))
+        run('add_stored_bytes', parameters, lambda: database_api.add_stored_bytes(notebook_id, 1024))
+        run('get_stored_bytes', parameters, lambda: database_api.get_stored_bytes(user_id))
+        run('count_active_notebooks', parameters, lambda: database_api.count_active_notebooks(user_id))
+        run('take_submission_tokens', parameters,
+            lambda: database_api.take_submission_tokens(user_id, 1, 1000.0, 10))
+
+        database_api.db.close()
+        os.remove(path)
+
+    # create() needs a flask application context and only wraps the connection
+    public_methods = {
+        name for name, value in vars(DatabaseAPI).items()
+        if not name.startswith('_') and callable(value) and not isinstance(value, type)
+    } - {'create'}
+    missing_methods = public_methods - benchmarked_methods
+    if row_counts and missing_methods:
+        raise ValueError('The DatabaseAPI methods {} are not benchmarked'.format(', '.join(sorted(missing_methods))))
+
+
+def benchmark_red_data(runner, external_data_counts):
+    for external_data_count in external_data_counts:
+        external_data = []
+        for i in range(external_data_count):
+            if i % 2 == 0:
+                external_data.append({
+                    'inputName': 'file{}'.format(i), 'inputType': 'File', 'connectorType': 'SSH',
+                    'host': 'host.example', 'username': 'user', 'password': 'password', 'path': '/data/file'
+                })
+            else:
+                external_data.append({
+                    'inputName': 'value{}'.format(i), 'inputType': 'Integer', 'connectorType': None, 'value': str(i)
+                })
+
+        runner.run('_create_red_data', {'external_data': external_data_count}, lambda: _create_red_data(
+            str(uuid.uuid4()), str(uuid.uuid4()), 'https://agency.example/', 'user', 'https://service.example/',
+            'image', None, external_data, None
+        ))
+
+
+def benchmark_password_hash(runner):
+    token_hash = generate_password_hash(str(uuid.uuid4()))
+    runner.run('check_password_hash', {}, lambda: check_password_hash(token_hash, 'wrong token'))
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    baseline_medians = {
+        (result['name'], json.dumps(result['parameters'], sort_keys=True)): result['median']
+        for result in baseline['results']
+    }
+    print('\n{:<40} {:<28} {:>12} {:>12} {:>8}'.format('benchmark', 'parameters', 'baseline', 'current', 'ratio'))
+    for result in results:
+        key = (result['name'], json.dumps(result['parameters'], sort_keys=True))
+        baseline_median = baseline_medians.get(key)
+        if baseline_median is None:
+            continue
+        print('{:<40} {:<28} {:>12.6f} {:>12.6f} {:>8.2f}'.format(
+            key[0], key[1], baseline_median, result['median'], result['median'] / baseline_median
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the jupyter service primitives')
+    parser.add_argument('--notebook-sizes', type=int, nargs='*', default=DEFAULT_NOTEBOOK_SIZES,
+                        help='Notebook sizes in bytes, for example 10240 1073741824')
+    parser.add_argument('--row-counts', type=int, nargs='*', default=DEFAULT_ROW_COUNTS,
+                        help='Number of notebook rows in the database, for example 1000 1000000')
+    parser.add_argument('--external-data-counts', type=int, nargs='*', default=DEFAULT_EXTERNAL_DATA_COUNTS)
+    parser.add_argument('--min-time', type=float, default=0.5, help='Minimal seconds per benchmark')
+    parser.add_argument('--min-iterations', type=int, default=3, help='Minimal runs per benchmark')
+    parser.add_argument('--output', help='Write the results as json to this file')
+    parser.add_argument('--compare', help='Compare the results with a json file written by --output')
+    args = parser.parse_args()
+
+    runner = BenchmarkRunner(args.min_time, args.min_iterations)
+    print('{:<40} {:<28} {:>7} {:>12} {:>12}'.format('benchmark', 'parameters', 'runs', 'median', 'min'))
+    with tempfile.TemporaryDirectory() as work_directory:
+        benchmark_notebook_database(runner, work_directory, args.notebook_sizes)
+        benchmark_database_api(runner, work_directory, args.row_counts)
+    benchmark_red_data(runner, args.external_data_counts)
+    benchmark_password_hash(runner)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': sys.version, 'results': runner.results}, f, indent=2)
+    if args.compare:
+        compare(runner.results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
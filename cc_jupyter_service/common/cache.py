@@ -0,0 +1,62 @@
+import collections
+import threading
+import time
+
+
+class TTLCache:
+    MISSING = object()
+
+    def __init__(self, max_size, ttl):
+        """
+        A thread safe in-process cache, that holds at most max_size entries for at most ttl seconds. If the cache is
+        full, the least recently used entry is removed.
+
+        :param max_size: The maximal number of entries. If 0, nothing is cached.
+        :type max_size: int
+        :param ttl: The seconds an entry stays valid
+        :type ttl: float
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()  # maps keys to tuples of (expiry time, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :param key: The key to look up
+        :return: The cached value or TTLCache.MISSING, if the key is not cached or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return TTLCache.MISSING
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return TTLCache.MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value, max_ttl=None):
+        """
+        :param key: The key to cache the value for
+        :param value: The value to cache
+        :param max_ttl: If given, the entry expires after this number of seconds, if it is shorter than the ttl of the
+                        cache
+        :type max_ttl: float or None
+        """
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl if max_ttl is None else min(self.ttl, max_ttl)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,350 @@
+import collections
+import sys
+
+import requests
+from werkzeug.urls import url_join
+
+from cc_jupyter_service.common import metrics
+from cc_jupyter_service.common.helper import AUTHORIZATION_COOKIE_KEY
+
+
+class NodeCapacity:
+    def __init__(self, node_name, total_ram, free_ram, total_gpus, free_gpus):
+        """
+        Describes the resources of one agency node.
+
+        :param node_name: The name of the node
+        :type node_name: str
+        :param total_ram: The ram of the node in megabytes
+        :type total_ram: int
+        :param free_ram: The ram in megabytes, that is not used by running batches
+        :type free_ram: int
+        :param total_gpus: The vram in megabytes of every gpu of the node
+        :type total_gpus: list[int]
+        :param free_gpus: The vram in megabytes of every gpu, that is not used by running batches
+        :type free_gpus: list[int]
+        """
+        self.node_name = node_name
+        self.total_ram = total_ram
+        self.free_ram = free_ram
+        self.total_gpus = total_gpus
+        self.free_gpus = free_gpus
+
+    @staticmethod
+    def from_node_data(node_data):
+        """
+        Creates a NodeCapacity from an entry of the /nodes endpoint of an agency.
+
+        :param node_data: The node information of the agency
+        :type node_data: dict
+        :rtype: NodeCapacity
+        """
+        current_batches = node_data.get('currentBatches') or []
+        gpus = node_data.get('gpus') or []
+        used_gpu_ids = set()
+        used_ram = 0
+        for batch in current_batches:
+            used_ram += batch.get('ram') or 0
+            used_gpu_ids.update(batch.get('usedGPUs') or [])
+
+        return NodeCapacity(
+            node_name=node_data.get('nodeName'),
+            total_ram=node_data.get('ram') or 0,
+            free_ram=(node_data.get('ram') or 0) - used_ram,
+            total_gpus=[gpu.get('vram') or 0 for gpu in gpus],
+            free_gpus=[gpu.get('vram') or 0 for gpu in gpus if gpu.get('id') not in used_gpu_ids]
+        )
+
+    def fits(self, ram, gpu_vrams, use_free_resources):
+        """
+        :param ram: The required ram in megabytes
+        :type ram: int
+        :param gpu_vrams: The minimal vram in megabytes of every required gpu
+        :type gpu_vrams: list[int]
+        :param use_free_resources: If True, only resources not used by running batches are considered, otherwise all
+                                   resources of the node
+        :type use_free_resources: bool
+        :return: Whether this node can run a batch with the given requirements
+        :rtype: bool
+        """
+        if use_free_resources:
+            available_ram, available_gpus = self.free_ram, self.free_gpus
+        else:
+            available_ram, available_gpus = self.total_ram, self.total_gpus
+        if available_ram < ram:
+            return False
+        return _assign_gpus(gpu_vrams, available_gpus) is not None
+
+    def reserve(self, ram, gpu_vrams):
+        """
+        Removes the given requirements from the free resources of this node, so the next placement decision sees a
+        submission, that is not yet reported by the agency.
+
+        :param ram: The ram in megabytes to reserve
+        :type ram: int
+        :param gpu_vrams: The minimal vram in megabytes of every gpu to reserve
+        :type gpu_vrams: list[int]
+        :return: The vram of the reserved gpus
+        :rtype: list[int]
+        """
+        self.free_ram -= ram
+        remaining_gpus = _assign_gpus(gpu_vrams, self.free_gpus)
+        if remaining_gpus is None:
+            return []
+        reserved_gpus = list((collections.Counter(self.free_gpus) - collections.Counter(remaining_gpus)).elements())
+        self.free_gpus = remaining_gpus
+        return reserved_gpus
+
+    def release(self, ram, gpus):
+        """
+        Returns resources removed by reserve() to the free resources of this node.
+
+        :param ram: The reserved ram in megabytes
+        :type ram: int
+        :param gpus: The vram of the reserved gpus as returned by reserve()
+        :type gpus: list[int]
+        """
+        self.free_ram += ram
+        self.free_gpus = self.free_gpus + gpus
+
+
+class CapacityReservation:
+    def __init__(self, agency_url, node, ram, gpus):
+        """
+        Describes resources reserved on a node for a submission, that is not yet reported by the agency.
+
+        :param agency_url: The url of the agency of the node
+        :type agency_url: str
+        :param node: The node the resources are reserved on
+        :type node: NodeCapacity
+        :param ram: The reserved ram in megabytes
+        :type ram: int
+        :param gpus: The vram of the reserved gpus
+        :type gpus: list[int]
+        """
+        self.agency_url = agency_url
+        self.node = node
+        self.ram = ram
+        self.gpus = gpus
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Returns the reserved resources, if the submission was not accepted by the agency. Further calls have no effect.
+        """
+        if not self._cancelled:
+            self.node.release(self.ram, self.gpus)
+            self._cancelled = True
+
+
+def _assign_gpus(gpu_vrams, available_gpus):
+    """
+    Assigns every required gpu to a different available gpu with enough vram. The largest requirements are assigned
+    first to the smallest gpu, that is large enough.
+
+    :param gpu_vrams: The minimal vram of every required gpu
+    :type gpu_vrams: list[int]
+    :param available_gpus: The vram of every available gpu
+    :type available_gpus: list[int]
+    :return: The vram of the gpus, that are left after the assignment or None, if the requirements can not be assigned
+    :rtype: list[int] or None
+    """
+    available_gpus = sorted(available_gpus)
+    for vram in sorted(gpu_vrams, reverse=True):
+        for index, available_vram in enumerate(available_gpus):
+            if available_vram >= vram:
+                del available_gpus[index]
+                break
+        else:
+            return None
+    return available_gpus
+
+
+class AgencyCapacity:
+    def __init__(self, agency_url, nodes):
+        """
+        Describes the resources of an agency.
+
+        :param agency_url: The url of the agency
+        :type agency_url: str
+        :param nodes: The nodes of the agency
+        :type nodes: list[NodeCapacity]
+        """
+        self.agency_url = agency_url
+        self.nodes = nodes
+
+    def free_ram(self, ram, gpu_vrams):
+        """
+        :return: The free ram of all nodes, that can currently run a batch with the given requirements
+        :rtype: int
+        """
+        return sum(node.free_ram for node in self.nodes if node.fits(ram, gpu_vrams, True))
+
+    def can_run(self, ram, gpu_vrams):
+        """
+        :return: Whether any node of this agency could run a batch with the given requirements, once it is idle. None,
+                 if the agency reports no online nodes, so it is unknown, which batches it can run.
+        :rtype: bool or None
+        """
+        if not self.nodes:
+            return None
+        return any(node.fits(ram, gpu_vrams, False) for node in self.nodes)
+
+    def reserve(self, ram, gpu_vrams):
+        """
+        Reserves the given requirements on the node with the most free ram, that can run the batch now.
+
+        :return: The reservation or None, if no node can run the batch now
+        :rtype: CapacityReservation or None
+        """
+        nodes = [node for node in self.nodes if node.fits(ram, gpu_vrams, True)]
+        if not nodes:
+            return None
+        node = max(nodes, key=lambda candidate: candidate.free_ram)
+        return CapacityReservation(self.agency_url, node, ram, node.reserve(ram, gpu_vrams))
+
+
+def fetch_agency_capacity(agency_url, authorization_cookie):
+    """
+    Requests the nodes of the given agency.
+
+    :param agency_url: The url of the agency
+    :type agency_url: str
+    :param authorization_cookie: The authorization cookie for this agency
+    :type authorization_cookie: str
+    :rtype: AgencyCapacity
+
+    :raise HTTPError: If the nodes could not be requested
+    """
+    with metrics.time_agency_request('nodes'):
+        r = requests.get(url_join(agency_url, 'nodes'), cookies={AUTHORIZATION_COOKIE_KEY: authorization_cookie})
+    r.raise_for_status()
+    nodes = [
+        NodeCapacity.from_node_data(node_data)
+        for node_data in r.json()
+        if node_data.get('state', 'online') == 'online'
+    ]
+    return AgencyCapacity(agency_url, nodes)
+
+
+def _gpu_vrams(gpu_requirements):
+    """
+    :param gpu_requirements: The red gpu requirements with the key 'devices' or None
+    :type gpu_requirements: dict or None
+    :return: The minimal vram of every required gpu
+    :rtype: list[int]
+    """
+    if gpu_requirements is None:
+        return []
+    return [device.get('vramMin', 0) for device in gpu_requirements['devices']]
+
+
+class AgencyRouter:
+    def __init__(self, agency_cookies, default_agency_url, capacity_cache=None):
+        """
+        Chooses the agency for every submission of one request. The nodes of every agency are requested once and
+        reserved locally for every routed submission, so the submissions of one request are spread over the agencies.
+
+        :param agency_cookies: Maps the agency urls to the authorization cookies of the user
+        :type agency_cookies: dict[str, str]
+        :param default_agency_url: The agency to use, if no agency reports enough capacity
+        :type default_agency_url: str
+        :param capacity_cache: A dictionary mapping agency urls to already requested capacities. Can be shared between
+                               routers of different users, so the nodes of every agency are requested only once.
+        :type capacity_cache: dict[str, AgencyCapacity] or None
+        """
+        self.agency_cookies = agency_cookies
+        self.default_agency_url = default_agency_url
+        self._capacity_cache = capacity_cache if capacity_cache is not None else {}
+
+    def _get_capacity(self, agency_url):
+        """
+        :return: The capacity of the given agency or None, if its nodes could not be requested
+        :rtype: AgencyCapacity or None
+        """
+        if agency_url not in self._capacity_cache:
+            try:
+                self._capacity_cache[agency_url] = fetch_agency_capacity(agency_url, self.agency_cookies[agency_url])
+            except (requests.RequestException, ValueError) as e:
+                print('Failed to request nodes of agency "{}": {}'.format(agency_url, str(e)), file=sys.stderr)
+                self._capacity_cache[agency_url] = None
+        return self._capacity_cache[agency_url]
+
+    def _get_capacities(self):
+        capacities = [self._get_capacity(agency_url) for agency_url in self.agency_cookies]
+        return [capacity for capacity in capacities if capacity is not None]
+
+    def route_now(self, ram, gpu_requirements):
+        """
+        Chooses the agency with the most free ram on nodes, that can run the given requirements now. The resources are
+        reserved for the following decisions.
+
+        :param ram: The ram in megabytes required by the batch
+        :type ram: int
+        :param gpu_requirements: The red gpu requirements with the key 'devices' or None
+        :type gpu_requirements: dict or None
+        :return: The url of the chosen agency or None, if no agency can run the batch now
+        :rtype: str or None
+        """
+        reservation = self.reserve_now(ram, gpu_requirements)
+        return reservation.agency_url if reservation is not None else None
+
+    def reserve_now(self, ram, gpu_requirements):
+        """
+        Like route_now(), but returns the reservation, so it can be cancelled, if the agency does not accept the batch.
+
+        :return: The reservation on the chosen agency or None, if no agency can run the batch now
+        :rtype: CapacityReservation or None
+        """
+        gpu_vrams = _gpu_vrams(gpu_requirements)
+        available = [(capacity.free_ram(ram, gpu_vrams), capacity) for capacity in self._get_capacities()]
+        available = [(free_ram, capacity) for free_ram, capacity in available if free_ram > 0]
+        if not available:
+            return None
+        capacity = max(available, key=lambda entry: entry[0])[1]
+        return capacity.reserve(ram, gpu_vrams)
+
+    def can_run(self, ram, gpu_requirements):
+        """
+        :return: True, if any agency could run a batch with the given requirements, once its nodes are idle. None, if
+                 no agency reporting its nodes could run it, but the nodes of some agencies could not be requested or
+                 are all offline. False, if every agency reports online nodes and all of them are too small.
+        :rtype: bool or None
+        """
+        gpu_vrams = _gpu_vrams(gpu_requirements)
+        unknown = False
+        for agency_url in self.agency_cookies:
+            capacity = self._get_capacity(agency_url)
+            agency_can_run = capacity.can_run(ram, gpu_vrams) if capacity is not None else None
+            if agency_can_run:
+                return True
+            if agency_can_run is None:
+                unknown = True
+        return None if unknown else False
+
+    def route(self, ram, gpu_requirements):
+        """
+        Chooses the agency with the most free ram on nodes, that can run the given requirements now. If no agency can
+        run the batch now, chooses an agency that could run it, once its nodes are idle. Otherwise the default agency is
+        returned.
+
+        :param ram: The ram in megabytes required by the batch
+        :type ram: int
+        :param gpu_requirements: The red gpu requirements with the key 'devices' or None
+        :type gpu_requirements: dict or None
+        :return: The url of the chosen agency
+        :rtype: str
+        """
+        if len(self.agency_cookies) <= 1:
+            return self.default_agency_url
+
+        agency_url = self.route_now(ram, gpu_requirements)
+        if agency_url is not None:
+            return agency_url
+
+        gpu_vrams = _gpu_vrams(gpu_requirements)
+        for capacity in self._get_capacities():
+            if capacity.can_run(ram, gpu_vrams):
+                return capacity.agency_url
+
+        return self.default_agency_url
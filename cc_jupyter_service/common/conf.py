@@ -3,13 +3,23 @@ import os
 import jsonschema
 from ruamel.yaml import YAML, YAMLError
 
-from cc_jupyter_service.common.schema.configuration import configuration_schema
+from cc_jupyter_service.common.notebook_slimming import DEFAULT_SLIM_METADATA_KEYS
+from cc_jupyter_service.common.validation import validate, CONFIGURATION_VALIDATOR
 
 yaml = YAML(typ='safe')
 yaml.default_flow_style = False
 
 CONFIG_FILE_LOCATIONS = ['cc-jupyter-service-config.yml', '~/.config/cc-jupyter-service.yml']
 DEFAULT_SESSION_COOKIE = 'session'
+DEFAULT_NOTEBOOK_VALIDATION_CACHE_SIZE = 256
+DEFAULT_PARALLEL_VALIDATION_THRESHOLD = 4
+DEFAULT_USER_CACHE_SIZE = 1024
+DEFAULT_USER_CACHE_TTL = 60
+DEFAULT_ADMISSION_INTERVAL = 5
+DEFAULT_EXECUTION_CACHE_TTL = 7 * 24 * 60 * 60
+DEFAULT_EXECUTION_CACHE_SIZE = 10000
+DEFAULT_ASGI_WORKER_THREADS = 32
+DEFAULT_UPLOAD_RETENTION = 7 * 24 * 60 * 60
 
 
 class ImageInfo:
@@ -35,7 +45,12 @@ class ImageInfo:
 class Conf:
     def __init__(
         self, notebook_directory, flask_secret_key, prevent_localhost, predefined_docker_images, predefined_agency_urls,
-        flask_session_cookie
+        flask_session_cookie, notebook_validation_cache_size, parallel_validation_threshold, validation_processes,
+        user_cache_size, user_cache_ttl, federated_agency_urls, admission_control, admission_interval,
+        max_processing_notebooks_per_user, max_notebooks_per_request, max_submissions_per_minute, submission_burst,
+        max_active_notebooks_per_user, max_stored_bytes_per_user, output_blob_threshold, execution_cache,
+        execution_cache_ttl, execution_cache_size, asgi_worker_threads, stats_operators, notebook_slimming,
+        slim_metadata_keys, execution_reports, upload_retention
     ):
         """
         Creates a new Conf object.
@@ -53,6 +68,64 @@ class Conf:
         :type predefined_agency_urls: list[str] or None
         :param flask_session_cookie: The name of the flask session cookie
         :type flask_session_cookie: str
+        :param notebook_validation_cache_size: The number of notebook validation results to cache
+        :type notebook_validation_cache_size: int
+        :param parallel_validation_threshold: The minimal number of notebooks in one request, that are validated in
+                                              parallel
+        :type parallel_validation_threshold: int
+        :param validation_processes: The number of processes for parallel notebook validation. If None, the number of
+                                     cpus is used.
+        :type validation_processes: int or None
+        :param user_cache_size: The number of users and agency cookies to cache in every process
+        :type user_cache_size: int
+        :param user_cache_ttl: The seconds a cached user or agency cookie stays valid
+        :type user_cache_ttl: float
+        :param federated_agency_urls: A list of agency urls, that share their user accounts. Notebooks of users of one
+                                      of these agencies are routed to the agency with the most free capacity.
+        :type federated_agency_urls: list[str] or None
+        :param admission_control: Whether submitted notebooks are queued, until the agency has free capacity
+        :type admission_control: bool
+        :param admission_interval: The seconds between two releases of queued notebooks
+        :type admission_interval: float
+        :param max_processing_notebooks_per_user: The maximal number of processing notebooks per user, if admission
+                                                  control is enabled. If None, the number is not limited.
+        :type max_processing_notebooks_per_user: int or None
+        :param max_notebooks_per_request: The maximal number of notebooks in one submission request
+        :type max_notebooks_per_request: int or None
+        :param max_submissions_per_minute: The number of notebooks a user can submit per minute on average
+        :type max_submissions_per_minute: float or None
+        :param submission_burst: The number of notebooks a user can submit at once, if max_submissions_per_minute is
+                                 set. Defaults to max_submissions_per_minute.
+        :type submission_burst: int or None
+        :param max_active_notebooks_per_user: The maximal number of processing and queued notebooks per user
+        :type max_active_notebooks_per_user: int or None
+        :param max_stored_bytes_per_user: The maximal size of all notebook files of a user in bytes
+        :type max_stored_bytes_per_user: int or None
+        :param output_blob_threshold: Output data of result notebooks larger than this number of bytes is stored in
+                                      separate blob files. None disables blob storage.
+        :type output_blob_threshold: int or None
+        :param execution_cache: Whether the results of identical submissions are reused
+        :type execution_cache: bool
+        :param execution_cache_ttl: The seconds a cached result can be reused
+        :type execution_cache_ttl: float
+        :param execution_cache_size: The maximal number of cached results
+        :type execution_cache_size: int
+        :param asgi_worker_threads: The number of threads, that process requests in the asgi service mode
+        :type asgi_worker_threads: int
+        :param stats_operators: The agency users, that can request the usage statistics of all users, given as
+                                dictionaries with the keys "agencyUrl" and "agencyUsername"
+        :type stats_operators: list[dict]
+        :param notebook_slimming: Whether outputs, execution counts and the slim_metadata_keys are removed from input
+                                  notebooks, before they are stored and sent to the agency
+        :type notebook_slimming: bool
+        :param slim_metadata_keys: The keys removed from the notebook and cell metadata of slimmed input notebooks
+        :type slim_metadata_keys: list[str]
+        :param execution_reports: Whether the papermill wrapper in the container reports the progress and status of
+                                  the execution. Images, whose papermill wrapper does not support the report options,
+                                  fail every notebook, so they have to be rebuilt, before this is enabled.
+        :type execution_reports: bool
+        :param upload_retention: The seconds an uploaded notebook file is kept after its last upload
+        :type upload_retention: float
         """
         self.notebook_directory = notebook_directory
         self.flask_secret_key = flask_secret_key
@@ -60,6 +133,30 @@ class Conf:
         self.predefined_docker_images = predefined_docker_images
         self.predefined_agency_urls = predefined_agency_urls
         self.flask_session_cookie = flask_session_cookie
+        self.notebook_validation_cache_size = notebook_validation_cache_size
+        self.parallel_validation_threshold = parallel_validation_threshold
+        self.validation_processes = validation_processes
+        self.user_cache_size = user_cache_size
+        self.user_cache_ttl = user_cache_ttl
+        self.federated_agency_urls = federated_agency_urls
+        self.admission_control = admission_control
+        self.admission_interval = admission_interval
+        self.max_processing_notebooks_per_user = max_processing_notebooks_per_user
+        self.max_notebooks_per_request = max_notebooks_per_request
+        self.max_submissions_per_minute = max_submissions_per_minute
+        self.submission_burst = submission_burst
+        self.max_active_notebooks_per_user = max_active_notebooks_per_user
+        self.max_stored_bytes_per_user = max_stored_bytes_per_user
+        self.output_blob_threshold = output_blob_threshold
+        self.execution_cache = execution_cache
+        self.execution_cache_ttl = execution_cache_ttl
+        self.execution_cache_size = execution_cache_size
+        self.asgi_worker_threads = asgi_worker_threads
+        self.stats_operators = stats_operators
+        self.notebook_slimming = notebook_slimming
+        self.slim_metadata_keys = slim_metadata_keys
+        self.execution_reports = execution_reports
+        self.upload_retention = upload_retention
 
     @staticmethod
     def from_system():
@@ -109,7 +206,7 @@ class Conf:
             )
 
         try:
-            jsonschema.validate(data, configuration_schema)
+            validate(data, CONFIGURATION_VALIDATOR)
         except jsonschema.ValidationError as e:
             raise ConfigurationError('Invalid config file. {}'.format(e))
 
@@ -124,7 +221,35 @@ class Conf:
             prevent_localhost=data.get('preventLocalhost', True),
             predefined_docker_images=predefined_docker_images,
             predefined_agency_urls=data.get('predefinedAgencyUrls'),
-            flask_session_cookie=data.get('flaskSessionCookie', DEFAULT_SESSION_COOKIE)
+            flask_session_cookie=data.get('flaskSessionCookie', DEFAULT_SESSION_COOKIE),
+            notebook_validation_cache_size=data.get(
+                'notebookValidationCacheSize', DEFAULT_NOTEBOOK_VALIDATION_CACHE_SIZE
+            ),
+            parallel_validation_threshold=data.get(
+                'parallelValidationThreshold', DEFAULT_PARALLEL_VALIDATION_THRESHOLD
+            ),
+            validation_processes=data.get('validationProcesses'),
+            user_cache_size=data.get('userCacheSize', DEFAULT_USER_CACHE_SIZE),
+            user_cache_ttl=data.get('userCacheTtl', DEFAULT_USER_CACHE_TTL),
+            federated_agency_urls=data.get('federatedAgencyUrls'),
+            admission_control=data.get('admissionControl', False),
+            admission_interval=data.get('admissionInterval', DEFAULT_ADMISSION_INTERVAL),
+            max_processing_notebooks_per_user=data.get('maxProcessingNotebooksPerUser'),
+            max_notebooks_per_request=data.get('maxNotebooksPerRequest'),
+            max_submissions_per_minute=data.get('maxSubmissionsPerMinute'),
+            submission_burst=data.get('submissionBurst'),
+            max_active_notebooks_per_user=data.get('maxActiveNotebooksPerUser'),
+            max_stored_bytes_per_user=data.get('maxStoredBytesPerUser'),
+            output_blob_threshold=data.get('outputBlobThreshold'),
+            execution_cache=data.get('executionCache', False),
+            execution_cache_ttl=data.get('executionCacheTtl', DEFAULT_EXECUTION_CACHE_TTL),
+            execution_cache_size=data.get('executionCacheSize', DEFAULT_EXECUTION_CACHE_SIZE),
+            asgi_worker_threads=data.get('asgiWorkerThreads', DEFAULT_ASGI_WORKER_THREADS),
+            stats_operators=data.get('statsOperators', []),
+            notebook_slimming=data.get('notebookSlimming', True),
+            slim_metadata_keys=data.get('slimMetadataKeys', DEFAULT_SLIM_METADATA_KEYS),
+            execution_reports=data.get('executionReports', False),
+            upload_retention=data.get('uploadRetention', DEFAULT_UPLOAD_RETENTION)
         )
 
 
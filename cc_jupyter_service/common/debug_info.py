@@ -0,0 +1,60 @@
+import zlib
+
+# the full debug info is cut to its last bytes, because errors are reported at the end of stderr and agency logs
+MAX_DEBUG_INFO_SIZE = 1024 * 1024
+# the number of characters of the excerpt, that is sent with every result listing
+DEBUG_INFO_EXCERPT_LENGTH = 300
+TRUNCATION_MARKER = '[{} bytes truncated]\n'
+
+
+class DebugInfo:
+    def __init__(self, excerpt, compressed_data, size):
+        """
+        Describes the stored debug information of a failed notebook.
+
+        :param excerpt: The end of the debug information
+        :type excerpt: str
+        :param compressed_data: The zlib compressed utf-8 encoded debug information
+        :type compressed_data: bytes
+        :param size: The size of the uncompressed debug information in bytes
+        :type size: int
+        """
+        self.excerpt = excerpt
+        self.compressed_data = compressed_data
+        self.size = size
+
+    @staticmethod
+    def from_text(text):
+        """
+        Creates the stored form of the given debug information. Debug information larger than MAX_DEBUG_INFO_SIZE is
+        cut to its end.
+
+        :param text: The debug information
+        :type text: str
+        :rtype: DebugInfo
+        """
+        data = text.encode('utf-8')
+        if len(data) > MAX_DEBUG_INFO_SIZE:
+            # errors='ignore' drops a character, that was split by the cut
+            tail = data[-MAX_DEBUG_INFO_SIZE:].decode('utf-8', errors='ignore')
+            text = TRUNCATION_MARKER.format(len(data) - MAX_DEBUG_INFO_SIZE) + tail
+            data = text.encode('utf-8')
+
+        excerpt = text
+        if len(text) > DEBUG_INFO_EXCERPT_LENGTH:
+            excerpt = '...' + text[-(DEBUG_INFO_EXCERPT_LENGTH - 3):]
+        return DebugInfo(excerpt, zlib.compress(data), len(data))
+
+    def is_excerpt_complete(self):
+        """
+        :return: Whether the excerpt contains the complete debug information
+        :rtype: bool
+        """
+        return len(self.excerpt.encode('utf-8')) == self.size
+
+    def get_data(self):
+        """
+        :return: The utf-8 encoded debug information
+        :rtype: bytes
+        """
+        return zlib.decompress(self.compressed_data)
@@ -0,0 +1,79 @@
+import base64
+
+from cc_jupyter_service.common import json_codec
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except ImportError:
+    Fernet = None
+    InvalidToken = None
+
+
+class DecryptionError(ValueError):
+    pass
+
+
+def is_available():
+    """
+    :return: True, if the optional dependency cryptography is installed
+    :rtype: bool
+    """
+    return Fernet is not None
+
+
+def _fernet(secret_key, purpose):
+    """
+    Derives a separate key for every purpose from the secret key of the app, so the key of the flask sessions is never
+    used directly.
+    """
+    if isinstance(secret_key, str):
+        secret_key = secret_key.encode('utf-8')
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=purpose.encode('utf-8'), backend=default_backend()
+    )
+    return Fernet(base64.urlsafe_b64encode(hkdf.derive(secret_key)))
+
+
+def encrypt(data, secret_key, purpose):
+    """
+    Encrypts and authenticates the given data.
+
+    :param data: The json serializable data to encrypt
+    :param secret_key: The secret key of the app
+    :type secret_key: str or bytes
+    :param purpose: Describes, what the data is used for. Data can only be decrypted with the same purpose.
+    :type purpose: str
+    :return: The encrypted data
+    :rtype: str
+
+    :raise RuntimeError: If cryptography is not installed
+    """
+    if Fernet is None:
+        raise RuntimeError('Data can not be encrypted, because cryptography is not installed')
+    return _fernet(secret_key, purpose).encrypt(json_codec.dumps(data)).decode('ascii')
+
+
+def decrypt(token, secret_key, purpose):
+    """
+    Decrypts data encrypted by encrypt().
+
+    :param token: The encrypted data
+    :type token: str
+    :param secret_key: The secret key of the app
+    :type secret_key: str or bytes
+    :param purpose: The purpose the data was encrypted for
+    :type purpose: str
+    :return: The decrypted data
+
+    :raise DecryptionError: If the data was changed or encrypted with another secret key or purpose
+    :raise RuntimeError: If cryptography is not installed
+    """
+    if Fernet is None:
+        raise RuntimeError('Data can not be decrypted, because cryptography is not installed')
+    try:
+        return json_codec.loads(_fernet(secret_key, purpose).decrypt(token.encode('ascii')))
+    except InvalidToken:
+        raise DecryptionError('The encrypted data is invalid or was encrypted with another secret key')
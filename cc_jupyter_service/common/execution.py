@@ -3,20 +3,23 @@ import time
 import uuid
 
 import requests
-from flask import g
+from flask import g, current_app
 from werkzeug.urls import url_join
 
-from cc_jupyter_service.common import red_file_template
+from cc_jupyter_service.common import red_file_template, metrics, encryption
 from cc_jupyter_service.common.helper import normalize_url, AUTHORIZATION_COOKIE_KEY, AgencyError
 from cc_jupyter_service.service.db import DatabaseAPI
 
 
 DEFAULT_DOCKER_IMAGE = 'bruno1996/cc_jupyterservice_base_image'
+# the external data of queued submissions contains credentials, so it is only stored encrypted for this purpose
+EXTERNAL_DATA_PURPOSE = 'queued-submission-external-data'
 
 
 def exec_notebook(
         notebook_data, agency_url, agency_username, agency_authorization_cookie, notebook_database, url_root,
-        docker_image, gpu_requirements, notebook_filename, external_data, python_requirements
+        docker_image, gpu_requirements, notebook_filename, external_data, python_requirements, execution_key=None,
+        submission_id=None
 ):
     """
     - Validates the agency authentication information
@@ -49,6 +52,10 @@ def exec_notebook(
                                 content of a requirements specification file for pip and filename is the filename of
                                 this file.
     :type python_requirements: dict or None
+    :param execution_key: The hash of the execution inputs, if the execution cache is enabled
+    :type execution_key: str or None
+    :param submission_id: The id of the request, that submitted the notebook
+    :type submission_id: str or None
 
     :return: The experiment id of the executed experiment
     :rtype: str
@@ -58,12 +65,14 @@ def exec_notebook(
     notebook_id = str(uuid.uuid4())
 
     notebook_token = str(uuid.uuid4())
-    notebook_database.save_notebook(notebook_data, notebook_id)
+    notebook_size = notebook_database.save_notebook(notebook_data, notebook_id)
 
+    submission_time = time.time()
     experiment_id = start_agency(
         notebook_id, notebook_token, agency_url, agency_username, agency_authorization_cookie, url_root, docker_image,
         gpu_requirements, external_data, python_requirements
     )
+    acceptance_time = time.time()
 
     py_reqs = None
     if python_requirements is not None:
@@ -71,16 +80,109 @@ def exec_notebook(
 
     database_api = DatabaseAPI.create()
     database_api.create_notebook(
-        notebook_id, notebook_token, g.user.user_id, experiment_id, notebook_filename, int(time.time()),
-        python_requirements=py_reqs
+        notebook_id, notebook_token, g.user.user_id, experiment_id, notebook_filename, int(submission_time), agency_url,
+        python_requirements=py_reqs, execution_key=execution_key, submission_id=submission_id,
+        submission_time=submission_time, docker_image=docker_image, gpu_count=_gpu_count(gpu_requirements)
     )
+    database_api.record_lifecycle_event(notebook_id, 'accepted', acceptance_time)
+    database_api.add_stored_bytes(notebook_id, notebook_size)
+    metrics.NOTEBOOK_SUBMISSIONS.inc()
 
     return experiment_id
 
 
+def queue_notebook(
+        notebook_data, agency_url, notebook_database, url_root, docker_image, gpu_requirements, notebook_filename,
+        external_data, python_requirements, execution_key=None, submission_id=None
+):
+    """
+    - Saves the notebook
+    - Saves meta information in the db with status QUEUED
+    - Adds the notebook to the admission queue. The admission controller submits it to an agency, when enough capacity
+      is free.
+
+    The external data can contain credentials like ssh passwords, so it is stored encrypted with the secret key of the
+    app. The parameters are the same as for exec_notebook().
+
+    :return: The id of the queued notebook
+    :rtype: str
+    """
+    notebook_id = str(uuid.uuid4())
+    notebook_size = notebook_database.save_notebook(notebook_data, notebook_id)
+
+    py_reqs = None
+    if python_requirements is not None:
+        py_reqs = python_requirements['data']
+
+    database_api = DatabaseAPI.create()
+    # the notebook token is created, when the notebook is released
+    database_api.create_notebook(
+        notebook_id, None, g.user.user_id, None, notebook_filename, int(time.time()),
+        normalize_url(agency_url), status=DatabaseAPI.NotebookStatus.QUEUED, python_requirements=py_reqs,
+        execution_key=execution_key, submission_id=submission_id, docker_image=docker_image,
+        gpu_count=_gpu_count(gpu_requirements)
+    )
+    database_api.queue_notebook(notebook_id, g.user.user_id, {
+        'urlRoot': url_root,
+        'dockerImage': docker_image,
+        'gpuRequirements': gpu_requirements,
+        'encryptedExternalData': encryption.encrypt(
+            external_data, current_app.config['SECRET_KEY'], EXTERNAL_DATA_PURPOSE
+        ),
+        'pythonRequirements': python_requirements
+    })
+    database_api.add_stored_bytes(notebook_id, notebook_size)
+    metrics.NOTEBOOK_SUBMISSIONS.inc()
+
+    return notebook_id
+
+
+def reuse_result(
+        notebook_filename, agency_url, execution_key, result_notebook_id, submission_id=None, docker_image=None
+):
+    """
+    Creates a succeeded notebook, that reuses the result of an earlier execution with the same execution key. The
+    notebook is not saved and no agency is contacted.
+
+    :param notebook_filename: The filename of the submitted notebook
+    :type notebook_filename: str
+    :param agency_url: The agency of the submitting user
+    :type agency_url: str
+    :param execution_key: The hash of the execution inputs
+    :type execution_key: str
+    :param result_notebook_id: The id of the notebook holding the cached result
+    :type result_notebook_id: str
+    :param submission_id: The id of the request, that submitted the notebook
+    :type submission_id: str or None
+    :param docker_image: The docker image of the submission
+    :type docker_image: str or None
+
+    :return: The id of the new notebook
+    :rtype: str
+    """
+    notebook_id = str(uuid.uuid4())
+
+    database_api = DatabaseAPI.create()
+    # the notebook is never executed, so it gets no token
+    database_api.create_notebook(
+        notebook_id, None, g.user.user_id, None, notebook_filename, int(time.time()),
+        normalize_url(agency_url), status=DatabaseAPI.NotebookStatus.SUCCESS, execution_key=execution_key,
+        result_notebook_id=result_notebook_id, submission_id=submission_id, docker_image=docker_image
+    )
+    metrics.EXECUTION_CACHE_HITS.inc()
+
+    return notebook_id
+
+
+def _gpu_count(gpu_requirements):
+    if gpu_requirements is None:
+        return 0
+    return len(gpu_requirements['devices'])
+
+
 def _create_red_data(
         notebook_id, notebook_token, agency_url, agency_username, url_root, docker_image, gpu_requirements,
-        external_data, python_requirements
+        external_data, python_requirements, execution_reports=False
 ):
     """
     Creates the red data that can be used for execution on an agency.
@@ -106,6 +208,9 @@ def _create_red_data(
                                 content of a requirements specification file for pip and filename is the filename of
                                 this file.
     :type python_requirements: dict
+    :param execution_reports: Whether the papermill wrapper should report the progress and status. Requires
+                              images with a papermill wrapper, that supports the report options.
+    :type execution_reports: bool
 
     :return: The red data filled with the given information to execute on an agency
 
@@ -125,6 +230,18 @@ def _create_red_data(
     output_notebook_access['auth']['username'] = agency_username
     output_notebook_access['auth']['password'] = notebook_token
 
+    # progress and status reports
+    if execution_reports:
+        red_data['cli']['inputs'].update(copy.deepcopy(red_file_template.REPORT_CLI_INPUTS))
+        red_data['inputs'].update(copy.deepcopy(red_file_template.REPORT_INPUTS))
+        red_data['inputs']['progressUrl'] = url_join(url_root, 'progress/' + notebook_id)
+        red_data['inputs']['statusUrl'] = url_join(url_root, 'status/' + notebook_id)
+        red_data['inputs']['serviceUsername'] = agency_username
+        service_token_access = red_data['inputs']['serviceTokenFile']['connector']['access']
+        service_token_access['url'] = url_join(url_root, 'service_token/' + notebook_id)
+        service_token_access['auth']['username'] = agency_username
+        service_token_access['auth']['password'] = notebook_token
+
     # execution engine
     execution_engine_access = red_data['execution']['settings']['access']
     execution_engine_access['url'] = agency_url
@@ -262,14 +379,15 @@ def start_agency(
     """
     red_data = _create_red_data(
         notebook_id, notebook_token, agency_url, agency_username, url_root, docker_image, gpu_requirements,
-        external_data, python_requirements
+        external_data, python_requirements, current_app.config['EXECUTION_REPORTS']
     )
 
-    r = requests.post(
-        url_join(agency_url, 'red'),
-        cookies={AUTHORIZATION_COOKIE_KEY: authorization_cookie},
-        json=red_data
-    )
+    with metrics.time_agency_request('red', 'POST'):
+        r = requests.post(
+            url_join(agency_url, 'red'),
+            cookies={AUTHORIZATION_COOKIE_KEY: authorization_cookie},
+            json=red_data
+        )
 
     try:
         r.raise_for_status()
@@ -294,10 +412,11 @@ def cancel_batch(experiment_id, agency_url, authorization_cookie):
     :raise ValueError: If the experiment contains not only one batch
     :raise AgencyError: If the batch id could not be found or the batch could not be cancelled
     """
-    r = requests.get(
-        url_join(agency_url, 'batches?experimentId={}'.format(experiment_id)),
-        cookies={AUTHORIZATION_COOKIE_KEY: authorization_cookie}
-    )
+    with metrics.time_agency_request('batches'):
+        r = requests.get(
+            url_join(agency_url, 'batches?experimentId={}'.format(experiment_id)),
+            cookies={AUTHORIZATION_COOKIE_KEY: authorization_cookie}
+        )
     try:
         r.raise_for_status()
     except requests.HTTPError as e:
@@ -309,10 +428,11 @@ def cancel_batch(experiment_id, agency_url, authorization_cookie):
         raise ValueError('Experiment has more than one batch.\nNumber of batches: {}'.format(len(batches)))
     batch_id = batches[0]['_id']
 
-    r = requests.delete(
-        url_join(agency_url, 'batches/{}'.format(batch_id)),
-        cookies={AUTHORIZATION_COOKIE_KEY: authorization_cookie}
-    )
+    with metrics.time_agency_request('batches/<id>', 'DELETE'):
+        r = requests.delete(
+            url_join(agency_url, 'batches/{}'.format(batch_id)),
+            cookies={AUTHORIZATION_COOKIE_KEY: authorization_cookie}
+        )
     try:
         r.raise_for_status()
     except requests.HTTPError as e:
@@ -0,0 +1,99 @@
+PROFILE_METADATA_KEY = 'cc_jupyter_service'
+
+
+class CellProfile:
+    def __init__(self, cell_index, wall_time, cpu_time, peak_rss):
+        """
+        Creates a CellProfile, which describes the resource usage of one executed cell.
+
+        :param cell_index: The index of the cell in the executed notebook
+        :type cell_index: int
+        :param wall_time: The wall time of the cell execution in seconds
+        :type wall_time: float
+        :param cpu_time: The cpu time of the kernel during the cell execution in seconds
+        :type cpu_time: float or None
+        :param peak_rss: The peak resident set size of the kernel during the cell execution in bytes
+        :type peak_rss: int or None
+        """
+        self.cell_index = cell_index
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.peak_rss = peak_rss
+
+    def to_json(self):
+        return {
+            'cell_index': self.cell_index,
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'peak_rss': self.peak_rss
+        }
+
+
+class ExecutionProfile:
+    def __init__(self, kernel_startup_time, pip_install_time, cell_profiles):
+        """
+        Creates an ExecutionProfile, which describes where the container time of a notebook execution was spent.
+
+        :param kernel_startup_time: The seconds until the kernel executed the first cell
+        :type kernel_startup_time: float or None
+        :param pip_install_time: The seconds spent installing the python requirements
+        :type pip_install_time: float or None
+        :param cell_profiles: The profiles of the executed cells
+        :type cell_profiles: list[CellProfile]
+        """
+        self.kernel_startup_time = kernel_startup_time
+        self.pip_install_time = pip_install_time
+        self.cell_profiles = cell_profiles
+
+    def to_json(self):
+        return {
+            'kernel_startup_time': self.kernel_startup_time,
+            'pip_install_time': self.pip_install_time,
+            'cells': [cell_profile.to_json() for cell_profile in self.cell_profiles]
+        }
+
+
+def _number_or_none(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def extract_profile(notebook_data):
+    """
+    Extracts the execution profile, that was written by the papermill wrapper into the metadata of a result notebook.
+
+    :param notebook_data: The result notebook
+    :type notebook_data: dict
+    :return: The execution profile or None, if the notebook does not contain a valid profile
+    :rtype: ExecutionProfile or None
+    """
+    try:
+        profile_data = notebook_data['metadata'][PROFILE_METADATA_KEY]['profile']
+        cells_data = profile_data['cells']
+    except (KeyError, TypeError):
+        return None
+    if not isinstance(profile_data, dict) or not isinstance(cells_data, list):
+        return None
+
+    cell_profiles = []
+    for cell_data in cells_data:
+        if not isinstance(cell_data, dict):
+            continue
+        cell_index = cell_data.get('index')
+        wall_time = _number_or_none(cell_data.get('wallTime'))
+        if isinstance(cell_index, bool) or not isinstance(cell_index, int) or wall_time is None:
+            continue
+        peak_rss = _number_or_none(cell_data.get('peakRss'))
+        cell_profiles.append(CellProfile(
+            cell_index,
+            wall_time,
+            _number_or_none(cell_data.get('cpuTime')),
+            int(peak_rss) if peak_rss is not None else None
+        ))
+
+    return ExecutionProfile(
+        _number_or_none(profile_data.get('kernelStartupTime')),
+        _number_or_none(profile_data.get('pipInstallTime')),
+        cell_profiles
+    )
@@ -1,6 +1,8 @@
 import requests
 from werkzeug.urls import url_fix, url_join
 
+from cc_jupyter_service.common import metrics
+
 
 AUTHORIZATION_COOKIE_KEY = 'authorization_cookie'
 
@@ -33,18 +35,24 @@ def check_agency(agency_url, agency_username, agency_password):
     :type agency_username: str
     :param agency_password: The password to use for authorization
     :type agency_password: str
-    :return: The authorization cookie of the agency
-    :rtype: str
+    :return: A tuple (authorization cookie, expiry time). The authorization cookie is None, if the agency did not set
+             one. The expiry time is a timestamp or None, if the cookie does not expire.
+    :rtype: tuple[str or None, float or None]
 
     :raise AgencyError: If the agency is not available or authentication information is invalid.
-    :rtype: str
     """
     agency_url = url_join(agency_url, 'nodes')
     response = None
     try:
-        response = requests.get(agency_url, auth=(agency_username, agency_password))
+        with metrics.time_agency_request('nodes'):
+            response = requests.get(agency_url, auth=(agency_username, agency_password))
         response.raise_for_status()
-        authorization_cookie = response.cookies.get(AUTHORIZATION_COOKIE_KEY)
+        authorization_cookie = None
+        expiry_time = None
+        for cookie in response.cookies:
+            if cookie.name == AUTHORIZATION_COOKIE_KEY:
+                authorization_cookie = cookie.value
+                expiry_time = cookie.expires
     except (requests.exceptions.HTTPError, requests.exceptions.ConnectionError) as e:
         if response is not None:
             raise AgencyError(
@@ -57,7 +65,7 @@ def check_agency(agency_url, agency_username, agency_password):
                 'Failed to verify agency "{}" for user "{}".\nmessage: {}'.format(agency_url, agency_username, str(e))
             )
 
-    return authorization_cookie
+    return authorization_cookie, expiry_time
 
 
 class AgencyError(Exception):
@@ -0,0 +1,181 @@
+import codecs
+import json
+import math
+
+from flask import request, current_app
+from werkzeug.exceptions import BadRequest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:  # flask < 2.2 has no json providers
+    DefaultJSONProvider = None
+
+
+JSON_MIMETYPE = 'application/json'
+
+
+def _contains_non_finite(data):
+    """
+    :return: True, if the given data contains the float NaN, Infinity or -Infinity
+    :rtype: bool
+    """
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(_contains_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_contains_non_finite(value) for value in data)
+    return False
+
+
+def _orjson_dumps(data, **kwargs):
+    """
+    Serializes the given data with orjson.
+
+    :return: The utf-8 encoded json or None, if orjson can not serialize the data without changing it
+    :rtype: bytes or None
+    """
+    try:
+        serialized = orjson.dumps(data, **kwargs)
+    except TypeError:  # orjson.JSONEncodeError is a TypeError
+        return None
+    # orjson writes NaN and Infinity as null, so the data is only searched for them, if the output contains null
+    if b'null' in serialized and _contains_non_finite(data):
+        return None
+    return serialized
+
+
+def dumps(data, sort_keys=False):
+    """
+    Serializes the given data as json. Uses orjson, if it is installed, otherwise the json module of the standard
+    library. Data orjson can not serialize without changing it, like integers larger than 64 bit or the floats NaN and
+    Infinity, is serialized by the standard library, which writes NaN and Infinity as the javascript constants.
+
+    :param data: The data to serialize
+    :param sort_keys: Whether the keys of dictionaries should be sorted
+    :type sort_keys: bool
+    :return: The utf-8 encoded json
+    :rtype: bytes
+    """
+    if orjson is not None:
+        serialized = _orjson_dumps(data, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+        if serialized is not None:
+            return serialized
+    return json.dumps(data, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """
+    Parses the given json data. Data orjson rejects, like the constants NaN and Infinity written by the json module of
+    the standard library, is parsed by the standard library.
+
+    :param data: The json data to parse
+    :type data: bytes or str
+    :return: The parsed data
+
+    :raise ValueError: If the given data is not valid json
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def dump(data, file):
+    """
+    Serializes the given data as json into the given binary file.
+
+    :param data: The data to serialize
+    :param file: A file object opened in binary mode
+    """
+    if orjson is not None:
+        file.write(dumps(data))
+    else:
+        json.dump(data, codecs.getwriter('utf-8')(file), separators=(',', ':'))
+
+
+def load(file):
+    """
+    Parses the json content of the given binary file.
+
+    :param file: A file object opened in binary mode
+    :return: The parsed data
+    """
+    return loads(file.read())
+
+
+def get_request_json():
+    """
+    Parses the body of the current request, if it is declared as json. The raw body is not cached by flask, so large
+    requests are not held twice in memory.
+
+    :return: The parsed request body or None, if the request is not declared as json
+
+    :raise BadRequest: If the request body is not valid json
+    """
+    if not request.is_json:
+        return None
+    try:
+        return loads(request.get_data(cache=False))
+    except ValueError as e:
+        raise BadRequest('Failed to decode json data. {}'.format(str(e)))
+
+
+def json_response(data, status=200):
+    """
+    Creates a json response of the given data.
+
+    :param data: The data to serialize
+    :param status: The status code of the response
+    :type status: int
+    :rtype: flask.Response
+    """
+    return current_app.response_class(dumps(data), status=status, mimetype=JSON_MIMETYPE)
+
+
+if DefaultJSONProvider is not None:
+    class FastJSONProvider(DefaultJSONProvider):
+        """
+        A flask json provider, that uses orjson for jsonify() and request.json.
+        """
+        def dumps(self, obj, **kwargs):
+            if kwargs.get('indent') is not None:
+                return super().dumps(obj, **kwargs)
+            serialized = _orjson_dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+            if serialized is None:
+                return super().dumps(obj, **kwargs)
+            return serialized.decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            if self.compact is False or (self.compact is None and self._app.debug):
+                return super().response(obj)
+            data = _orjson_dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+            if data is None:
+                return super().response(obj)
+            return self._app.response_class(data, mimetype=self.mimetype)
+else:
+    FastJSONProvider = None
+
+
+def init_app(app):
+    """
+    Installs the fast json provider for the given app, if flask supports json providers and orjson is installed.
+
+    :param app: The flask app
+    :type app: Flask
+    """
+    if FastJSONProvider is not None and orjson is not None:
+        app.json = FastJSONProvider(app)
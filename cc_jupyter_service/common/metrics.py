@@ -0,0 +1,174 @@
+import os
+import time
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+    multiprocess = None
+
+
+MULTIPROCESS_DIRECTORY_VARIABLES = ['PROMETHEUS_MULTIPROC_DIR', 'prometheus_multiproc_dir']
+SIZE_BUCKETS = (
+    1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2, 1024 ** 3, float('inf')
+)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+
+class _NoopMetric:
+    """
+    Replaces a prometheus metric, if the optional dependency prometheus_client is not installed. So instrumented code
+    does not need to check for it.
+    """
+    def labels(self, *_args, **_kwargs):
+        return self
+
+    def observe(self, _value):
+        pass
+
+    def inc(self, _amount=1):
+        pass
+
+
+def _histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return prometheus_client.Histogram(name, documentation, labelnames=labelnames, buckets=buckets)
+
+
+def _counter(name, documentation, labelnames=()):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return prometheus_client.Counter(name, documentation, labelnames=labelnames)
+
+
+AGENCY_REQUEST_LATENCY = _histogram(
+    'cc_jupyter_service_agency_request_seconds',
+    'Latency of requests to the agency',
+    labelnames=('endpoint', 'method')
+)
+DATABASE_LATENCY = _histogram(
+    'cc_jupyter_service_database_seconds',
+    'Latency of sqlite statements and commits',
+    labelnames=('operation',)
+)
+NOTEBOOK_SIZE = _histogram(
+    'cc_jupyter_service_notebook_bytes',
+    'Size of the notebooks read from and written to the notebook database',
+    labelnames=('kind', 'operation'),
+    buckets=SIZE_BUCKETS
+)
+NOTEBOOK_SUBMISSIONS = _counter(
+    'cc_jupyter_service_notebook_submissions',
+    'Number of notebooks submitted for execution'
+)
+EXECUTION_CACHE_HITS = _counter(
+    'cc_jupyter_service_execution_cache_hits',
+    'Number of submitted notebooks, that reused a cached result'
+)
+SLIMMED_NOTEBOOK_BYTES = _counter(
+    'cc_jupyter_service_slimmed_notebook_bytes',
+    'Number of bytes removed from submitted notebooks by slimming'
+)
+NOTEBOOK_STATUS_TRANSITIONS = _counter(
+    'cc_jupyter_service_notebook_status_transitions',
+    'Number of notebooks that entered a status',
+    labelnames=('status',)
+)
+TOKEN_VERIFICATION_LATENCY = _histogram(
+    'cc_jupyter_service_token_verification_seconds',
+    'Latency of the notebook token verification'
+)
+
+
+class Timer:
+    def __init__(self, histogram):
+        """
+        Context manager, that observes the duration of its block in the given histogram.
+
+        :param histogram: The histogram (with applied labels) to observe the duration in
+        """
+        self.histogram = histogram
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+def time_agency_request(endpoint, method='GET'):
+    """
+    :param endpoint: The agency endpoint, for example "red", "batches" or "nodes"
+    :type endpoint: str
+    :param method: The http method of the request
+    :type method: str
+    :return: A context manager, that observes the latency of an agency request
+    """
+    return Timer(AGENCY_REQUEST_LATENCY.labels(endpoint, method))
+
+
+def time_database(operation):
+    """
+    :param operation: The kind of database operation, for example "select" or "commit"
+    :type operation: str
+    :return: A context manager, that observes the latency of a database operation
+    """
+    return Timer(DATABASE_LATENCY.labels(operation))
+
+
+def is_available():
+    """
+    :return: True, if prometheus_client is installed and metrics are collected
+    :rtype: bool
+    """
+    return prometheus_client is not None
+
+
+def _multiprocess_directory():
+    for variable in MULTIPROCESS_DIRECTORY_VARIABLES:
+        directory = os.environ.get(variable)
+        if directory:
+            return directory
+    return None
+
+
+def generate_metrics():
+    """
+    Renders the current metrics in the prometheus text format.
+
+    If the service runs in a multi-process WSGI server (for example gunicorn with several workers), the environment
+    variable PROMETHEUS_MULTIPROC_DIR has to point to an empty directory, that is shared by all worker processes. The
+    metrics of all workers are then aggregated.
+
+    :return: A tuple containing the rendered metrics and their content type
+    :rtype: tuple[bytes, str]
+
+    :raise RuntimeError: If prometheus_client is not installed
+    """
+    if prometheus_client is None:
+        raise RuntimeError('Metrics are not available, because prometheus_client is not installed')
+
+    if _multiprocess_directory() is not None:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """
+    Removes the live metrics of a stopped worker process. Should be called by the process manager of the WSGI server,
+    if multi-process mode is used.
+
+    :param pid: The pid of the stopped worker process
+    :type pid: int
+    """
+    if multiprocess is not None and _multiprocess_directory() is not None:
+        multiprocess.mark_process_dead(pid)
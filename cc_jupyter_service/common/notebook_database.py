@@ -1,7 +1,15 @@
-import json
+import hashlib
 import os
+import uuid
 from uuid import UUID
 
+from cc_jupyter_service.common import metrics, json_codec
+from cc_jupyter_service.common.result_index import dump_indexed, BlobReference
+
+BLOB_DIRECTORY_NAME = 'blobs'
+UPLOAD_DIRECTORY_NAME = 'uploads'
+READ_BLOCK_SIZE = 1024 * 1024
+
 
 class NotebookCursor:
     def __init__(self, token):
@@ -24,6 +32,37 @@ class NotebookCursor:
         return
 
 
+class UploadSpool:
+    def __init__(self, temporary_path):
+        """
+        A temporary file, that computes the sha256 hash of its content, while it is written. It is passed as stream
+        factory to the multipart parser, so uploaded notebook files are written to disk once, while they arrive.
+
+        :param temporary_path: The path of the temporary file
+        :type temporary_path: str
+        """
+        self.temporary_path = temporary_path
+        self.size = 0
+        self._file = open(temporary_path, 'w+b')
+        self._content_hash = hashlib.sha256()
+
+    def write(self, data):
+        self._content_hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def get_content_hash(self):
+        """
+        :return: The hex encoded sha256 hash of the written content
+        :rtype: str
+        """
+        return self._content_hash.hexdigest()
+
+    def __getattr__(self, name):
+        # the multipart parser and FileStorage seek, read and close the file
+        return getattr(self._file, name)
+
+
 class NotebookDatabase:
     """
     This class manages jupyter notebook files on disk.
@@ -31,18 +70,42 @@ class NotebookDatabase:
     The database directory is ordered in the following way:
     / database_directory/
       / notebook_token.ipynb
+      / notebook_token_result.ipynb
+      / notebook_token_result.blobs.json
+      / blobs/
+        / blob_key.json
+      / uploads/
+        / content_hash.ipynb
+
+    If a blob threshold is set, output data of result notebooks larger than the threshold is moved into blob files,
+    which are named by the sha256 hash of their content, so equal outputs are stored once. The result notebook file
+    contains reference strings instead and the positions of these references are saved next to the notebook file. The
+    full notebook is reassembled while it is read.
+
+    Uploaded notebook files are stored unchanged under the sha256 hash of their content, so a client can skip the
+    upload of files, that are already present.
     """
-    def __init__(self, database_directory):
+    def __init__(self, database_directory, blob_threshold=None):
         """
         Creates a NotebookDatabase that manages notebook files under the given database directory.
 
         :param database_directory: The base directory of the notebooks to save
         :type database_directory: str
+        :param blob_threshold: Output data larger than this number of bytes is stored in blob files. If None, outputs
+                               are stored inline.
+        :type blob_threshold: int or None
         """
         self.database_directory = database_directory
+        self.blob_threshold = blob_threshold
+        self.blob_directory = os.path.join(database_directory, BLOB_DIRECTORY_NAME)
+        self.upload_directory = os.path.join(database_directory, UPLOAD_DIRECTORY_NAME)
 
         if not os.path.isdir(database_directory):
             os.makedirs(database_directory)
+        if blob_threshold is not None and not os.path.isdir(self.blob_directory):
+            os.makedirs(self.blob_directory)
+        if not os.path.isdir(self.upload_directory):
+            os.makedirs(self.upload_directory)
 
     def notebook_id_to_path(self, notebook_id, is_result):
         """
@@ -59,6 +122,112 @@ class NotebookDatabase:
 
         return os.path.join(self.database_directory, notebook_format_string.format(notebook_id))
 
+    def _blob_references_path(self, notebook_id, is_result):
+        notebook_format_string = '{}_result.blobs.json' if is_result else '{}.blobs.json'
+        return os.path.join(self.database_directory, notebook_format_string.format(notebook_id))
+
+    def blob_path(self, blob_key):
+        """
+        :param blob_key: The key of the blob
+        :type blob_key: str
+        :return: The path of the blob file
+        :rtype: str
+        """
+        return os.path.join(self.blob_directory, '{}.json'.format(blob_key))
+
+    def _write_blob(self, serialized_data):
+        """
+        Saves the given data in a blob file, if it is larger than the blob threshold.
+
+        :param serialized_data: The json data to save
+        :type serialized_data: bytes
+        :return: The key of the blob or None, if the data is not large enough
+        :rtype: str or None
+        """
+        if self.blob_threshold is None or len(serialized_data) <= self.blob_threshold:
+            return None
+        blob_key = hashlib.sha256(serialized_data).hexdigest()
+        path = self.blob_path(blob_key)
+        if not os.path.isfile(path):
+            # other processes could write the same blob concurrently, so the blob is renamed to its final path
+            temporary_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+            with open(temporary_path, 'wb') as blob_file:
+                blob_file.write(serialized_data)
+            os.replace(temporary_path, path)
+        return blob_key
+
+    def upload_path(self, content_hash):
+        """
+        :param content_hash: The sha256 hash of the uploaded notebook file
+        :type content_hash: str
+        :return: The path of the uploaded notebook file
+        :rtype: str
+        """
+        return os.path.join(self.upload_directory, '{}.ipynb'.format(content_hash))
+
+    def open_upload_spool(self):
+        """
+        Creates a temporary file in the upload directory, that receives an uploaded notebook file. The spool has to be
+        committed with commit_upload() or removed with discard_upload().
+
+        :rtype: UploadSpool
+        """
+        return UploadSpool(os.path.join(self.upload_directory, '{}.tmp'.format(uuid.uuid4().hex)))
+
+    def commit_upload(self, temporary_path, content_hash):
+        """
+        Moves a spooled upload to its final path.
+
+        :param temporary_path: The temporary path of the spool
+        :type temporary_path: str
+        :param content_hash: The content hash of the spool
+        :type content_hash: str
+        """
+        # other processes could commit the same upload concurrently, which is fine, because the content is equal
+        os.replace(temporary_path, self.upload_path(content_hash))
+
+    @staticmethod
+    def discard_upload(temporary_path):
+        """
+        Removes a spooled upload, if it was not committed.
+
+        :param temporary_path: The temporary path of the spool
+        :type temporary_path: str
+        """
+        if os.path.isfile(temporary_path):
+            os.remove(temporary_path)
+
+    def remove_upload(self, content_hash):
+        """
+        Removes an uploaded notebook file, if it is present.
+
+        :param content_hash: The sha256 hash of the notebook file
+        :type content_hash: str
+        """
+        try:
+            os.remove(self.upload_path(content_hash))
+        except FileNotFoundError:
+            pass
+
+    def check_upload(self, content_hash):
+        """
+        :param content_hash: The sha256 hash of the notebook file
+        :type content_hash: str
+        :return: Whether the uploaded notebook file is present
+        :rtype: bool
+        """
+        return os.path.isfile(self.upload_path(content_hash))
+
+    def get_upload(self, content_hash):
+        """
+        :param content_hash: The sha256 hash of the notebook file
+        :type content_hash: str
+        :return: The data of the uploaded notebook
+        :rtype: object
+        """
+        with open(self.upload_path(content_hash), 'rb') as file:
+            return json_codec.load(file)
+
     def save_notebook(self, notebook_data, notebook_id, is_result=False):
         """
         Saves the given notebook on the filesystem.
@@ -69,12 +238,131 @@ class NotebookDatabase:
         :type notebook_id: str
         :param is_result: Whether the given notebook is the result or not
         :type is_result: bool
-        :return: A NotebookCursor pointing to the created file
-        :rtype: NotebookCursor
+        :return: The size of the saved notebook file in bytes
+        :rtype: int
         """
         path = self.notebook_id_to_path(notebook_id, is_result)
-        with open(path, 'w') as file:
-            json.dump(notebook_data, file)
+        with open(path, 'wb') as file:
+            json_codec.dump(notebook_data, file)
+            size = file.tell()
+        metrics.NOTEBOOK_SIZE.labels(_notebook_kind(is_result), 'save').observe(size)
+        return size
+
+    def save_indexed_notebook(self, notebook_data, notebook_id, is_result=True):
+        """
+        Saves the given notebook on the filesystem and records the byte positions of its cells and outputs, so single
+        cells can be read later with read_ranges(). If a blob threshold is set, large output data is moved into blob
+        files.
+
+        :param notebook_data: The notebook file data
+        :type notebook_data: object
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param is_result: Whether the given notebook is the result or not
+        :type is_result: bool
+        :return: A tuple (size, cell positions). The size of the saved notebook file and its blobs in bytes and the
+                 positions of the cells of the notebook.
+        :rtype: tuple[int, list[CellIndexEntry]]
+        """
+        path = self.notebook_id_to_path(notebook_id, is_result)
+        blob_writer = self._write_blob if self.blob_threshold is not None else None
+        with open(path, 'wb') as file:
+            cell_entries = dump_indexed(notebook_data, file, blob_writer)
+            size = file.tell()
+        metrics.NOTEBOOK_SIZE.labels(_notebook_kind(is_result), 'save').observe(size)
+
+        blob_references = [
+            blob_reference
+            for cell_entry in cell_entries
+            for output_entry in cell_entry.outputs
+            for blob_reference in output_entry.blobs
+        ]
+        references_path = self._blob_references_path(notebook_id, is_result)
+        if blob_references:
+            with open(references_path, 'wb') as references_file:
+                json_codec.dump([blob_reference.to_json() for blob_reference in blob_references], references_file)
+        elif os.path.isfile(references_path):
+            os.remove(references_path)
+
+        return size + sum(blob_reference.blob_size for blob_reference in blob_references), cell_entries
+
+    def get_blob_references(self, notebook_id, is_result=True):
+        """
+        Returns the output data of the given notebook, that is stored in blob files.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param is_result: Whether the references of the result notebook should be returned
+        :type is_result: bool
+        :return: The blob references ordered by their position in the notebook file
+        :rtype: list[BlobReference]
+        """
+        try:
+            with open(self._blob_references_path(notebook_id, is_result), 'rb') as references_file:
+                return [BlobReference.from_json(data) for data in json_codec.load(references_file)]
+        except FileNotFoundError:
+            return []
+
+    def open_blob(self, blob_key):
+        """
+        Returns a binary file object, that contains the serialized json data of the given blob.
+
+        :param blob_key: The key of the blob
+        :type blob_key: str
+        :return: A file object
+        """
+        return open(self.blob_path(blob_key), 'rb')
+
+    def get_notebook_size(self, notebook_id, is_result=False):
+        """
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param is_result: Whether the size of the result notebook should be returned
+        :type is_result: bool
+        :return: The size in bytes of the notebook, as it is read by iter_notebook_file()
+        :rtype: int
+        """
+        size = os.path.getsize(self.notebook_id_to_path(notebook_id, is_result))
+        for blob_reference in self.get_blob_references(notebook_id, is_result):
+            size += blob_reference.blob_size - blob_reference.length
+        return size
+
+    def iter_notebook_file(self, notebook_id, is_result=False):
+        """
+        Reads the given notebook file in blocks without parsing it. Blob references are replaced by the content of the
+        blob files, so the full notebook is produced.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param is_result: Whether the result notebook should be read
+        :type is_result: bool
+        :return: A generator yielding the bytes of the notebook
+        """
+        blob_references = self.get_blob_references(notebook_id, is_result)
+        with self.open_notebook_file(notebook_id, is_result=is_result) as notebook_file:
+            for blob_reference in blob_references:
+                yield from _read_blocks(notebook_file, blob_reference.offset - notebook_file.tell())
+                notebook_file.seek(blob_reference.length, os.SEEK_CUR)
+                with self.open_blob(blob_reference.blob_key) as blob_file:
+                    yield from _read_blocks(blob_file)
+            yield from _read_blocks(notebook_file)
+
+    def read_ranges(self, notebook_id, ranges, is_result=True):
+        """
+        Reads the given byte ranges of a notebook file. The file is opened once and only the given ranges are read.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param ranges: The tuples (offset, length) to read
+        :type ranges: list[tuple[int, int]]
+        :param is_result: Whether the result notebook should be read
+        :type is_result: bool
+        :return: A generator yielding the bytes of every range
+        """
+        with open(self.notebook_id_to_path(notebook_id, is_result), 'rb') as notebook_file:
+            for offset, length in ranges:
+                notebook_file.seek(offset)
+                yield notebook_file.read(length)
 
     def check_notebook(self, notebook_id, is_result=False):
         """
@@ -100,13 +388,18 @@ class NotebookDatabase:
         :return: The requested notebook data
         :rtype: object
         """
+        if self.get_blob_references(notebook_id, is_result):
+            return json_codec.loads(b''.join(self.iter_notebook_file(notebook_id, is_result)))
+
         path = self.notebook_id_to_path(notebook_id, is_result)
-        with open(path, 'r') as file:
-            return json.load(file)
+        with open(path, 'rb') as file:
+            metrics.NOTEBOOK_SIZE.labels(_notebook_kind(is_result), 'load').observe(os.fstat(file.fileno()).st_size)
+            return json_codec.load(file)
 
     def open_notebook_file(self, notebook_id, is_result=False):
         """
-        Returns a file object, that contains the given notebook
+        Returns a binary file object, that contains the given notebook. Output data stored in blob files is not
+        included, use iter_notebook_file() to read the full notebook.
 
         :param notebook_id: The notebook to open
         :type notebook_id: str
@@ -116,4 +409,24 @@ class NotebookDatabase:
         :rtype: o
         """
         path = self.notebook_id_to_path(notebook_id, is_result)
-        return open(path, 'r')
+        notebook_file = open(path, 'rb')
+        notebook_size = os.fstat(notebook_file.fileno()).st_size
+        metrics.NOTEBOOK_SIZE.labels(_notebook_kind(is_result), 'open').observe(notebook_size)
+        return notebook_file
+
+
+def _read_blocks(file, size=None):
+    """
+    Reads the given number of bytes or the rest of the given file in blocks.
+    """
+    while size is None or size > 0:
+        block = file.read(READ_BLOCK_SIZE if size is None else min(READ_BLOCK_SIZE, size))
+        if not block:
+            break
+        if size is not None:
+            size -= len(block)
+        yield block
+
+
+def _notebook_kind(is_result):
+    return 'result' if is_result else 'notebook'
@@ -0,0 +1,65 @@
+from cc_jupyter_service.common import json_codec
+
+# metadata keys, that are removed from the notebook and cell metadata by default. "widgets" holds the state of ipython
+# widgets, "ExecuteTime" and "execution" hold cell timings written by jupyter extensions and jupyterlab.
+DEFAULT_SLIM_METADATA_KEYS = ['widgets', 'ExecuteTime', 'execution']
+EMPTY_OUTPUTS_SIZE = len(json_codec.dumps([]))
+EMPTY_EXECUTION_COUNT_SIZE = len(json_codec.dumps(None))
+
+
+def _slim_metadata(metadata, metadata_keys):
+    """
+    :return: A tuple containing a copy of the given metadata without the given keys and the number of removed bytes
+    :rtype: tuple[dict, int]
+    """
+    removed_keys = [key for key in metadata_keys if key in metadata]
+    if not removed_keys:
+        return metadata, 0
+    bytes_saved = len(json_codec.dumps({key: metadata[key] for key in removed_keys})) - len(json_codec.dumps({}))
+    return {key: value for key, value in metadata.items() if key not in removed_keys}, bytes_saved
+
+
+def slim_notebook(notebook_data, metadata_keys):
+    """
+    Removes the parts of an input notebook, that papermill overwrites or ignores during the execution: the outputs and
+    execution counts of all code cells and the given keys of the notebook and cell metadata. The cell sources, cell
+    tags and the kernelspec are kept, so the execution is not changed.
+
+    The given notebook is not modified, only the changed cells are copied.
+
+    :param notebook_data: The validated input notebook
+    :type notebook_data: dict
+    :param metadata_keys: The keys to remove from the notebook metadata and the metadata of every cell
+    :type metadata_keys: list[str]
+    :return: A tuple containing the slimmed notebook and the number of bytes removed from its serialized form. The
+             number of bytes is exact up to the separators between the removed values.
+    :rtype: tuple[dict, int]
+    """
+    bytes_saved = 0
+    slimmed_notebook = dict(notebook_data)
+
+    metadata, metadata_bytes_saved = _slim_metadata(notebook_data.get('metadata', {}), metadata_keys)
+    if metadata_bytes_saved:
+        slimmed_notebook['metadata'] = metadata
+        bytes_saved += metadata_bytes_saved
+
+    slimmed_cells = []
+    for cell in notebook_data.get('cells', []):
+        slimmed_cell = cell
+        if cell.get('cell_type') == 'code':
+            outputs = cell.get('outputs', [])
+            execution_count = cell.get('execution_count')
+            if outputs or execution_count is not None:
+                slimmed_cell = dict(cell, outputs=[], execution_count=None)
+                bytes_saved += len(json_codec.dumps(outputs)) - EMPTY_OUTPUTS_SIZE
+                bytes_saved += len(json_codec.dumps(execution_count)) - EMPTY_EXECUTION_COUNT_SIZE
+
+        cell_metadata, cell_metadata_bytes_saved = _slim_metadata(cell.get('metadata', {}), metadata_keys)
+        if cell_metadata_bytes_saved:
+            slimmed_cell = dict(slimmed_cell, metadata=cell_metadata)
+            bytes_saved += cell_metadata_bytes_saved
+        slimmed_cells.append(slimmed_cell)
+
+    if 'cells' in notebook_data:
+        slimmed_notebook['cells'] = slimmed_cells
+    return slimmed_notebook, bytes_saved
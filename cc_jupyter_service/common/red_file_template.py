@@ -98,3 +98,47 @@ RED_FILE_TEMPLATE = {
         }
     }
 }
+
+# The inputs, that let the papermill wrapper report the progress and status to this jupyter service. They are only added
+# to the red data, if execution reports are enabled, because papermill wrappers of images built before these options
+# were added pass every argument containing "=" to the notebook as parameter, which fails the execution.
+REPORT_CLI_INPUTS = {
+    "progressUrl": {
+        "type": "string",
+        "inputBinding": {"prefix": "--progress-url=", "separate": False}
+    },
+    "statusUrl": {
+        "type": "string",
+        "inputBinding": {"prefix": "--status-url=", "separate": False}
+    },
+    "serviceUsername": {
+        "type": "string",
+        "inputBinding": {"prefix": "--service-username=", "separate": False}
+    },
+    "serviceTokenFile": {
+        "type": "File",
+        "inputBinding": {"prefix": "--service-token-file=", "separate": False}
+    }
+}
+
+REPORT_INPUTS = {
+    "progressUrl": None,  # replaced with the progress url of this jupyter service
+    "statusUrl": None,  # replaced with the status url of this jupyter service
+    "serviceUsername": None,  # replaced with the username of the request
+    "serviceTokenFile": {
+        # the token is passed as file, so it is not visible in the process list of the container
+        "class": "File",
+        "connector": {
+            "command": "red-connector-http",
+            "access": {
+                "url": None,  # replaced with the service token url of this jupyter service
+                "method": "GET",
+                "auth": {
+                    "username": None,  # replaced with the username of the request
+                    "password": None  # replaced with the generated token
+                }
+            }
+        },
+        "basename": "service_token.txt"
+    }
+}
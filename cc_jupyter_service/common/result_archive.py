@@ -0,0 +1,138 @@
+import time
+import zipfile
+import zlib
+
+from cc_jupyter_service.common import json_codec
+
+MANIFEST_FILENAME = 'manifest.json'
+# the beginning of every file is compressed with this number of bytes to decide, whether the file is compressible
+COMPRESSION_SAMPLE_SIZE = 64 * 1024
+# files, whose sample shrinks less than this ratio, are stored without compression
+MIN_COMPRESSION_SAVING = 0.1
+
+
+class _ArchiveBuffer:
+    """
+    An unseekable file object, that collects the bytes written by a ZipFile until they are drained.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """
+        :return: A list containing the bytes written since the last call or an empty list, if nothing was written
+        :rtype: list[bytes]
+        """
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return [data] if data else []
+
+
+def choose_compress_type(sample):
+    """
+    Decides, whether a file should be deflated. Files containing mostly compressed data, like base64 encoded images, do
+    not shrink enough to be worth compressing again.
+
+    :param sample: The beginning of the file
+    :type sample: bytes
+    :return: zipfile.ZIP_DEFLATED or zipfile.ZIP_STORED
+    :rtype: int
+    """
+    sample = sample[:COMPRESSION_SAMPLE_SIZE]
+    if not sample:
+        return zipfile.ZIP_STORED
+    if len(zlib.compress(sample, 1)) > len(sample) * (1 - MIN_COMPRESSION_SAVING):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _read_head(blocks, size):
+    """
+    Reads blocks from the given iterator, until they contain at least the given number of bytes.
+    """
+    head_blocks = []
+    head_size = 0
+    for block in blocks:
+        head_blocks.append(block)
+        head_size += len(block)
+        if head_size >= size:
+            break
+    return head_blocks
+
+
+def _archive_path(notebook, used_paths):
+    archive_path = '{}Result.ipynb'.format(notebook.get_filename_without_ext())
+    if archive_path in used_paths:
+        archive_path = '{}Result_{}.ipynb'.format(notebook.get_filename_without_ext(), notebook.notebook_id)
+    used_paths.add(archive_path)
+    return archive_path
+
+
+def _zip_info(archive_path, timestamp, file_size=0):
+    # zip timestamps can not represent dates before 1980
+    date_time = time.localtime(max(timestamp, 315532800))[:6]
+    zip_info = zipfile.ZipInfo(archive_path, date_time=date_time)
+    zip_info.file_size = file_size
+    return zip_info
+
+
+def iter_result_archive(notebook_database, notebooks):
+    """
+    Builds a zip archive of the result files of the given notebooks, while it is sent. The archive is never held in
+    memory or on disk completely, only one block of a result file and its compressed form are buffered at a time.
+
+    Every result file is stored as "<filename>Result.ipynb". Results with a compressible beginning are deflated, all
+    others are stored as they are. The archive ends with the file "manifest.json", which lists the status, filename and
+    archive path of every notebook. Notebooks without a result are only listed in the manifest.
+
+    :param notebook_database: The database containing the result files
+    :type notebook_database: NotebookDatabase
+    :param notebooks: The notebooks, whose results should be archived
+    :type notebooks: list[DatabaseAPI.Notebook]
+    :return: A generator yielding the bytes of the zip archive
+    """
+    buffer = _ArchiveBuffer()
+    manifest = []
+    used_paths = {MANIFEST_FILENAME}
+    with zipfile.ZipFile(buffer, 'w', allowZip64=True) as archive:
+        for notebook in notebooks:
+            result_id = notebook.get_result_id()
+            manifest_entry = {
+                'notebookId': notebook.notebook_id,
+                'filename': notebook.notebook_filename,
+                'status': str(notebook.status),
+                'executionTime': notebook.execution_time,
+                'path': None
+            }
+            manifest.append(manifest_entry)
+            if not notebook_database.check_notebook(result_id, True):
+                continue
+
+            archive_path = _archive_path(notebook, used_paths)
+            zip_info = _zip_info(
+                archive_path, notebook.execution_time, notebook_database.get_notebook_size(result_id, is_result=True)
+            )
+            blocks = notebook_database.iter_notebook_file(result_id, is_result=True)
+            head_blocks = _read_head(blocks, COMPRESSION_SAMPLE_SIZE)
+            zip_info.compress_type = choose_compress_type(b''.join(head_blocks))
+            with archive.open(zip_info, 'w') as archive_file:
+                for block in head_blocks:
+                    archive_file.write(block)
+                yield from buffer.drain()
+                for block in blocks:
+                    archive_file.write(block)
+                    yield from buffer.drain()
+            yield from buffer.drain()
+            manifest_entry['path'] = archive_path
+
+        manifest_info = _zip_info(MANIFEST_FILENAME, time.time())
+        manifest_info.compress_type = zipfile.ZIP_DEFLATED
+        archive.writestr(manifest_info, json_codec.dumps({'notebooks': manifest}))
+    yield from buffer.drain()
@@ -0,0 +1,221 @@
+from cc_jupyter_service.common import json_codec
+
+# the prefix of the strings, that replace output data stored in blob files
+BLOB_REFERENCE_PREFIX = 'cc-blob:'
+
+
+class BlobReference:
+    def __init__(self, offset, length, blob_key, mime_type, blob_size):
+        """
+        Describes output data, that was moved into a blob file and replaced by a reference string in the notebook file.
+
+        :param offset: The byte offset of the reference string in the notebook file
+        :type offset: int
+        :param length: The length of the reference string in bytes
+        :type length: int
+        :param blob_key: The key of the blob file
+        :type blob_key: str
+        :param mime_type: The mime type of the output data
+        :type mime_type: str
+        :param blob_size: The size of the serialized output data in the blob file in bytes
+        :type blob_size: int
+        """
+        self.offset = offset
+        self.length = length
+        self.blob_key = blob_key
+        self.mime_type = mime_type
+        self.blob_size = blob_size
+
+    def to_json(self):
+        return [self.offset, self.length, self.blob_key, self.mime_type, self.blob_size]
+
+    @staticmethod
+    def from_json(data):
+        return BlobReference(*data)
+
+
+class OutputIndexEntry:
+    def __init__(self, cell_index, output_index, output_type, mime_types, offset, length, blobs=None):
+        """
+        Describes the position of one cell output in a saved notebook file.
+
+        :param cell_index: The index of the cell containing this output
+        :type cell_index: int
+        :param output_index: The index of the output in the outputs of the cell
+        :type output_index: int
+        :param output_type: The output type, for example "stream" or "display_data"
+        :type output_type: str or None
+        :param mime_types: The mime types of the data of this output
+        :type mime_types: list[str]
+        :param offset: The byte offset of the output in the notebook file
+        :type offset: int
+        :param length: The length of the output in bytes
+        :type length: int
+        :param blobs: The data of this output, that was moved into blob files
+        :type blobs: list[BlobReference] or None
+        """
+        self.cell_index = cell_index
+        self.output_index = output_index
+        self.output_type = output_type
+        self.mime_types = mime_types
+        self.offset = offset
+        self.length = length
+        self.blobs = blobs if blobs is not None else []
+
+
+class CellIndexEntry:
+    def __init__(self, cell_index, cell_type, offset, length, source_offset, source_length, outputs):
+        """
+        Describes the position of one cell in a saved notebook file.
+
+        :param cell_index: The index of the cell
+        :type cell_index: int
+        :param cell_type: The type of the cell, for example "code" or "markdown"
+        :type cell_type: str or None
+        :param offset: The byte offset of the cell in the notebook file
+        :type offset: int
+        :param length: The length of the cell in bytes
+        :type length: int
+        :param source_offset: The byte offset of the source of the cell or None, if the cell has no source
+        :type source_offset: int or None
+        :param source_length: The length of the source in bytes or None, if the cell has no source
+        :type source_length: int or None
+        :param outputs: The positions of the outputs of the cell
+        :type outputs: list[OutputIndexEntry]
+        """
+        self.cell_index = cell_index
+        self.cell_type = cell_type
+        self.offset = offset
+        self.length = length
+        self.source_offset = source_offset
+        self.source_length = source_length
+        self.outputs = outputs
+
+
+def dump_indexed(notebook_data, file, blob_writer=None):
+    """
+    Serializes the given notebook as json into the given binary file and records the byte positions of every cell,
+    its source and its outputs. The file content is valid json with the same data as written by json_codec.dump().
+
+    If a blob_writer is given, it is called with the serialized data of every output mime type and the text of every
+    stream output. If it returns a blob key, the data is replaced by the string BLOB_REFERENCE_PREFIX + blob key.
+
+    :param notebook_data: The notebook to save
+    :type notebook_data: dict
+    :param file: A file object opened in binary mode
+    :param blob_writer: A function (serialized data) -> blob key or None, that stores large output data
+    :type blob_writer: Callable[[bytes], str or None] or None
+    :return: The positions of the cells of the notebook. Empty, if the notebook has no list of cells.
+    :rtype: list[CellIndexEntry]
+    """
+    if not isinstance(notebook_data, dict) or not isinstance(notebook_data.get('cells'), list):
+        json_codec.dump(notebook_data, file)
+        return []
+
+    cell_entries = []
+
+    def write_cells(cells):
+        file.write(b'[')
+        for cell_index, cell in enumerate(cells):
+            if cell_index > 0:
+                file.write(b',')
+            cell_entries.append(_dump_indexed_cell(cell, cell_index, file, blob_writer))
+        file.write(b']')
+
+    _dump_object(notebook_data, file, {'cells': write_cells})
+    return cell_entries
+
+
+def _dump_indexed_cell(cell, cell_index, file, blob_writer):
+    offset = file.tell()
+    if not isinstance(cell, dict):
+        file.write(json_codec.dumps(cell))
+        return CellIndexEntry(cell_index, None, offset, file.tell() - offset, None, None, [])
+
+    source_position = []
+    output_entries = []
+
+    def write_source(source):
+        source_offset = file.tell()
+        file.write(json_codec.dumps(source))
+        source_position.extend([source_offset, file.tell() - source_offset])
+
+    def write_outputs(outputs):
+        if not isinstance(outputs, list):
+            file.write(json_codec.dumps(outputs))
+            return
+        file.write(b'[')
+        for output_index, output in enumerate(outputs):
+            if output_index > 0:
+                file.write(b',')
+            output_offset = file.tell()
+            output_type = None
+            mime_types = []
+            blobs = []
+            if isinstance(output, dict):
+                output_type = output.get('output_type')
+                if isinstance(output.get('data'), dict):
+                    mime_types = list(output['data'].keys())
+                elif output_type == 'stream':
+                    mime_types = ['text/plain']
+            if blob_writer is not None and isinstance(output, dict):
+                _dump_output(output, file, blob_writer, blobs)
+            else:
+                file.write(json_codec.dumps(output))
+            output_entries.append(OutputIndexEntry(
+                cell_index, output_index, output_type, mime_types, output_offset, file.tell() - output_offset, blobs
+            ))
+        file.write(b']')
+
+    _dump_object(cell, file, {'source': write_source, 'outputs': write_outputs})
+    source_offset, source_length = source_position if source_position else (None, None)
+    return CellIndexEntry(
+        cell_index, cell.get('cell_type'), offset, file.tell() - offset, source_offset, source_length, output_entries
+    )
+
+
+def _dump_output(output, file, blob_writer, blobs):
+    """
+    Writes the given output and replaces its data by blob references, if the blob_writer stores it.
+    """
+    def blob_value_writer(mime_type):
+        def write_value(value):
+            serialized = json_codec.dumps(value)
+            blob_key = blob_writer(serialized)
+            if blob_key is None:
+                file.write(serialized)
+                return
+            offset = file.tell()
+            file.write(json_codec.dumps(BLOB_REFERENCE_PREFIX + blob_key))
+            blobs.append(BlobReference(offset, file.tell() - offset, blob_key, mime_type, len(serialized)))
+        return write_value
+
+    def write_data(data):
+        if not isinstance(data, dict):
+            file.write(json_codec.dumps(data))
+            return
+        _dump_object(data, file, {mime_type: blob_value_writer(mime_type) for mime_type in data})
+
+    value_writers = {'data': write_data}
+    if output.get('output_type') == 'stream':
+        value_writers['text'] = blob_value_writer('text/plain')
+    _dump_object(output, file, value_writers)
+
+
+def _dump_object(data, file, value_writers):
+    """
+    Writes the given dictionary as json object. The values of the keys in value_writers are written by the given
+    functions.
+    """
+    file.write(b'{')
+    for index, (key, value) in enumerate(data.items()):
+        if index > 0:
+            file.write(b',')
+        file.write(json_codec.dumps(key))
+        file.write(b':')
+        value_writer = value_writers.get(key)
+        if value_writer is not None:
+            value_writer(value)
+        else:
+            file.write(json_codec.dumps(value))
+    file.write(b'}')
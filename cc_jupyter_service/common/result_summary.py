@@ -0,0 +1,128 @@
+DEAD_KERNEL_ERROR_NAME = 'DeadKernelError'
+# the first error is truncated to this number of characters
+MAX_FIRST_ERROR_LENGTH = 500
+
+
+class ResultSummary:
+    def __init__(
+            self, cell_count, error_cell_count, first_error_cell_index, first_error, duration, output_bytes,
+            image_count, kernel_died
+    ):
+        """
+        Creates a ResultSummary, which describes a result notebook without the need to read the notebook file.
+
+        :param cell_count: The number of cells of the result notebook
+        :type cell_count: int
+        :param error_cell_count: The number of cells with an error output
+        :type error_cell_count: int
+        :param first_error_cell_index: The index of the first cell with an error output or None
+        :type first_error_cell_index: int or None
+        :param first_error: The name and value of the first error or None
+        :type first_error: str or None
+        :param duration: The execution duration in seconds reported by papermill or None, if it is unknown
+        :type duration: float or None
+        :param output_bytes: The size of all cell outputs in the result file in bytes
+        :type output_bytes: int
+        :param image_count: The number of outputs containing an image
+        :type image_count: int
+        :param kernel_died: Whether the kernel died during the execution
+        :type kernel_died: bool
+        """
+        self.cell_count = cell_count
+        self.error_cell_count = error_cell_count
+        self.first_error_cell_index = first_error_cell_index
+        self.first_error = first_error
+        self.duration = duration
+        self.output_bytes = output_bytes
+        self.image_count = image_count
+        self.kernel_died = kernel_died
+
+    def to_json(self):
+        return {
+            'cell_count': self.cell_count,
+            'error_cell_count': self.error_cell_count,
+            'first_error_cell_index': self.first_error_cell_index,
+            'first_error': self.first_error,
+            'duration': self.duration,
+            'output_bytes': self.output_bytes,
+            'image_count': self.image_count,
+            'kernel_died': self.kernel_died
+        }
+
+
+def _number_or_none(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def _papermill_metadata(data):
+    metadata = data.get('metadata') if isinstance(data, dict) else None
+    papermill_metadata = metadata.get('papermill') if isinstance(metadata, dict) else None
+    return papermill_metadata if isinstance(papermill_metadata, dict) else {}
+
+
+def _format_error(output):
+    error = '{}: {}'.format(output.get('ename'), output.get('evalue'))
+    if len(error) > MAX_FIRST_ERROR_LENGTH:
+        error = error[:MAX_FIRST_ERROR_LENGTH - 3] + '...'
+    return error
+
+
+def extract_summary(notebook_data, cell_entries):
+    """
+    Extracts the summary of a result notebook. The output sizes are taken from the cell index of the saved result file,
+    including the output data stored in blob files.
+
+    :param notebook_data: The result notebook
+    :type notebook_data: dict
+    :param cell_entries: The positions of the cells in the saved result file
+    :type cell_entries: list[CellIndexEntry]
+    :return: The summary or None, if the notebook has no list of cells
+    :rtype: ResultSummary or None
+    """
+    cells = notebook_data.get('cells') if isinstance(notebook_data, dict) else None
+    if not isinstance(cells, list):
+        return None
+
+    error_cell_count = 0
+    first_error_cell_index = None
+    first_error = None
+    kernel_died = False
+    cell_durations = []
+    for cell_index, cell in enumerate(cells):
+        if not isinstance(cell, dict):
+            continue
+        cell_duration = _number_or_none(_papermill_metadata(cell).get('duration'))
+        if cell_duration is not None:
+            cell_durations.append(cell_duration)
+
+        outputs = cell.get('outputs')
+        errors = [
+            output for output in outputs if isinstance(output, dict) and output.get('output_type') == 'error'
+        ] if isinstance(outputs, list) else []
+        if not errors:
+            continue
+        error_cell_count += 1
+        if first_error is None:
+            first_error_cell_index = cell_index
+            first_error = _format_error(errors[0])
+        if any(error.get('ename') == DEAD_KERNEL_ERROR_NAME for error in errors):
+            kernel_died = True
+
+    duration = _number_or_none(_papermill_metadata(notebook_data).get('duration'))
+    if duration is None and cell_durations:
+        duration = sum(cell_durations)
+
+    output_bytes = 0
+    image_count = 0
+    for cell_entry in cell_entries:
+        for output in cell_entry.outputs:
+            output_bytes += output.length + sum(blob.blob_size - blob.length for blob in output.blobs)
+            if any(mime_type.startswith('image/') for mime_type in output.mime_types):
+                image_count += 1
+
+    return ResultSummary(
+        len(cells), error_cell_count, first_error_cell_index, first_error, duration, output_bytes, image_count,
+        kernel_died
+    )
@@ -0,0 +1,32 @@
+cancel_schema = {
+    'type': 'object',
+    'properties': {
+        'notebookIds': {
+            'type': 'array',
+            'items': {'type': 'string'},
+            'minItems': 1
+        },
+        'submissionId': {'type': 'string'},
+        'filter': {
+            'type': 'object',
+            'properties': {
+                'status': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'string',
+                        'enum': ['processing', 'queued']
+                    },
+                    'minItems': 1
+                },
+                'filenamePattern': {'type': 'string'}
+            },
+            'additionalProperties': False
+        }
+    },
+    'oneOf': [
+        {'required': ['notebookIds']},
+        {'required': ['submissionId']},
+        {'required': ['filter']}
+    ],
+    'additionalProperties': False
+}
@@ -22,7 +22,49 @@ configuration_schema = {
             'items': {'type': 'string'},
             'minItems': 1
         },
-        'flaskSessionCookie': {'type': 'string'}
+        'flaskSessionCookie': {'type': 'string'},
+        'notebookValidationCacheSize': {'type': 'integer', 'minimum': 0},
+        'parallelValidationThreshold': {'type': 'integer', 'minimum': 1},
+        'validationProcesses': {'type': 'integer', 'minimum': 1},
+        'userCacheSize': {'type': 'integer', 'minimum': 0},
+        'userCacheTtl': {'type': 'number', 'minimum': 0},
+        'federatedAgencyUrls': {
+            'type': 'array',
+            'items': {'type': 'string'},
+            'minItems': 1
+        },
+        'admissionControl': {'type': 'boolean'},
+        'admissionInterval': {'type': 'number', 'exclusiveMinimum': 0},
+        'maxProcessingNotebooksPerUser': {'type': 'integer', 'minimum': 1},
+        'maxNotebooksPerRequest': {'type': 'integer', 'minimum': 1},
+        'maxSubmissionsPerMinute': {'type': 'number', 'exclusiveMinimum': 0},
+        'submissionBurst': {'type': 'integer', 'minimum': 1},
+        'maxActiveNotebooksPerUser': {'type': 'integer', 'minimum': 1},
+        'maxStoredBytesPerUser': {'type': 'integer', 'minimum': 0},
+        'outputBlobThreshold': {'type': 'integer', 'minimum': 1},
+        'executionCache': {'type': 'boolean'},
+        'executionCacheTtl': {'type': 'number', 'exclusiveMinimum': 0},
+        'executionCacheSize': {'type': 'integer', 'minimum': 1},
+        'asgiWorkerThreads': {'type': 'integer', 'minimum': 1},
+        'executionReports': {'type': 'boolean'},
+        'uploadRetention': {'type': 'number', 'exclusiveMinimum': 0},
+        'statsOperators': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'agencyUrl': {'type': 'string'},
+                    'agencyUsername': {'type': 'string'}
+                },
+                'additionalProperties': False,
+                'required': ['agencyUrl', 'agencyUsername']
+            }
+        },
+        'notebookSlimming': {'type': 'boolean'},
+        'slimMetadataKeys': {
+            'type': 'array',
+            'items': {'type': 'string'}
+        }
     },
     'additionalProperties': False,
     'required': ['notebookDirectory', 'flaskSecretKey']
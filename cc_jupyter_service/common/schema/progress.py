@@ -0,0 +1,26 @@
+progress_schema = {
+    'type': 'object',
+    'properties': {
+        'event': {
+            'type': 'string',
+            'enum': ['progress', 'heartbeat']
+        },
+        'cellIndex': {
+            'oneOf': [
+                {'type': 'integer', 'minimum': 0},
+                {'type': 'null'}
+            ]
+        },
+        'cellCount': {
+            'oneOf': [
+                {'type': 'integer', 'minimum': 0},
+                {'type': 'null'}
+            ]
+        },
+        'elapsedTime': {
+            'type': 'number',
+            'minimum': 0
+        }
+    },
+    'required': ['event', 'elapsedTime']
+}
@@ -1,3 +1,5 @@
+from cc_jupyter_service.common.schema.upload import CONTENT_HASH_PATTERN
+
 request_schema = {
     'type': 'object',
     'properties': {
@@ -7,8 +9,16 @@ request_schema = {
                 'type': 'object',
                 'properties': {
                     'data': {'type': 'object'},
+                    'contentHash': {
+                        'type': 'string',
+                        'pattern': CONTENT_HASH_PATTERN
+                    },
                     'filename': {'type': 'string'}
-                }
+                },
+                'oneOf': [
+                    {'required': ['data']},
+                    {'required': ['contentHash']}
+                ]
             }
         },
         'dependencies': {
@@ -58,7 +68,9 @@ request_schema = {
                     }
                 }
             }
-        }
+        },
+        'bypassCache': {'type': 'boolean'},
+        'skipSlimming': {'type': 'boolean'}
     },
     'additionalProperties': False,
     'required': ['jupyterNotebooks', 'dependencies', 'pythonRequirements', 'gpuRequirements']
@@ -0,0 +1,31 @@
+status_schema = {
+    'type': 'object',
+    'properties': {
+        'event': {
+            'type': 'string',
+            'enum': ['started', 'failed', 'environment_error']
+        },
+        'message': {
+            'type': 'string'
+        },
+        'cellIndex': {
+            'oneOf': [
+                {'type': 'integer', 'minimum': 0},
+                {'type': 'null'}
+            ]
+        },
+        'ename': {
+            'oneOf': [
+                {'type': 'string'},
+                {'type': 'null'}
+            ]
+        },
+        'evalue': {
+            'oneOf': [
+                {'type': 'string'},
+                {'type': 'null'}
+            ]
+        }
+    },
+    'required': ['event']
+}
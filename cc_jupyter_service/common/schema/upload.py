@@ -0,0 +1,16 @@
+CONTENT_HASH_PATTERN = '^[0-9a-f]{64}$'
+
+upload_check_schema = {
+    'type': 'object',
+    'properties': {
+        'contentHashes': {
+            'type': 'array',
+            'items': {
+                'type': 'string',
+                'pattern': CONTENT_HASH_PATTERN
+            }
+        }
+    },
+    'additionalProperties': False,
+    'required': ['contentHashes']
+}
@@ -0,0 +1,192 @@
+import math
+
+# the dimensions, the usage statistics can be grouped by
+GROUP_DIMENSIONS = ('user', 'image', 'day', 'status')
+# runtimes are counted in buckets, whose bounds grow by the factor 2 ** (1 / RUNTIME_BUCKETS_PER_DOUBLING). A percentile
+# is estimated as the upper bound of its bucket, so it is at most 19% too large.
+RUNTIME_BUCKETS_PER_DOUBLING = 4
+# the last bucket collects all runtimes longer than 2 ** 24 seconds
+MAX_RUNTIME_BUCKET = 24 * RUNTIME_BUCKETS_PER_DOUBLING + 1
+FAILURE_STATUS = 'failure'
+
+
+def runtime_bucket(runtime):
+    """
+    :param runtime: A runtime in seconds
+    :type runtime: float
+    :return: The index of the histogram bucket of the given runtime. Bucket 0 contains all runtimes up to one second.
+    :rtype: int
+    """
+    if runtime <= 1:
+        return 0
+    bucket = int(math.ceil(math.log2(runtime) * RUNTIME_BUCKETS_PER_DOUBLING))
+    return min(bucket, MAX_RUNTIME_BUCKET)
+
+
+def bucket_upper_bound(bucket):
+    """
+    :param bucket: The index of a histogram bucket
+    :type bucket: int
+    :return: The largest runtime in seconds, that is counted in the given bucket
+    :rtype: float
+    """
+    return 2 ** (bucket / RUNTIME_BUCKETS_PER_DOUBLING)
+
+
+class UsageRollup:
+    def __init__(self, user_id, docker_image, day, status, notebook_count, runtime_count, runtime_sum, gpu_seconds):
+        """
+        Describes the notebooks of one user and docker image, that finished with the same status on the same day.
+
+        :param user_id: The id of the user
+        :type user_id: int
+        :param docker_image: The docker image, the notebooks were executed with. Empty, if the image is unknown.
+        :type docker_image: str
+        :param day: The utc date formatted as YYYY-MM-DD
+        :type day: str
+        :param status: The final status of the notebooks
+        :type status: str
+        :param notebook_count: The number of notebooks
+        :type notebook_count: int
+        :param runtime_count: The number of notebooks with a known runtime
+        :type runtime_count: int
+        :param runtime_sum: The sum of the known runtimes in seconds
+        :type runtime_sum: float
+        :param gpu_seconds: The sum of the runtimes multiplied by the number of gpus of every notebook
+        :type gpu_seconds: float
+        """
+        self.user_id = user_id
+        self.docker_image = docker_image
+        self.day = day
+        self.status = status
+        self.notebook_count = notebook_count
+        self.runtime_count = runtime_count
+        self.runtime_sum = runtime_sum
+        self.gpu_seconds = gpu_seconds
+
+
+class RuntimeBucket:
+    def __init__(self, user_id, docker_image, day, status, bucket, notebook_count):
+        """
+        Describes the number of notebooks of one rollup, whose runtime falls into the given histogram bucket.
+
+        :param bucket: The index of the histogram bucket
+        :type bucket: int
+        :param notebook_count: The number of notebooks
+        :type notebook_count: int
+
+        The other parameters are the same as for UsageRollup.
+        """
+        self.user_id = user_id
+        self.docker_image = docker_image
+        self.day = day
+        self.status = status
+        self.bucket = bucket
+        self.notebook_count = notebook_count
+
+
+class UsageGroup:
+    def __init__(self, key):
+        """
+        Accumulates the rollups, that belong to one group of the usage statistics.
+
+        :param key: The values of the grouped dimensions
+        :type key: dict
+        """
+        self.key = key
+        self.status_counts = {}
+        self.runtime_count = 0
+        self.runtime_sum = 0.0
+        self.gpu_seconds = 0.0
+        self.runtime_histogram = {}
+
+    def add_rollup(self, rollup):
+        """
+        :type rollup: UsageRollup
+        """
+        self.status_counts[rollup.status] = self.status_counts.get(rollup.status, 0) + rollup.notebook_count
+        self.runtime_count += rollup.runtime_count
+        self.runtime_sum += rollup.runtime_sum
+        self.gpu_seconds += rollup.gpu_seconds
+
+    def add_runtime_bucket(self, runtime_bucket_entry):
+        """
+        :type runtime_bucket_entry: RuntimeBucket
+        """
+        bucket = runtime_bucket_entry.bucket
+        self.runtime_histogram[bucket] = self.runtime_histogram.get(bucket, 0) + runtime_bucket_entry.notebook_count
+
+    def estimate_runtime_percentile(self, percentile):
+        """
+        :param percentile: The percentile between 0 and 100
+        :type percentile: float
+        :return: The estimated runtime percentile in seconds or None, if no runtime is known
+        :rtype: float or None
+        """
+        count = sum(self.runtime_histogram.values())
+        if count == 0:
+            return None
+        rank = max(1, int(math.ceil(count * percentile / 100)))
+        seen = 0
+        for bucket in sorted(self.runtime_histogram):
+            seen += self.runtime_histogram[bucket]
+            if seen >= rank:
+                return bucket_upper_bound(bucket)
+        return None
+
+    def to_json(self):
+        notebook_count = sum(self.status_counts.values())
+        runtime = None
+        if self.runtime_count > 0:
+            runtime = {
+                'mean': self.runtime_sum / self.runtime_count,
+                'p50': self.estimate_runtime_percentile(50),
+                'p95': self.estimate_runtime_percentile(95)
+            }
+        return {
+            'key': self.key,
+            'notebookCount': notebook_count,
+            'statusCounts': self.status_counts,
+            'failureRate': self.status_counts.get(FAILURE_STATUS, 0) / notebook_count if notebook_count else None,
+            'runtime': runtime,
+            'gpuHours': self.gpu_seconds / 3600
+        }
+
+
+def aggregate_usage(rollups, runtime_buckets, group_by, user_names):
+    """
+    Groups the given rollups by the given dimensions. The work depends only on the number of rollups, not on the number
+    of executed notebooks.
+
+    :param rollups: The rollups to aggregate
+    :type rollups: list[UsageRollup]
+    :param runtime_buckets: The runtime histogram buckets of the rollups
+    :type runtime_buckets: list[RuntimeBucket]
+    :param group_by: Some of GROUP_DIMENSIONS. If empty, all rollups are aggregated into one group.
+    :type group_by: list[str]
+    :param user_names: A dictionary mapping user ids to the names shown for the "user" dimension
+    :type user_names: dict[int, str]
+    :return: The groups sorted by their key
+    :rtype: list[UsageGroup]
+    """
+    def group_key(entry):
+        values = {
+            'user': user_names.get(entry.user_id, str(entry.user_id)),
+            'image': entry.docker_image,
+            'day': entry.day,
+            'status': entry.status
+        }
+        return tuple(values[dimension] for dimension in group_by)
+
+    groups = {}
+    for rollup in rollups:
+        key = group_key(rollup)
+        if key not in groups:
+            groups[key] = UsageGroup(dict(zip(group_by, key)))
+        groups[key].add_rollup(rollup)
+    for runtime_bucket_entry in runtime_buckets:
+        group = groups.get(group_key(runtime_bucket_entry))
+        if group is not None:
+            group.add_runtime_bucket(runtime_bucket_entry)
+
+    return [groups[key] for key in sorted(groups)]
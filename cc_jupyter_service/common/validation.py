@@ -0,0 +1,188 @@
+import atexit
+import hashlib
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import jsonschema
+import nbformat
+
+from cc_jupyter_service.common import json_codec
+from cc_jupyter_service.common.cache import TTLCache
+from cc_jupyter_service.common.schema.cancel import cancel_schema
+from cc_jupyter_service.common.schema.configuration import configuration_schema
+from cc_jupyter_service.common.schema.progress import progress_schema
+from cc_jupyter_service.common.schema.request import request_schema
+from cc_jupyter_service.common.schema.status import status_schema
+from cc_jupyter_service.common.schema.upload import upload_check_schema
+
+
+def compile_schema(schema):
+    """
+    Checks the given schema and creates a validator for it, that can be reused for every validation.
+
+    :param schema: The json schema to compile
+    :type schema: dict
+    :return: A validator for the given schema
+    """
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+REQUEST_VALIDATOR = compile_schema(request_schema)
+CONFIGURATION_VALIDATOR = compile_schema(configuration_schema)
+PROGRESS_VALIDATOR = compile_schema(progress_schema)
+CANCEL_VALIDATOR = compile_schema(cancel_schema)
+UPLOAD_CHECK_VALIDATOR = compile_schema(upload_check_schema)
+STATUS_VALIDATOR = compile_schema(status_schema)
+
+
+def validate(data, validator):
+    """
+    Validates the given data with a precompiled validator. Behaves like jsonschema.validate().
+
+    :param data: The data to validate
+    :param validator: The validator created by compile_schema()
+
+    :raise jsonschema.ValidationError: If the data is invalid
+    """
+    error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+    if error is not None:
+        raise error
+
+
+def serialize_notebook(notebook_data):
+    """
+    Serializes the given notebook for the validation worker processes and the validation cache. The keys are not
+    sorted, so equal notebooks with a different key order are cached separately.
+
+    :param notebook_data: The notebook to serialize
+    :type notebook_data: dict
+    :rtype: bytes
+    """
+    return json_codec.dumps(notebook_data)
+
+
+def notebook_hash(serialized_notebook):
+    """
+    :param serialized_notebook: The notebook serialized by serialize_notebook()
+    :type serialized_notebook: bytes
+    :return: The content hash of the given notebook
+    :rtype: str
+    """
+    return hashlib.sha256(serialized_notebook).hexdigest()
+
+
+def _validate_serialized_notebook(serialized_notebook):
+    """
+    Validates the given notebook. Is executed in the validation worker processes.
+
+    :param serialized_notebook: The notebook serialized by serialize_notebook()
+    :type serialized_notebook: bytes
+    :return: None, if the notebook is valid, otherwise the error message
+    :rtype: str or None
+    """
+    return _validate_notebook(json_codec.loads(serialized_notebook))
+
+
+def _validate_notebook(notebook_data):
+    try:
+        nbformat.validate(notebook_data)
+    except nbformat.ValidationError as e:
+        return str(e)
+    return None
+
+
+class NotebookValidator:
+    def __init__(self, cache_size, parallel_threshold, max_processes):
+        """
+        Validates jupyter notebooks with nbformat. Validation results are cached by content hash. If a request contains
+        many notebooks, the notebooks are validated in parallel in a process pool.
+
+        The process pool is created, when notebooks are validated in parallel for the first time. It uses the spawn
+        start method, because the notebooks are validated in the threads of the service and forking a multithreaded
+        process can copy locks held by other threads. Python versions before 3.7 can not choose the start method.
+
+        :param cache_size: The maximal number of cached validation results
+        :type cache_size: int
+        :param parallel_threshold: The minimal number of uncached notebooks, that are validated in the process pool
+        :type parallel_threshold: int
+        :param max_processes: The maximal number of worker processes. If None, the number of cpus is used.
+        :type max_processes: int or None
+        """
+        # the validation result of a notebook never changes, so the entries do not expire
+        self.cache = TTLCache(cache_size, float('inf'))
+        self.parallel_threshold = parallel_threshold
+        self.max_processes = max_processes
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                if sys.version_info >= (3, 7):
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_processes, mp_context=multiprocessing.get_context('spawn')
+                    )
+                else:
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_processes)
+                atexit.register(self.shutdown)
+            return self._pool
+
+    def shutdown(self):
+        """
+        Stops the worker processes, if they were started.
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def validate_notebooks(self, notebooks, content_hashes=None):
+        """
+        Validates the given notebooks.
+
+        :param notebooks: A list of notebooks to validate
+        :type notebooks: list[dict]
+        :param content_hashes: The sha256 hashes of the files, the notebooks were read from. They are used as cache
+                               keys, so the notebooks do not have to be serialized again. If None, the notebooks are
+                               serialized and hashed, unless the cache is disabled.
+        :type content_hashes: list[str] or None
+        :return: A list with one entry per given notebook. The entry is None, if the notebook is valid, otherwise the
+                 error message.
+        :rtype: list[str or None]
+        """
+        errors = [None] * len(notebooks)
+        uncached = []  # tuples of (index, key, serialized notebook). key and serialized notebook can be None.
+        for index, notebook_data in enumerate(notebooks):
+            if self.cache.max_size <= 0:
+                uncached.append((index, None, None))
+                continue
+            serialized_notebook = None
+            if content_hashes is not None:
+                key = content_hashes[index]
+            else:
+                serialized_notebook = serialize_notebook(notebook_data)
+                key = notebook_hash(serialized_notebook)
+            error = self.cache.get(key)
+            if error is not TTLCache.MISSING:
+                errors[index] = error
+            else:
+                uncached.append((index, key, serialized_notebook))
+
+        if len(uncached) >= max(self.parallel_threshold, 2):
+            results = self._get_pool().map(_validate_serialized_notebook, [
+                serialized_notebook if serialized_notebook is not None else serialize_notebook(notebooks[index])
+                for index, _, serialized_notebook in uncached
+            ])
+        else:
+            results = [_validate_notebook(notebooks[index]) for index, _, _ in uncached]
+
+        for (index, key, _), error in zip(uncached, results):
+            if key is not None:
+                self.cache.put(key, error)
+            errors[index] = error
+
+        return errors
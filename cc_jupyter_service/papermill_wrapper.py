@@ -1,15 +1,342 @@
 #!/usr/bin/env python3
+import base64
+import json
+import os
 import subprocess
 import sys
+import threading
+import time
+import urllib.request
 import papermill
+from papermill.engines import NBClientEngine, papermill_engines
 from shutil import which
 
 
+REPORTING_ENGINE_NAME = 'cc_reporting'
+HEARTBEAT_INTERVAL = 30  # seconds between two heartbeats, if no progress is made
+MIN_REPORT_INTERVAL = 5  # seconds between two progress reports
+REPORT_TIMEOUT = 10
+METADATA_KEY = 'cc_jupyter_service'
+
+
+class ProgressReporter:
+    def __init__(self, progress_url, username, token):
+        """
+        Sends progress events of the notebook execution to the jupyter service. The events are sent by a background
+        thread, so the notebook execution is never blocked by the service. Only the latest state is sent, intermediate
+        states are dropped, if the cells are executed faster than MIN_REPORT_INTERVAL.
+
+        :param progress_url: The url to post progress events to. If None, no events are sent.
+        :type progress_url: str or None
+        :param username: The username to authorize at the jupyter service
+        :type username: str or None
+        :param token: The notebook token to authorize at the jupyter service
+        :type token: str or None
+        """
+        self.progress_url = progress_url
+        self._authorization = _basic_authorization(username, token)
+
+        self.start_time = time.time()
+        self._state = {'cellIndex': None, 'cellCount': None}
+        self._dirty = False
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        if self.progress_url is None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(REPORT_TIMEOUT)
+
+    def update(self, **state):
+        """
+        Updates the current execution state. The new state is sent with the next progress report.
+        """
+        with self._condition:
+            self._state.update(state)
+            self._dirty = True
+            self._condition.notify()
+
+    def _run(self):
+        last_report = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._dirty or self._stopped, timeout=max(0, last_report + HEARTBEAT_INTERVAL - time.time())
+                )
+                if self._stopped:
+                    return
+                event = 'progress' if self._dirty else 'heartbeat'
+                state = dict(self._state)
+                self._dirty = False
+
+            state['event'] = event
+            state['elapsedTime'] = time.time() - self.start_time
+            _post_report(self.progress_url, self._authorization, state)
+            last_report = time.time()
+            time.sleep(MIN_REPORT_INTERVAL)
+
+
+class StatusReporter:
+    def __init__(self, status_url, username, token):
+        """
+        Sends status changes of the notebook execution to the jupyter service, so the service does not have to poll
+        the agency to detect them. In contrast to progress reports, status reports are sent immediately, because the
+        wrapper exits after a failure.
+
+        :param status_url: The url to post status events to. If None, no events are sent.
+        :type status_url: str or None
+        :param username: The username to authorize at the jupyter service
+        :type username: str or None
+        :param token: The notebook token to authorize at the jupyter service
+        :type token: str or None
+        """
+        self.status_url = status_url
+        self._authorization = _basic_authorization(username, token)
+
+    def started(self):
+        self._report({'event': 'started'})
+
+    def environment_error(self, error):
+        """
+        Reports an error, that prevented the notebook execution, like a failed installation of the requirements.
+
+        :type error: EnvironmentError
+        """
+        self._report({'event': 'environment_error', 'message': str(error)})
+
+    def failed(self, error):
+        """
+        Reports the failure of a notebook cell.
+
+        :type error: papermill.PapermillExecutionError
+        """
+        self._report({
+            'event': 'failed',
+            'message': str(error),
+            'cellIndex': getattr(error, 'cell_index', None),
+            'ename': getattr(error, 'ename', None),
+            'evalue': getattr(error, 'evalue', None)
+        })
+
+    def _report(self, data):
+        if self.status_url is not None:
+            _post_report(self.status_url, self._authorization, data)
+
+
+def _basic_authorization(username, token):
+    """
+    :return: The value of the authorization header for the jupyter service or None, if no credentials are given
+    :rtype: str or None
+    """
+    if username is None or token is None:
+        return None
+    credentials = '{}:{}'.format(username, token).encode('utf-8')
+    return 'Basic {}'.format(base64.b64encode(credentials).decode('ascii'))
+
+
+def _post_report(url, authorization, data):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(data).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    if authorization is not None:
+        request.add_header('Authorization', authorization)
+    try:
+        with urllib.request.urlopen(request, timeout=REPORT_TIMEOUT):
+            pass
+    except Exception:  # reports should never influence the execution
+        pass
+
+
+class ExecutionProfiler:
+    CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+    def __init__(self):
+        """
+        Measures wall time, cpu time and peak resident set size of every executed cell. Cpu time and memory are read
+        from /proc for the kernel processes, which are the child processes of this wrapper. If /proc is not available
+        only wall times are measured.
+        """
+        self.pip_install_time = None
+        self.kernel_startup_time = None
+        self.cells = []
+
+        self._execution_start = None
+        self._cell_wall_start = None
+        self._cell_cpu_start = None
+
+    def execution_started(self):
+        self._execution_start = time.time()
+
+    def cell_started(self):
+        now = time.time()
+        if self.kernel_startup_time is None and self._execution_start is not None:
+            self.kernel_startup_time = now - self._execution_start
+
+        kernel_pids = _child_pids()
+        for pid in kernel_pids:
+            _reset_peak_rss(pid)
+        self._cell_cpu_start = _cpu_time(kernel_pids)
+        self._cell_wall_start = now
+
+    def cell_completed(self, cell_index):
+        wall_time = time.time() - self._cell_wall_start
+        kernel_pids = _child_pids()
+
+        cpu_time = None
+        cpu_end = _cpu_time(kernel_pids)
+        if cpu_end is not None and self._cell_cpu_start is not None:
+            cpu_time = max(0.0, cpu_end - self._cell_cpu_start)
+
+        self.cells.append({
+            'index': cell_index,
+            'wallTime': wall_time,
+            'cpuTime': cpu_time,
+            'peakRss': _peak_rss(kernel_pids)
+        })
+
+    def to_json(self):
+        return {
+            'pipInstallTime': self.pip_install_time,
+            'kernelStartupTime': self.kernel_startup_time,
+            'cells': self.cells
+        }
+
+
+def _child_pids():
+    """
+    :return: The pids of all direct child processes of this process
+    :rtype: list[int]
+    """
+    own_pid = os.getpid()
+    child_pids = []
+    try:
+        proc_entries = os.listdir('/proc')
+    except OSError:
+        return child_pids
+    for entry in proc_entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/{}/stat'.format(entry), 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the process name can contain spaces, so fields are counted after the closing bracket
+        fields = stat[stat.rfind(')') + 2:].split()
+        if int(fields[1]) == own_pid:
+            child_pids.append(int(entry))
+    return child_pids
+
+
+def _cpu_time(pids):
+    """
+    :return: The sum of user and system cpu seconds of the given processes and their waited-for children
+    :rtype: float or None
+    """
+    if not pids:
+        return None
+    ticks = 0
+    for pid in pids:
+        try:
+            with open('/proc/{}/stat'.format(pid), 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        fields = stat[stat.rfind(')') + 2:].split()
+        ticks += sum(int(field) for field in fields[11:15])  # utime, stime, cutime, cstime
+    return ticks / ExecutionProfiler.CLOCK_TICKS
+
+
+def _reset_peak_rss(pid):
+    try:
+        with open('/proc/{}/clear_refs'.format(pid), 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss(pids):
+    """
+    :return: The sum of the peak resident set sizes of the given processes in bytes
+    :rtype: int or None
+    """
+    peak_rss = None
+    for pid in pids:
+        try:
+            with open('/proc/{}/status'.format(pid), 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peak_rss = (peak_rss or 0) + int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return peak_rss
+
+
+class ReportingEngine(NBClientEngine):
+    """
+    A papermill engine that forwards cell execution events to a ProgressReporter and an ExecutionProfiler.
+    The profile is written into the notebook metadata under METADATA_KEY.
+    """
+    reporter = None
+    profiler = None
+
+    @classmethod
+    def execute_managed_notebook(cls, nb_man, kernel_name, **kwargs):
+        reporter = cls.reporter
+        profiler = cls.profiler
+        cell_count = len(nb_man.nb.cells)
+        cell_start = nb_man.cell_start
+        cell_complete = nb_man.cell_complete
+
+        def reporting_cell_start(cell, cell_index=None, **cell_kwargs):
+            if reporter is not None:
+                reporter.update(cellIndex=cell_index, cellCount=cell_count)
+            if profiler is not None:
+                profiler.cell_started()
+            return cell_start(cell, cell_index, **cell_kwargs)
+
+        def reporting_cell_complete(cell, cell_index=None, **cell_kwargs):
+            if profiler is not None:
+                profiler.cell_completed(cell_index)
+                nb_man.nb.metadata.setdefault(METADATA_KEY, {})['profile'] = profiler.to_json()
+            return cell_complete(cell, cell_index, **cell_kwargs)
+
+        nb_man.cell_start = reporting_cell_start
+        nb_man.cell_complete = reporting_cell_complete
+        if reporter is not None:
+            reporter.update(cellIndex=None, cellCount=cell_count)
+        if profiler is not None:
+            profiler.execution_started()
+
+        return super().execute_managed_notebook(nb_man, kernel_name, **kwargs)
+
+
+papermill_engines.register(REPORTING_ENGINE_NAME, ReportingEngine)
+
+
 def main():
     positional_arguments = []
     parameters = {}
+    options = {}
     for arg in sys.argv[1:]:
-        if '=' in arg:
+        if arg.startswith('--') and '=' in arg:
+            name, value = arg[2:].split('=', maxsplit=1)
+            options[name] = value
+        elif '=' in arg:
             name, value = arg.split('=', maxsplit=1)
             if name.startswith('%f'):
                 name = name[2:]
@@ -26,22 +353,58 @@ def main():
             'Got {} positional arguments (expected 2 or 3): {}'.format(len(positional_arguments), positional_arguments)
         )
 
-    if len(positional_arguments) == 3:
-        download_requirements(positional_arguments[2])
+    service_token = read_service_token(options)
+    status_reporter = StatusReporter(options.get('status-url'), options.get('service-username'), service_token)
+    status_reporter.started()
+    reporter = ProgressReporter(options.get('progress-url'), options.get('service-username'), service_token)
+    reporter.start()
+    profiler = ExecutionProfiler()
+    ReportingEngine.reporter = reporter
+    ReportingEngine.profiler = profiler
 
     try:
-        papermill.execute_notebook(
-            positional_arguments[0],
-            positional_arguments[1],
-            parameters=parameters,
-            progress_bar=False
-        )
-    except papermill.PapermillExecutionError as e:
-        print(e, file=sys.stderr)
-        return 1
+        if len(positional_arguments) == 3:
+            pip_start = time.time()
+            try:
+                download_requirements(positional_arguments[2])
+            except EnvironmentError as e:
+                status_reporter.environment_error(e)
+                raise
+            profiler.pip_install_time = time.time() - pip_start
+
+        try:
+            papermill.execute_notebook(
+                positional_arguments[0],
+                positional_arguments[1],
+                parameters=parameters,
+                engine_name=REPORTING_ENGINE_NAME,
+                progress_bar=False
+            )
+        except papermill.PapermillExecutionError as e:
+            print(e, file=sys.stderr)
+            status_reporter.failed(e)
+            return 1
+    finally:
+        reporter.stop()
     return 0
 
 
+def read_service_token(options):
+    """
+    :param options: The command line options
+    :type options: dict[str, str]
+    :return: The token to authorize at the jupyter service or None, if no token is given. The token is read from the
+             file given by "--service-token-file", because command line arguments are visible to all processes of the
+             container. "--service-token" is supported for services, that pass the token directly.
+    :rtype: str or None
+    """
+    token_file = options.get('service-token-file')
+    if token_file is not None:
+        with open(token_file, 'r') as f:
+            return f.read().strip()
+    return options.get('service-token')
+
+
 def download_requirements(requirements_file):
     pip_command = None
     for command in ['pip3', 'pip']:
@@ -0,0 +1,204 @@
+import collections
+import sys
+import threading
+import uuid
+
+import requests
+from flask import current_app
+
+from cc_jupyter_service.common import encryption
+from cc_jupyter_service.common.capacity import AgencyRouter
+from cc_jupyter_service.common.execution import start_agency, EXTERNAL_DATA_PURPOSE
+from cc_jupyter_service.common.helper import normalize_url
+from cc_jupyter_service.common.red_file_template import RED_FILE_TEMPLATE
+from cc_jupyter_service.service import auth
+from cc_jupyter_service.service.db import DatabaseAPI
+
+# a claim older than this is considered abandoned by a crashed process
+CLAIM_TIMEOUT = 300
+
+
+class AdmissionController:
+    def __init__(self, app, interval, max_processing_per_user):
+        """
+        Holds submitted notebooks in the queued_submission table and submits them to the agencies, when their nodes
+        report enough free capacity. Every service process runs one controller thread. Submissions are claimed in the
+        database before they are submitted, so every submission is released by exactly one process.
+
+        The queued notebooks are released in fair-share order: the user with the fewest processing notebooks is served
+        first and the submissions of every user are released in submission order.
+
+        :param app: The flask app, whose database is used
+        :type app: Flask
+        :param interval: The seconds between two releases
+        :type interval: float
+        :param max_processing_per_user: The maximal number of processing notebooks per user or None for no limit
+        :type max_processing_per_user: int or None
+        """
+        self.app = app
+        self.interval = interval
+        self.max_processing_per_user = max_processing_per_user
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def ensure_started(self):
+        """
+        Starts the controller thread, if it is not running in this process. Is called for every request, so the thread
+        is started in the serving process and not in a process, that forks the workers.
+        """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='admission-controller', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.release_submissions()
+            except Exception as e:
+                print('Failed to release queued notebooks: {}'.format(str(e)), file=sys.stderr)
+
+    def release_submissions(self):
+        """
+        Submits the queued notebooks, that fit into the free capacity of the agencies. Needs an app context.
+
+        :return: The number of released notebooks
+        :rtype: int
+        """
+        database_api = DatabaseAPI.create()
+        submissions = database_api.get_queued_submissions(CLAIM_TIMEOUT)
+        if not submissions:
+            return 0
+
+        processing = database_api.count_notebooks_by_user(DatabaseAPI.NotebookStatus.PROCESSING)
+        # the users are ordered by their oldest submission, which breaks ties in the fair-share order
+        queues = collections.OrderedDict()
+        for submission in submissions:
+            queues.setdefault(submission.user_id, collections.deque()).append(submission)
+
+        ram = RED_FILE_TEMPLATE['container']['settings']['ram']
+        capacity_cache = {}  # the nodes of every agency are requested once for all users
+        released = 0
+        while queues:
+            user_id = min(queues, key=lambda queued_user_id: processing.get(queued_user_id, 0))
+            if self.max_processing_per_user is not None and \
+                    processing.get(user_id, 0) >= self.max_processing_per_user:
+                del queues[user_id]
+                continue
+
+            user = auth.get_user(user_id)
+            router = _create_router(user, capacity_cache) if user is not None else None
+            if router is None:
+                # the user has to login again, before the notebooks can be submitted
+                del queues[user_id]
+                continue
+
+            submission = queues[user_id][0]
+            gpu_requirements = submission.submission_data['gpuRequirements']
+            reservation = router.reserve_now(ram, gpu_requirements)
+            if reservation is not None:
+                agency_url = reservation.agency_url
+            elif router.can_run(ram, gpu_requirements) is False:
+                # every agency reports its nodes and none of them could ever run this notebook. The agency decides
+                # about it.
+                agency_url = router.default_agency_url
+            else:
+                # the notebook waits for free capacity or until the agencies report their nodes again. The following
+                # submissions of this user wait behind this one.
+                del queues[user_id]
+                continue
+
+            queues[user_id].popleft()
+            if not queues[user_id]:
+                del queues[user_id]
+
+            if _release(database_api, submission, user, agency_url, router.agency_cookies[agency_url]):
+                processing[user_id] = processing.get(user_id, 0) + 1
+                released += 1
+            elif reservation is not None:
+                # the agency did not accept the notebook, so the capacity is free for the following submissions
+                reservation.cancel()
+
+        return released
+
+
+def _create_router(user, capacity_cache):
+    """
+    :return: A router over the agencies of the given user, for which the user has a cookie or None, if the user has no
+             cookie
+    :rtype: AgencyRouter or None
+    """
+    cookies = auth.get_current_cookies(user.user_id)
+    agency_cookies = {
+        agency_url: cookies[agency_url].cookie_text
+        for agency_url in auth.get_agency_urls(user.agency_url)
+        if agency_url in cookies
+    }
+    if not agency_cookies:
+        return None
+
+    default_agency_url = normalize_url(user.agency_url)
+    if default_agency_url not in agency_cookies:
+        default_agency_url = next(iter(agency_cookies))
+    return AgencyRouter(agency_cookies, default_agency_url, capacity_cache)
+
+
+def _release(database_api, submission, user, agency_url, authorization_cookie):
+    """
+    Claims the given submission and submits it to the given agency. If the agency rejects the notebook or its external
+    data can not be decrypted, the notebook fails. If the agency can not be reached, the submission is returned to the
+    queue. Needs an app context.
+
+    :return: Whether the notebook was submitted
+    :rtype: bool
+    """
+    notebook_id = submission.notebook_id
+    if not database_api.claim_queued_submission(notebook_id, CLAIM_TIMEOUT):
+        return False
+
+    submission_data = submission.submission_data
+    try:
+        external_data = encryption.decrypt(
+            submission_data['encryptedExternalData'], current_app.config['SECRET_KEY'], EXTERNAL_DATA_PURPOSE
+        )
+    except (KeyError, encryption.DecryptionError):
+        database_api.dequeue_notebook(
+            notebook_id, DatabaseAPI.NotebookStatus.FAILURE,
+            debug_info='The external data of the queued notebook could not be decrypted, because the secret key of '
+                       'the service changed. Please submit the notebook again.'
+        )
+        return False
+
+    # the container may request the notebook, before the agency answers
+    notebook_token = str(uuid.uuid4())
+    database_api.set_notebook_token(notebook_id, notebook_token)
+    try:
+        experiment_id = start_agency(
+            notebook_id, notebook_token, agency_url, user.agency_username, authorization_cookie,
+            submission_data['urlRoot'], submission_data['dockerImage'], submission_data['gpuRequirements'],
+            external_data, submission_data['pythonRequirements']
+        )
+    except requests.HTTPError as e:
+        status_code = e.response.status_code if e.response is not None else None
+        if status_code is not None and 400 <= status_code < 500 and status_code != 401:
+            database_api.dequeue_notebook(
+                notebook_id, DatabaseAPI.NotebookStatus.FAILURE,
+                debug_info='Could not submit the notebook to the agency. {}'.format(str(e))
+            )
+        else:
+            database_api.unclaim_queued_submission(notebook_id)
+        return False
+    except (requests.RequestException, ValueError) as e:
+        print('Failed to submit queued notebook "{}": {}'.format(notebook_id, str(e)), file=sys.stderr)
+        database_api.unclaim_queued_submission(notebook_id)
+        return False
+
+    database_api.release_notebook(notebook_id, experiment_id, agency_url)
+    return True
@@ -1,29 +1,60 @@
+import collections
+import hashlib
 import os
 import sys
+import time
+import uuid
 
 import requests
 from flask import Flask, render_template, request, jsonify, g, Response
 from requests import HTTPError
 from werkzeug.exceptions import BadRequest, NotFound, Unauthorized
+from werkzeug.formparser import parse_form_data
 import jsonschema
-import nbformat
 from werkzeug.security import check_password_hash
 from werkzeug.urls import url_join
 
+from cc_jupyter_service.common import metrics, json_codec, encryption
+from cc_jupyter_service.common.cache import TTLCache
+from cc_jupyter_service.common.json_codec import get_request_json, json_response
 from cc_jupyter_service.common.helper import normalize_url, AUTHORIZATION_COOKIE_KEY, AgencyError
 from cc_jupyter_service.service.db import DatabaseAPI
 import cc_jupyter_service.service.auth as auth
 import cc_jupyter_service.service.db as database_module
-from cc_jupyter_service.common.execution import exec_notebook, cancel_batch
+from cc_jupyter_service.service.admission import AdmissionController
+from cc_jupyter_service.service.quota import SubmissionQuota
+from cc_jupyter_service.service.execution_cache import ExecutionCache, execution_key
+from cc_jupyter_service.service.cancellation import cancel_notebooks, CancelOutcome, OUTCOME_NOT_FOUND
+from cc_jupyter_service.service.selection import select_notebooks
+from cc_jupyter_service.common.capacity import AgencyRouter
+from cc_jupyter_service.common.execution import exec_notebook, queue_notebook, reuse_result, cancel_batch
+from cc_jupyter_service.common.execution_profile import extract_profile
+from cc_jupyter_service.common.result_summary import extract_summary
+from cc_jupyter_service.common.result_archive import iter_result_archive
+from cc_jupyter_service.common.usage_stats import aggregate_usage, GROUP_DIMENSIONS
 from cc_jupyter_service.common.notebook_database import NotebookDatabase
-from cc_jupyter_service.common.schema.request import request_schema
-from cc_jupyter_service.common.conf import Conf
+from cc_jupyter_service.common.notebook_slimming import slim_notebook
+from cc_jupyter_service.common.red_file_template import RED_FILE_TEMPLATE
+from cc_jupyter_service.common.validation import validate, NotebookValidator, REQUEST_VALIDATOR, PROGRESS_VALIDATOR, \
+    CANCEL_VALIDATOR, UPLOAD_CHECK_VALIDATOR, STATUS_VALIDATOR
+from cc_jupyter_service.common.conf import Conf, ConfigurationError
 
 DESCRIPTION = 'CC-Jupyter-Service.'
 UPDATE_NOTEBOOK_BATCH_LIMIT = 1000
+# processing notebooks, that reported within this number of seconds, are not polled at the agency. The papermill wrapper
+# sends a heartbeat every 30 seconds, so a notebook has to miss several heartbeats, before it is polled again.
+STATUS_REPORT_TIMEOUT = 90
+# the number of days included in the usage statistics, if the request does not specify it
+STATS_DEFAULT_DAYS = 7
+STATS_MAX_DAYS = 366
+# successful notebook token checks are cached, because every progress and status report of a running notebook is
+# authorized with its token and the password hash is slow by design
+TOKEN_CACHE_SIZE = 4096
+TOKEN_CACHE_TTL = 60
 
 
 conf = Conf.from_system()
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
 
 
 def create_app():
@@ -31,36 +62,91 @@ def create_app():
     app.config.from_mapping(
         SECRET_KEY=conf.flask_secret_key,
         SESSION_COOKIE_NAME=conf.flask_session_cookie,
-        DATABASE=os.path.join(app.instance_path, 'flaskr.sqlite')
+        DATABASE=os.path.join(app.instance_path, 'flaskr.sqlite'),
+        EXECUTION_REPORTS=conf.execution_reports
     )
 
     app.register_blueprint(auth.bp)
+    json_codec.init_app(app)
 
     try:
         os.makedirs(app.instance_path)
     except OSError:
         pass
 
-    notebook_database = NotebookDatabase(conf.notebook_directory)
+    notebook_database = NotebookDatabase(conf.notebook_directory, conf.output_blob_threshold)
+    submission_quota = SubmissionQuota.from_conf(conf)
+    execution_cache = ExecutionCache.from_conf(conf)
+
+    if conf.admission_control:
+        if not encryption.is_available():
+            raise ConfigurationError(
+                'admissionControl requires the optional dependency cryptography to store the external data of queued '
+                'notebooks encrypted. Install it with the extra "admission".'
+            )
+        admission_controller = AdmissionController(
+            app, conf.admission_interval, conf.max_processing_notebooks_per_user
+        )
+        app.before_request(admission_controller.ensure_started)
+    notebook_validator = NotebookValidator(
+        conf.notebook_validation_cache_size, conf.parallel_validation_threshold, conf.validation_processes
+    )
 
     def validate_execution_data(request_data):
         """
-        This function validates the given request data.
+        This function validates the given request data. Notebooks referenced by content hash were validated during
+        their upload, so it is only checked, that the current user uploaded them.
 
         :param request_data: The request data to validate
 
         :raise BadRequest: If the request data is invalid
         """
         try:
-            jsonschema.validate(request_data, request_schema)
+            validate(request_data, REQUEST_VALIDATOR)
         except jsonschema.ValidationError as e:
             raise BadRequest('Failed to validate request data. {}'.format(str(e)))
 
-        for jupyter_notebook in request_data['jupyterNotebooks']:
-            try:
-                nbformat.validate(jupyter_notebook['data'])
-            except nbformat.ValidationError as e:
-                raise BadRequest('Failed to validate notebook "{}.\n{}"'.format(jupyter_notebook['filename'], str(e)))
+        uploaded_notebooks = [
+            jupyter_notebook for jupyter_notebook in request_data['jupyterNotebooks']
+            if 'contentHash' in jupyter_notebook
+        ]
+        uploaded_hashes = DatabaseAPI.create().get_uploaded_hashes(
+            g.user.user_id, [jupyter_notebook['contentHash'] for jupyter_notebook in uploaded_notebooks]
+        )
+        missing_filenames = [
+            jupyter_notebook['filename'] for jupyter_notebook in uploaded_notebooks
+            if jupyter_notebook['contentHash'] not in uploaded_hashes
+            or not notebook_database.check_upload(jupyter_notebook['contentHash'])
+        ]
+        if missing_filenames:
+            raise BadRequest('The notebooks {} have not been uploaded'.format(', '.join(missing_filenames)))
+
+        jupyter_notebooks = [
+            jupyter_notebook for jupyter_notebook in request_data['jupyterNotebooks'] if 'data' in jupyter_notebook
+        ]
+        errors = notebook_validator.validate_notebooks(
+            [jupyter_notebook['data'] for jupyter_notebook in jupyter_notebooks]
+        )
+        error_messages = [
+            'Failed to validate notebook "{}".\n{}'.format(jupyter_notebook['filename'], error)
+            for jupyter_notebook, error in zip(jupyter_notebooks, errors)
+            if error is not None
+        ]
+        if error_messages:
+            raise BadRequest('\n\n'.join(error_messages))
+
+    def get_notebook_data(jupyter_notebook):
+        """
+        Returns the data of a notebook of an execution request. The data is either embedded in the request or read from
+        the uploaded notebook file, so only one uploaded notebook is held in memory at a time.
+
+        :param jupyter_notebook: An entry of the "jupyterNotebooks" list of the request
+        :type jupyter_notebook: dict
+        :rtype: dict
+        """
+        if 'data' in jupyter_notebook:
+            return jupyter_notebook['data']
+        return notebook_database.get_upload(jupyter_notebook['contentHash'])
 
     def create_gpu_requirements(request_requirements):
         """
@@ -100,6 +186,23 @@ def create_app():
                 return predefined_docker_image.tag
         raise ValueError('Could not find docker image with name "{}"'.format(image_name))
 
+    def notebook_file_response(notebook_id, is_result):
+        """
+        Creates a response, that streams the stored notebook file without parsing it. Outputs stored in blob files are
+        inserted while streaming.
+
+        :param notebook_id: The id of the notebook to send
+        :type notebook_id: str
+        :param is_result: Whether the result notebook should be sent
+        :type is_result: bool
+        :rtype: Response
+        """
+        response = Response(
+            notebook_database.iter_notebook_file(notebook_id, is_result=is_result), mimetype='application/json'
+        )
+        response.headers["Content-Length"] = notebook_database.get_notebook_size(notebook_id, is_result=is_result)
+        return response
+
     @app.route('/', methods=['GET'])
     @auth.login_required
     def root():
@@ -109,12 +212,19 @@ def create_app():
     @auth.login_required
     def execute_notebook():
         """
-        This endpoint is used by the frontend to start the execution of a jupyter notebook.
+        This endpoint is used by the frontend to start the execution of a jupyter notebook. Unless the request sets
+        "skipSlimming", the outputs, execution counts and configured metadata keys are removed from the notebooks. The
+        response contains the number of removed bytes as "bytesSaved".
         """
-        if not request.json:
+        request_data = get_request_json()
+        if not request_data:
             raise BadRequest('Did not send data as json')
 
-        request_data = request.json
+        # the quotas are checked before the expensive validation
+        jupyter_notebooks = request_data.get('jupyterNotebooks') if isinstance(request_data, dict) else None
+        if isinstance(jupyter_notebooks, list):
+            submission_quota.check(DatabaseAPI.create(), g.user.user_id, len(jupyter_notebooks))
+
         validate_execution_data(request_data)
 
         if conf.prevent_localhost and ('localhost' in request.url_root or '127.0.0.1' in request.url_root):
@@ -127,12 +237,20 @@ def create_app():
 
         user = g.user
 
-        database_api = DatabaseAPI.create()
-        agency_authorization_cookie = database_api.get_newest_cookie(user.user_id)
+        cookies = auth.get_current_cookies(user.user_id)
 
-        if agency_authorization_cookie is None:
+        if normalize_url(user.agency_url) not in cookies:
             raise Unauthorized('Could not find an authorization cookie')
 
+        agency_router = AgencyRouter(
+            {
+                agency_url: cookies[agency_url].cookie_text
+                for agency_url in auth.get_agency_urls(user.agency_url)
+                if agency_url in cookies
+            },
+            normalize_url(user.agency_url)
+        )
+
         try:
             docker_image = dependencies_to_docker_image(request_data['dependencies'])
         except ValueError as e:
@@ -141,27 +259,172 @@ def create_app():
         gpu_requirements = create_gpu_requirements(request_data['gpuRequirements'])
 
         external_data = request_data['externalData']
+        submission_id = str(uuid.uuid4())
 
+        # input notebooks are slimmed before the execution key is computed, so notebooks differing only in their old
+        # outputs share cached results
+        slim = conf.notebook_slimming and not request_data.get('skipSlimming', False)
+        bytes_saved = 0
+
+        # notebooks with a cached result are not executed again, unless the request bypasses the cache
+        cached_notebook_ids = []
+        queued_notebook_ids = []
         for jupyter_notebook in request_data['jupyterNotebooks']:
+            notebook_data = get_notebook_data(jupyter_notebook)
+            if slim:
+                notebook_data, notebook_bytes_saved = slim_notebook(notebook_data, conf.slim_metadata_keys)
+                metrics.SLIMMED_NOTEBOOK_BYTES.inc(notebook_bytes_saved)
+                bytes_saved += notebook_bytes_saved
+            notebook_execution_key = None
+            if execution_cache is not None:
+                notebook_execution_key = execution_key(
+                    notebook_data, docker_image, gpu_requirements, external_data, request_data['pythonRequirements']
+                )
+                result_notebook_id = None
+                if not request_data.get('bypassCache', False):
+                    result_notebook_id = execution_cache.lookup(
+                        DatabaseAPI.create(), user.user_id, notebook_execution_key
+                    )
+                if result_notebook_id is not None:
+                    cached_notebook_ids.append(reuse_result(
+                        jupyter_notebook['filename'], user.agency_url, notebook_execution_key, result_notebook_id,
+                        submission_id=submission_id, docker_image=docker_image
+                    ))
+                    continue
+
+            if conf.admission_control:
+                queued_notebook_ids.append(queue_notebook(
+                    notebook_data,
+                    agency_url=user.agency_url,
+                    notebook_database=notebook_database,
+                    url_root=request.url_root,
+                    docker_image=docker_image,
+                    gpu_requirements=gpu_requirements,
+                    notebook_filename=jupyter_notebook['filename'],
+                    external_data=external_data,
+                    python_requirements=request_data['pythonRequirements'],
+                    execution_key=notebook_execution_key,
+                    submission_id=submission_id
+                ))
+                continue
+
+            agency_url = agency_router.route(RED_FILE_TEMPLATE['container']['settings']['ram'], gpu_requirements)
             try:
                 experiment_id = exec_notebook(
-                    jupyter_notebook['data'],
-                    agency_url=user.agency_url,
+                    notebook_data,
+                    agency_url=agency_url,
                     agency_username=user.agency_username,
-                    agency_authorization_cookie=agency_authorization_cookie.cookie_text,
+                    agency_authorization_cookie=cookies[agency_url].cookie_text,
                     notebook_database=notebook_database,
                     url_root=request.url_root,
                     docker_image=docker_image,
                     gpu_requirements=gpu_requirements,
                     notebook_filename=jupyter_notebook['filename'],
                     external_data=external_data,
-                    python_requirements=request_data['pythonRequirements']
+                    python_requirements=request_data['pythonRequirements'],
+                    execution_key=notebook_execution_key,
+                    submission_id=submission_id
                 )
             except HTTPError as e:
                 raise BadRequest('Could not execute {}. {}'.format(jupyter_notebook['filename'], str(e)))
             experiment_ids.append(experiment_id)
 
-        return jsonify({'experimentIds': experiment_ids})
+        if conf.admission_control:
+            return jsonify({
+                'experimentIds': [], 'queuedNotebookIds': queued_notebook_ids,
+                'cachedNotebookIds': cached_notebook_ids, 'submissionId': submission_id, 'bytesSaved': bytes_saved
+            })
+        return jsonify({
+            'experimentIds': experiment_ids, 'cachedNotebookIds': cached_notebook_ids, 'submissionId': submission_id,
+            'bytesSaved': bytes_saved
+        })
+
+    @app.route('/uploads/missing', methods=['POST'])
+    @auth.login_required
+    def get_missing_uploads():
+        """
+        Checks, which notebook files have to be uploaded. The json data contains the key "contentHashes", a list of the
+        hex encoded sha256 hashes of the notebook files.
+
+        :return: A json object with the key "missingHashes", containing the hashes of the files, that are not uploaded
+        """
+        data = get_request_json()
+        try:
+            validate(data, UPLOAD_CHECK_VALIDATOR)
+        except jsonschema.ValidationError as e:
+            raise BadRequest('Failed to validate upload check. {}'.format(str(e)))
+
+        content_hashes = list(collections.OrderedDict.fromkeys(data['contentHashes']))
+        uploaded_hashes = DatabaseAPI.create().get_uploaded_hashes(g.user.user_id, content_hashes)
+        missing_hashes = [
+            content_hash for content_hash in content_hashes
+            if content_hash not in uploaded_hashes or not notebook_database.check_upload(content_hash)
+        ]
+        return jsonify({'missingHashes': missing_hashes})
+
+    @app.route('/uploads', methods=['POST'])
+    @auth.login_required
+    def upload_notebooks():
+        """
+        Uploads notebook files as multipart/form-data. The name of every file part is the hex encoded sha256 hash of
+        the file content. The request stream is parsed directly, so every part is written once to a temporary file in
+        the upload directory, while it arrives. Every notebook is validated, before it is stored. Uploaded notebooks are
+        executed by referencing their hash as "contentHash" in an execution request.
+
+        Uploads count towards the storage quota of the user and are removed, if they are not uploaded again within
+        the configured upload retention.
+
+        :return: A json object with the key "contentHashes", containing the hashes of the stored notebooks
+        """
+        database_api = DatabaseAPI.create()
+        submission_quota.check_stored_bytes(database_api, g.user.user_id)
+
+        spools = []
+
+        def stream_factory(total_content_length, content_type, filename, content_length=None):
+            spool = notebook_database.open_upload_spool()
+            spools.append(spool)
+            return spool
+
+        content_hashes = []
+        try:
+            _stream, _form, files = parse_form_data(
+                request.environ, stream_factory=stream_factory, max_content_length=request.max_content_length
+            )
+            if not files:
+                raise BadRequest('Did not send notebook files')
+
+            for expected_hash, notebook_file in files.items(multi=True):
+                spool = notebook_file.stream
+                spool.close()
+                content_hash = spool.get_content_hash()
+                if content_hash != expected_hash:
+                    raise BadRequest(
+                        'The content of "{}" does not match the hash {}'.format(notebook_file.filename, expected_hash)
+                    )
+                try:
+                    with open(spool.temporary_path, 'rb') as file:
+                        notebook_data = json_codec.load(file)
+                except ValueError as e:
+                    raise BadRequest('Failed to decode notebook "{}". {}'.format(notebook_file.filename, str(e)))
+                error = notebook_validator.validate_notebooks([notebook_data], [content_hash])[0]
+                if error is not None:
+                    raise BadRequest('Failed to validate notebook "{}".\n{}'.format(notebook_file.filename, error))
+                notebook_database.commit_upload(spool.temporary_path, content_hash)
+                removed_hashes = database_api.save_upload(
+                    g.user.user_id, content_hash, spool.size, conf.upload_retention
+                )
+                # another process could store one of these files again before it is removed. Then the file is missing,
+                # so the client is asked to upload it again by /uploads/missing.
+                for removed_hash in removed_hashes:
+                    notebook_database.remove_upload(removed_hash)
+                content_hashes.append(content_hash)
+        finally:
+            for spool in spools:
+                spool.close()
+                notebook_database.discard_upload(spool.temporary_path)
+
+        return jsonify({'contentHashes': content_hashes})
 
     @app.route('/notebook/<notebook_id>', methods=['GET'])
     def get_notebook(notebook_id):
@@ -172,9 +435,9 @@ def create_app():
         :type notebook_id: str
         """
         validate_notebook_id(notebook_id)
-        notebook_data = notebook_database.get_notebook(notebook_id)
+        DatabaseAPI.create().record_lifecycle_event(notebook_id, 'started')
 
-        return jsonify(notebook_data)
+        return notebook_file_response(notebook_id, is_result=False)
 
     @app.route('/result/<notebook_id>', methods=['POST'])
     def post_result(notebook_id):
@@ -185,9 +448,28 @@ def create_app():
         :type notebook_id: str
         """
         validate_notebook_id(notebook_id)
-        notebook_database.save_notebook(request.json, notebook_id, is_result=True)
         database_api = DatabaseAPI.create()
+        database_api.record_lifecycle_event(notebook_id, 'result_upload_started')
+        result_data = get_request_json()
+        if result_data is None:
+            raise BadRequest('Did not send result notebook as json')
+        result_size, cell_entries = notebook_database.save_indexed_notebook(result_data, notebook_id, is_result=True)
+        database_api.record_lifecycle_event(notebook_id, 'result_received')
+        database_api.save_result_index(notebook_id, cell_entries)
+        result_summary = extract_summary(result_data, cell_entries)
+        if result_summary is not None:
+            database_api.save_result_summary(notebook_id, result_summary)
+
+        if execution_cache is not None and result_summary is not None and result_summary.error_cell_count == 0:
+            notebook = database_api.get_notebook(notebook_id)
+            if notebook.execution_key is not None:
+                execution_cache.store(database_api, notebook.user_id, notebook.execution_key, notebook_id)
         database_api.update_notebook_status(notebook_id, DatabaseAPI.NotebookStatus.SUCCESS)
+        database_api.add_stored_bytes(notebook_id, result_size)
+
+        execution_profile = extract_profile(result_data)
+        if execution_profile is not None:
+            database_api.save_execution_profile(notebook_id, execution_profile)
 
         return 'notebook submitted'
 
@@ -197,32 +479,416 @@ def create_app():
         """
         Gets the result of the given notebook id.
         """
-        if notebook_database.check_notebook(notebook_id, True):
+        database_api = DatabaseAPI.create()
+        try:
+            notebook = database_api.get_notebook(notebook_id)
+        except database_module.DatabaseError:
+            raise NotFound()
+
+        if notebook_database.check_notebook(notebook.get_result_id(), True):
 
             # check right user
-            database_api = DatabaseAPI.create()
-            notebook = database_api.get_notebook(notebook_id)
             if notebook.user_id != g.user.user_id:
                 raise Unauthorized('Only the owner of a notebook can request the results')
 
-            def generate():
-                with notebook_database.open_notebook_file(notebook_id, is_result=True) as notebook_file:
-                    while True:
-                        block = notebook_file.read(1024*1024)
-                        if not block:
-                            break
-                        yield block
-            response = Response(generate(), mimetype='application/json')
+            response = notebook_file_response(notebook.get_result_id(), is_result=True)
             response.headers["Content-Disposition"] = "attachment; filename={}Result.ipynb".format(
                 notebook.get_filename_without_ext()
             )
-            response.headers["Content-Length"] = os.path.getsize(
-                notebook_database.notebook_id_to_path(notebook_id, is_result=True)
-            )
             return response
         else:
             raise NotFound()
 
+    def result_slice_response(notebook_id, cell_entries, part, mime_type, single_cell):
+        """
+        Creates a json response with parts of the given cells. The parts are read directly from the result file at the
+        positions of the cell index, without parsing the notebook.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param cell_entries: The positions of the requested cells
+        :type cell_entries: list[CellIndexEntry]
+        :param part: "cell" for the whole cells, "source" for the sources or "outputs" for the outputs of the cells
+        :type part: str
+        :param mime_type: If given, only outputs with data of this mime type are included
+        :type mime_type: str or None
+        :param single_cell: If True, the part of the first cell is sent, otherwise a list with the parts of every cell
+        :type single_cell: bool
+        :rtype: Response
+        """
+        pieces = []  # bytes or tuples of (offset, length) in the result file
+        for index, cell_entry in enumerate(cell_entries):
+            if index > 0:
+                pieces.append(b',')
+            if part == 'cell':
+                pieces.append((cell_entry.offset, cell_entry.length))
+            elif part == 'source':
+                pieces.append('{{"cell_index":{},"source":'.format(cell_entry.cell_index).encode('utf-8'))
+                if cell_entry.source_offset is None:
+                    pieces.append(b'null')
+                else:
+                    pieces.append((cell_entry.source_offset, cell_entry.source_length))
+                pieces.append(b'}')
+            else:
+                pieces.append('{{"cell_index":{},"outputs":['.format(cell_entry.cell_index).encode('utf-8'))
+                outputs = [
+                    output for output in cell_entry.outputs if mime_type is None or mime_type in output.mime_types
+                ]
+                for output_index, output in enumerate(outputs):
+                    if output_index > 0:
+                        pieces.append(b',')
+                    pieces.append((output.offset, output.length))
+                pieces.append(b']}')
+        if not single_cell:
+            pieces = [b'['] + pieces + [b']']
+
+        def generate():
+            ranges = notebook_database.read_ranges(
+                notebook_id, [piece for piece in pieces if isinstance(piece, tuple)], is_result=True
+            )
+            for piece in pieces:
+                if isinstance(piece, tuple):
+                    yield next(ranges)
+                else:
+                    yield piece
+            ranges.close()
+
+        return Response(generate(), mimetype='application/json')
+
+    def get_result_index(notebook_id, start, stop):
+        """
+        Returns the positions of the given cells of the result of the given notebook, if the current user owns it.
+
+        :return: A tuple (result id, cell positions). The result id is the id of the notebook, that holds the result
+                 file. It differs from the given notebook id, if the result was reused from the execution cache.
+        :rtype: tuple[str, list[CellIndexEntry]]
+
+        :raise NotFound: If the notebook or its result index could not be found
+        :raise Unauthorized: If the current user does not own the notebook
+        """
+        database_api = DatabaseAPI.create()
+        try:
+            notebook = database_api.get_notebook(notebook_id)
+        except database_module.DatabaseError as e:
+            raise NotFound(str(e))
+        if notebook.user_id != g.user.user_id:
+            raise Unauthorized('Only the owner of a notebook can request the results')
+
+        result_id = notebook.get_result_id()
+        cell_entries = database_api.get_result_index(result_id, start, stop)
+        if not cell_entries and not database_api.has_result_index(result_id):
+            raise NotFound('No cell index available for the result of this notebook')
+        return result_id, cell_entries
+
+    def get_slice_arguments():
+        part = request.args.get('part', 'cell')
+        if part not in ('cell', 'source', 'outputs'):
+            raise BadRequest('The part query parameter should be one of "cell", "source" or "outputs"')
+        mime_type = request.args.get('mimeType')
+        if mime_type is not None and part != 'outputs':
+            raise BadRequest('The mimeType query parameter can only be used with part "outputs"')
+        return part, mime_type
+
+    @app.route('/result/<notebook_id>/cells', methods=['GET'])
+    @auth.login_required
+    def get_result_cells(notebook_id):
+        """
+        Returns a range of cells of the result of the given notebook. The query parameters "start" and "stop" select the
+        cells with start <= index < stop. The query parameter "part" selects the whole cells ("cell"), only the sources
+        ("source") or only the outputs ("outputs"). The outputs can be filtered by the query parameter "mimeType".
+        Output data stored in blob files is returned as reference string "cc-blob:<blob_key>", which can be requested
+        from get_result_blob().
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        """
+        start = request.args.get('start', 0, type=int)
+        stop = request.args.get('stop', None, type=int)
+        if start < 0 or (stop is not None and stop < start):
+            raise BadRequest('Invalid cell range')
+        part, mime_type = get_slice_arguments()
+
+        result_id, cell_entries = get_result_index(notebook_id, start, stop)
+        return result_slice_response(result_id, cell_entries, part, mime_type, single_cell=False)
+
+    @app.route('/result/<notebook_id>/cells/<int:cell_index>', methods=['GET'])
+    @auth.login_required
+    def get_result_cell(notebook_id, cell_index):
+        """
+        Returns one cell of the result of the given notebook. Supports the query parameters "part" and "mimeType" like
+        get_result_cells().
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param cell_index: The index of the cell
+        :type cell_index: int
+        """
+        part, mime_type = get_slice_arguments()
+
+        result_id, cell_entries = get_result_index(notebook_id, cell_index, cell_index + 1)
+        if not cell_entries:
+            raise NotFound('The result has no cell with index {}'.format(cell_index))
+        return result_slice_response(result_id, cell_entries, part, mime_type, single_cell=True)
+
+    @app.route('/result/<notebook_id>/blobs/<blob_key>', methods=['GET'])
+    @auth.login_required
+    def get_result_blob(notebook_id, blob_key):
+        """
+        Returns the json data of an output of the result of the given notebook, that is stored in a blob file.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param blob_key: The key of the blob, that is referenced in the result notebook
+        :type blob_key: str
+        """
+        database_api = DatabaseAPI.create()
+        try:
+            notebook = database_api.get_notebook(notebook_id)
+        except database_module.DatabaseError as e:
+            raise NotFound(str(e))
+        if notebook.user_id != g.user.user_id:
+            raise Unauthorized('Only the owner of a notebook can request the results')
+
+        blob_references = notebook_database.get_blob_references(notebook.get_result_id(), is_result=True)
+        if not any(blob_reference.blob_key == blob_key for blob_reference in blob_references):
+            raise NotFound('The result of this notebook does not reference the blob "{}"'.format(blob_key))
+
+        def generate():
+            with notebook_database.open_blob(blob_key) as blob_file:
+                while True:
+                    block = blob_file.read(1024*1024)
+                    if not block:
+                        break
+                    yield block
+
+        response = Response(generate(), mimetype='application/json')
+        response.headers['Content-Length'] = os.path.getsize(notebook_database.blob_path(blob_key))
+        # blobs are named by the hash of their content, so they never change
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
+
+    @app.route('/progress/<notebook_id>', methods=['POST'])
+    def post_progress(notebook_id):
+        """
+        Endpoint for the papermill wrapper to report the progress of a running notebook. Progress reports of notebooks,
+        that are not processing anymore, are ignored.
+
+        :param notebook_id: The id of the executing notebook
+        :type notebook_id: str
+        """
+        validate_notebook_id(notebook_id)
+
+        progress_data = get_request_json()
+        try:
+            validate(progress_data, PROGRESS_VALIDATOR)
+        except jsonschema.ValidationError as e:
+            raise BadRequest('Failed to validate progress data. {}'.format(str(e)))
+
+        database_api = DatabaseAPI.create()
+        notebook = database_api.get_notebook(notebook_id)
+        if notebook.status != DatabaseAPI.NotebookStatus.PROCESSING:
+            return 'progress ignored'
+
+        database_api.update_notebook_progress(
+            notebook_id,
+            progress_data.get('cellIndex'),
+            progress_data.get('cellCount'),
+            progress_data['elapsedTime']
+        )
+
+        return 'progress submitted'
+
+    @app.route('/status/<notebook_id>', methods=['POST'])
+    def post_status(notebook_id):
+        """
+        Endpoint for the papermill wrapper to report status changes of a running notebook, so they are visible without
+        polling the agency. A failed execution or environment error sets the notebook status to failure and stores the
+        reported error as debug info. Status reports of notebooks, that are not processing anymore, are ignored.
+
+        :param notebook_id: The id of the executing notebook
+        :type notebook_id: str
+        """
+        validate_notebook_id(notebook_id)
+
+        status_data = get_request_json()
+        try:
+            validate(status_data, STATUS_VALIDATOR)
+        except jsonschema.ValidationError as e:
+            raise BadRequest('Failed to validate status data. {}'.format(str(e)))
+
+        database_api = DatabaseAPI.create()
+        notebook = database_api.get_notebook(notebook_id)
+        if notebook.status != DatabaseAPI.NotebookStatus.PROCESSING:
+            return 'status ignored'
+
+        event = status_data['event']
+        if event == 'started':
+            # the report counts as first sign of life, so the notebook is not polled at the agency
+            if database_api.get_notebook_progress(notebook_id) is None:
+                database_api.update_notebook_progress(notebook_id, None, None, 0.0)
+            return 'status submitted'
+
+        database_api.update_notebook_status(notebook_id, DatabaseAPI.NotebookStatus.FAILURE)
+        database_api.update_notebook_debug_info(notebook_id, _format_status_debug_info(status_data))
+        return 'status submitted'
+
+    @app.route('/progress/<notebook_id>', methods=['GET'])
+    @auth.login_required
+    def get_progress(notebook_id):
+        """
+        Returns the latest progress report of the given notebook.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+
+        :raise NotFound: If the notebook did not report any progress
+        """
+        database_api = DatabaseAPI.create()
+        try:
+            notebook = database_api.get_notebook(notebook_id)
+        except database_module.DatabaseError as e:
+            raise NotFound(str(e))
+        if notebook.user_id != g.user.user_id:
+            raise Unauthorized('Only the owner of a notebook can request its progress')
+
+        progress = database_api.get_notebook_progress(notebook_id)
+        if progress is None:
+            raise NotFound('Notebook did not report any progress')
+
+        return jsonify(progress.to_json())
+
+    @app.route('/lifecycle/<notebook_id>', methods=['GET'])
+    @auth.login_required
+    def get_lifecycle(notebook_id):
+        """
+        Returns the times of the lifecycle events of the given notebook and the seconds spent in every phase between
+        them, so it can be seen, whether a notebook waited in a queue, executed or sent its result.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+
+        :raise NotFound: If no lifecycle event was recorded for the notebook
+        """
+        database_api = DatabaseAPI.create()
+        try:
+            notebook = database_api.get_notebook(notebook_id)
+        except database_module.DatabaseError as e:
+            raise NotFound(str(e))
+        if notebook.user_id != g.user.user_id:
+            raise Unauthorized('Only the owner of a notebook can request its lifecycle')
+
+        lifecycle = database_api.get_lifecycle(notebook_id)
+        if lifecycle is None:
+            raise NotFound('No lifecycle event was recorded for the notebook')
+
+        return jsonify(lifecycle.to_json())
+
+    def is_stats_operator(user):
+        """
+        :param user: The user to check
+        :type user: DatabaseAPI.User
+        :return: Whether the given user can request the usage statistics of all users
+        :rtype: bool
+        """
+        return any(
+            operator['agencyUsername'] == user.agency_username
+            and normalize_url(operator['agencyUrl']) == normalize_url(user.agency_url)
+            for operator in conf.stats_operators
+        )
+
+    @app.route('/stats', methods=['GET'])
+    @auth.login_required
+    def get_stats():
+        """
+        Returns usage and performance statistics of finished notebooks, computed from the usage rollups. The query
+        parameters are:
+        - "days": the number of days to include, counted back from today (utc). Defaults to STATS_DEFAULT_DAYS.
+        - "groupBy": one of "user", "image", "day" or "status". Can be given multiple times.
+        - "scope": "own" for the notebooks of the current user or "all" for the notebooks of all users. Only stats
+          operators can request "all", which is their default.
+
+        Every group contains the number of notebooks per status, the failure rate, the mean, p50 and p95 runtime and
+        the gpu hours.
+        """
+        days = request.args.get('days', STATS_DEFAULT_DAYS, type=int)
+        if not 1 <= days <= STATS_MAX_DAYS:
+            raise BadRequest('The query parameter days should be between 1 and {}'.format(STATS_MAX_DAYS))
+        group_by = request.args.getlist('groupBy')
+        for dimension in group_by:
+            if dimension not in GROUP_DIMENSIONS:
+                raise BadRequest('Unknown groupBy dimension "{}". Use one of {}'.format(dimension, GROUP_DIMENSIONS))
+        group_by = list(collections.OrderedDict.fromkeys(group_by))
+
+        is_operator = is_stats_operator(g.user)
+        scope = request.args.get('scope', 'all' if is_operator else 'own')
+        if scope not in ('own', 'all'):
+            raise BadRequest('The query parameter scope should be "own" or "all"')
+        if scope == 'all' and not is_operator:
+            raise Unauthorized('Only stats operators can request the statistics of all users')
+        user_id = g.user.user_id if scope == 'own' else None
+
+        since_day = time.strftime('%Y-%m-%d', time.gmtime(time.time() - (days - 1) * 24 * 60 * 60))
+        database_api = DatabaseAPI.create()
+        rollups = database_api.get_usage_rollups(since_day, user_id)
+        runtime_buckets = database_api.get_runtime_buckets(since_day, user_id)
+
+        user_names = {}
+        if 'user' in group_by:
+            for rollup_user_id in set(rollup.user_id for rollup in rollups):
+                user = database_api.get_user(user_id=rollup_user_id)
+                if user is not None:
+                    user_names[rollup_user_id] = '{}@{}'.format(user.agency_username, user.agency_url)
+
+        groups = aggregate_usage(rollups, runtime_buckets, group_by, user_names)
+        return jsonify({
+            'since': since_day,
+            'scope': scope,
+            'groupBy': group_by,
+            'groups': [group.to_json() for group in groups]
+        })
+
+    @app.route('/profile/<notebook_id>', methods=['GET'])
+    @auth.login_required
+    def get_profile(notebook_id):
+        """
+        Returns the execution profile of the given notebook. The profile contains the kernel startup time, the time
+        spent installing python requirements and the wall time, cpu time and peak memory of every executed cell.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+
+        :raise NotFound: If no profile is available for the given notebook
+        """
+        database_api = DatabaseAPI.create()
+        try:
+            notebook = database_api.get_notebook(notebook_id)
+        except database_module.DatabaseError as e:
+            raise NotFound(str(e))
+        if notebook.user_id != g.user.user_id:
+            raise Unauthorized('Only the owner of a notebook can request its profile')
+
+        execution_profile = database_api.get_execution_profile(notebook_id)
+        if execution_profile is None:
+            raise NotFound('No execution profile available for this notebook')
+
+        return jsonify(execution_profile.to_json())
+
+    @app.route('/profile_summary', methods=['GET'])
+    @auth.login_required
+    def get_profile_summary():
+        """
+        Aggregates the cell profiles over all runs of the notebook given by the "notebookFilename" query parameter. The
+        cells that dominate the runtime are listed first.
+        """
+        notebook_filename = request.args.get('notebookFilename')
+        if not notebook_filename:
+            raise BadRequest('Request should define the notebookFilename query parameter')
+
+        database_api = DatabaseAPI.create()
+        summary = database_api.get_cell_profile_summary(g.user.user_id, notebook_filename)
+
+        return jsonify({'notebookFilename': notebook_filename, 'cells': summary})
+
     @app.route('/python_requirements/<notebook_id>', methods=['GET'])
     def get_python_requirements(notebook_id):
         """
@@ -240,9 +906,22 @@ def create_app():
 
         if notebook.python_requirements is None:
             raise NotFound('Notebook has no python requirements')
+        database_api.record_lifecycle_event(notebook_id, 'requirements_fetched')
 
         return notebook.python_requirements
 
+    @app.route('/service_token/<notebook_id>', methods=['GET'])
+    def get_service_token(notebook_id):
+        """
+        Returns the token of the requested notebook, so the container receives it as file instead of a command line
+        argument, which would be visible in its process list. The request is authorized with the token itself.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        """
+        validate_notebook_id(notebook_id)
+        return Response(request.authorization['password'], mimetype='text/plain')
+
     @app.route('/list_results')
     @auth.login_required
     def list_results():
@@ -261,17 +940,71 @@ def create_app():
             print(err_str, file=sys.stderr)
             raise BadRequest(err_str)
 
+        progresses = database_api.get_progresses(g.user.user_id)
+        result_summaries = database_api.get_result_summaries(g.user.user_id)
+        debug_info_sizes = database_api.get_debug_info_sizes(g.user.user_id)
+        lifecycles = database_api.get_lifecycles(g.user.user_id)
+
         entries = []
         for notebook in database_api.get_notebooks(g.user.user_id):
+            progress = progresses.get(notebook.notebook_id)
+            result_summary = result_summaries.get(notebook.notebook_id)
+            lifecycle = lifecycles.get(notebook.notebook_id)
             entries.append({
                 'notebook_id': notebook.notebook_id,
                 'process_status': str(notebook.status),
                 'notebook_filename': notebook.notebook_filename,
                 'execution_time': notebook.execution_time,
-                'debug_info': notebook.debug_info
+                'debug_info': notebook.debug_info,
+                'debug_info_truncated': _is_debug_info_truncated(notebook, debug_info_sizes),
+                'progress': progress.to_json() if progress is not None else None,
+                'summary': result_summary.to_json() if result_summary is not None else None,
+                'cached': notebook.result_notebook_id is not None,
+                'submission_id': notebook.submission_id,
+                'lifecycle': lifecycle.to_json() if lifecycle is not None else None
             })
         entries = sorted(entries, key=lambda entry: entry['execution_time'], reverse=True)
-        return jsonify(entries)
+        return json_response(entries)
+
+    @app.route('/debug_info/<notebook_id>', methods=['GET'])
+    @auth.login_required
+    def get_debug_info(notebook_id):
+        """
+        Returns the full debug info of the given notebook as text. Supports range requests, so clients can fetch only
+        the end of a long debug info.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        """
+        database_api = DatabaseAPI.create()
+        try:
+            notebook = database_api.get_notebook(notebook_id)
+        except database_module.DatabaseError as e:
+            raise NotFound(str(e))
+        if notebook.user_id != g.user.user_id:
+            raise Unauthorized('Only the owner of a notebook can request the debug info')
+
+        debug_info = database_api.get_debug_info(notebook_id)
+        if debug_info is None:
+            raise NotFound('The notebook has no debug info')
+
+        data = debug_info.get_data()
+        response = Response(data, mimetype='text/plain')
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        """
+        Exposes the metrics of this service in the prometheus text format.
+
+        :raise NotFound: If the optional dependency prometheus_client is not installed
+        """
+        try:
+            data, content_type = metrics.generate_metrics()
+        except RuntimeError as e:
+            raise NotFound(str(e))
+
+        return Response(data, content_type=content_type)
 
     @app.route('/predefined_docker_images', methods=['GET'])
     @auth.login_required
@@ -288,10 +1021,10 @@ def create_app():
         """
         Cancels the execution of the given notebook.
         """
-        if not request.json:
+        data = get_request_json()
+        if not data:
             raise BadRequest('Request should define notebook id in json data')
 
-        data = request.json
         if (not isinstance(data, dict)) or ('notebookId' not in data):
             raise BadRequest('Request should define notebook id in json data')
         notebook_id = data['notebookId']
@@ -303,22 +1036,140 @@ def create_app():
         if notebook.user_id != user.user_id:
             raise Unauthorized('You cannot cancel notebooks of different users')
 
-        cookie = database_api.get_newest_cookie(user.user_id)
+        if notebook.status == DatabaseAPI.NotebookStatus.QUEUED:
+            if not database_api.dequeue_notebook(
+                    notebook_id, DatabaseAPI.NotebookStatus.CANCELLED, only_unclaimed=True
+            ):
+                raise BadRequest('Failed to cancel notebook: The notebook is currently submitted to the agency')
+            return jsonify({'batchId': None})
+
+        cookie = auth.get_current_cookie(user.user_id, notebook.agency_url)
         if cookie is None:
             raise Unauthorized('No authorization cookie could be found')
 
         try:
-            batch_id = cancel_batch(notebook.experiment_id, user.agency_url, cookie.cookie_text)
+            batch_id = cancel_batch(notebook.experiment_id, notebook.agency_url, cookie.cookie_text)
         except (ValueError, AgencyError) as e:
             raise BadRequest('Failed to cancel notebook: {}'.format(str(e)))
 
         return jsonify({'batchId': batch_id})
 
+    @app.route('/cancel_notebooks', methods=['DELETE'])
+    @auth.login_required
+    def cancel_notebooks_in_bulk():
+        """
+        Cancels many notebooks at once. The json data selects the notebooks by one of:
+        - "notebookIds": a list of notebook ids
+        - "submissionId": the id of the request, that submitted the notebooks
+        - "filter": an object with the optional keys "status" (a list of "processing" and "queued") and
+          "filenamePattern" (a shell-style pattern like "sweep_*.ipynb")
+
+        :return: A json object with the key "results", containing the outcome for every selected notebook
+        """
+        data = get_request_json()
+        try:
+            validate(data, CANCEL_VALIDATOR)
+        except jsonschema.ValidationError as e:
+            raise BadRequest('Failed to validate cancel request. {}'.format(str(e)))
+
+        statuses = [DatabaseAPI.NotebookStatus.PROCESSING, DatabaseAPI.NotebookStatus.QUEUED]
+        notebook_filter = data.get('filter', {})
+        if 'status' in notebook_filter:
+            statuses = [DatabaseAPI.NotebookStatus[status.upper()] for status in set(notebook_filter['status'])]
+
+        database_api = DatabaseAPI.create()
+        notebooks, missing_ids = select_notebooks(
+            database_api, g.user.user_id,
+            notebook_ids=data.get('notebookIds'),
+            submission_id=data.get('submissionId'),
+            statuses=statuses,
+            filename_pattern=notebook_filter.get('filenamePattern')
+        )
+        outcomes = cancel_notebooks(database_api, g.user.user_id, notebooks)
+
+        outcomes.extend(
+            CancelOutcome(notebook_id, OUTCOME_NOT_FOUND, error='Notebook not found') for notebook_id in missing_ids
+        )
+        return jsonify({'results': [outcome.to_json() for outcome in outcomes]})
+
+    @app.route('/results_archive', methods=['GET'])
+    @auth.login_required
+    def get_results_archive():
+        """
+        Streams a zip archive with the results of many notebooks. The notebooks are selected by one of the query
+        parameters:
+        - "notebookId": the id of a notebook, can be given multiple times
+        - "submissionId": the id of the request, that submitted the notebooks
+        - "status" and "filenamePattern": the status of the notebooks, can be given multiple times, and a shell-style
+          pattern for their filenames. Without any query parameter, the results of all successful notebooks are sent.
+
+        The archive contains a "manifest.json" file, that lists the status and filename of every selected notebook.
+        """
+        notebook_ids = request.args.getlist('notebookId') or None
+        submission_id = request.args.get('submissionId')
+        status_names = request.args.getlist('status')
+        filename_pattern = request.args.get('filenamePattern')
+        if notebook_ids is not None and submission_id is not None:
+            raise BadRequest('The query parameters notebookId and submissionId can not be combined')
+
+        statuses = [DatabaseAPI.NotebookStatus.SUCCESS]
+        if status_names:
+            try:
+                statuses = [DatabaseAPI.NotebookStatus[status.upper()] for status in set(status_names)]
+            except KeyError as e:
+                raise BadRequest('Unknown notebook status {}'.format(str(e)))
+
+        notebooks, missing_ids = select_notebooks(
+            DatabaseAPI.create(), g.user.user_id,
+            notebook_ids=notebook_ids,
+            submission_id=submission_id,
+            statuses=statuses,
+            filename_pattern=filename_pattern
+        )
+        if missing_ids:
+            raise NotFound('Notebooks not found: {}'.format(', '.join(missing_ids)))
+
+        response = Response(iter_result_archive(notebook_database, notebooks), mimetype='application/zip')
+        response.headers["Content-Disposition"] = "attachment; filename=results.zip"
+        return response
+
     database_module.init_app(app)
 
     return app
 
 
+def _is_debug_info_truncated(notebook, debug_info_sizes):
+    """
+    :param notebook: The notebook to check
+    :type notebook: DatabaseAPI.Notebook
+    :param debug_info_sizes: The sizes of the debug infos of the notebooks of the user
+    :type debug_info_sizes: dict[str, int]
+    :return: Whether the debug info of the notebook is longer than its excerpt
+    :rtype: bool
+    """
+    if notebook.debug_info is None or notebook.notebook_id not in debug_info_sizes:
+        return False
+    return len(notebook.debug_info.encode('utf-8')) < debug_info_sizes[notebook.notebook_id]
+
+
+def _format_status_debug_info(status_data):
+    """
+    :param status_data: A validated failure report of the papermill wrapper
+    :type status_data: dict
+    :return: The debug info describing the reported failure
+    :rtype: str
+    """
+    if status_data['event'] == 'environment_error':
+        headline = 'The execution environment could not be prepared'
+    elif status_data.get('cellIndex') is not None:
+        headline = 'The notebook execution failed in cell {}'.format(status_data['cellIndex'])
+    else:
+        headline = 'The notebook execution failed'
+    if status_data.get('ename'):
+        headline = '{}: {}: {}'.format(headline, status_data['ename'], status_data.get('evalue') or '')
+    return '{}\n{}'.format(headline, status_data.get('message', ''))
+
+
 def _get_debug_info_for_batch(batch_id, agency_url, cookie):
     """
     Returns the debug information of the given batch.
@@ -331,19 +1182,21 @@ def _get_debug_info_for_batch(batch_id, agency_url, cookie):
     :rtype: str
     """
     # try stderr
-    r = requests.get(
-        url_join(agency_url, 'batches/{}/stderr'.format(batch_id)),
-        cookies={AUTHORIZATION_COOKIE_KEY: cookie.cookie_text}
-    )
+    with metrics.time_agency_request('batches/<id>/stderr'):
+        r = requests.get(
+            url_join(agency_url, 'batches/{}/stderr'.format(batch_id)),
+            cookies={AUTHORIZATION_COOKIE_KEY: cookie.cookie_text}
+        )
 
     if 200 <= r.status_code < 300 and r.text.strip():
         return r.text
 
     # if no stderr could be found, look in agency logs
-    r = requests.get(
-        url_join(agency_url, 'batches/{}'.format(batch_id)),
-        cookies={AUTHORIZATION_COOKIE_KEY: cookie.cookie_text}
-    )
+    with metrics.time_agency_request('batches/<id>'):
+        r = requests.get(
+            url_join(agency_url, 'batches/{}'.format(batch_id)),
+            cookies={AUTHORIZATION_COOKIE_KEY: cookie.cookie_text}
+        )
     r.raise_for_status()
     batch_info = r.json()
     for history_entry in batch_info['history']:
@@ -364,6 +1217,8 @@ def _get_debug_info_for_batch(batch_id, agency_url, cookie):
 def _update_notebook_status(user):
     """
     Updates the database status for every notebook of the given user. Therefor a request to the agency is made.
+    Notebooks, whose papermill wrapper reported within the last STATUS_REPORT_TIMEOUT seconds, are skipped, because they
+    report their status changes to the status endpoint. So only runs, that stopped reporting, are polled.
 
     :param user: The user to fetch the notebook status for
     :type user: DatabaseAPI.User
@@ -372,20 +1227,37 @@ def _update_notebook_status(user):
     :raise HTTPError: If the agency could not be contacted
     """
     database_api = DatabaseAPI.create()
-    cookie = database_api.get_newest_cookie(user.user_id)
-    if cookie is None:
+    cookies = auth.get_current_cookies(user.user_id)
+    if not cookies:
         raise ValueError('No authorization cookie could be found')
 
-    agency_url = normalize_url(user.agency_url)
-
     notebooks = database_api.get_notebooks(user_id=user.user_id, status=DatabaseAPI.NotebookStatus.PROCESSING)
+    progresses = database_api.get_progresses(user.user_id)
+    now = time.time()
 
     for notebook in notebooks:
-        r = requests.get(
-            url_join(agency_url, 'batches'),
-            cookies={AUTHORIZATION_COOKIE_KEY: cookie.cookie_text},
-            params={'experimentId': notebook.experiment_id}
-        )
+        # notebooks, that are still reporting, send their status changes themselves
+        progress = progresses.get(notebook.notebook_id)
+        if progress is not None and now - progress.update_time < STATUS_REPORT_TIMEOUT:
+            continue
+
+        agency_url = notebook.agency_url
+        cookie = cookies.get(agency_url)
+        if cookie is None:
+            print(
+                'No authorization cookie for agency "{}" of notebook "{}" could be found'.format(
+                    agency_url, notebook.notebook_id
+                ),
+                file=sys.stderr
+            )
+            continue
+
+        with metrics.time_agency_request('batches'):
+            r = requests.get(
+                url_join(agency_url, 'batches'),
+                cookies={AUTHORIZATION_COOKIE_KEY: cookie.cookie_text},
+                params={'experimentId': notebook.experiment_id}
+            )
         r.raise_for_status()
         batch = r.json()
         if len(batch) != 1:
@@ -422,6 +1294,11 @@ def validate_notebook_id(notebook_id):
     :raise NotFound: If the notebook could not be found
     :raise Unauthorized: If the username does not match OR the password does not match the notebook_token
     """
+    with metrics.Timer(metrics.TOKEN_VERIFICATION_LATENCY):
+        _validate_notebook_id(notebook_id)
+
+
+def _validate_notebook_id(notebook_id):
     database_api = DatabaseAPI.create()
     try:
         notebook = database_api.get_notebook(notebook_id)
@@ -429,7 +1306,15 @@ def validate_notebook_id(notebook_id):
     except database_module.DatabaseError as e:
         raise NotFound(str(e))
 
+    if request.authorization is None:
+        raise Unauthorized('The request contains no authorization')
     if user.agency_username != request.authorization['username']:
         raise Unauthorized('The request username does not match the agency username')
+
+    # the stored hash is part of the key, so a replaced token is checked again
+    token_key = (notebook.notebook_token, hashlib.sha256(request.authorization['password'].encode('utf-8')).digest())
+    if token_cache.get(token_key) is not TTLCache.MISSING:
+        return
     if not check_password_hash(notebook.notebook_token, request.authorization['password']):
         raise Unauthorized('The request password does not match the notebook token')
+    token_cache.put(token_key, True)
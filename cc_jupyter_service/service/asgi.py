@@ -0,0 +1,187 @@
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from cc_jupyter_service.service.app import create_app, conf
+
+# request bodies larger than this number of bytes are buffered in a temporary file instead of memory
+MAX_MEMORY_BODY_SIZE = 1024 * 1024
+
+
+class AsgiAdapter:
+    def __init__(self, wsgi_app, worker_threads):
+        """
+        Serves a wsgi application as asgi application. The network I/O with the clients is done by the event loop,
+        while the wsgi application runs in a pool of worker threads:
+        - The request body is received completely, before a worker thread is used.
+        - The response body is produced by the worker threads chunk by chunk and every chunk is sent by the event loop.
+
+        So a worker thread is only used while a request is processed or a chunk of the response is read, but not while
+        slow clients upload or download notebooks. One process can hold many more connections than worker threads. The
+        agency requests and database queries of a request still run synchronously in its worker thread.
+
+        Data passed to the write callable returned by start_response is buffered until the worker thread returns, so
+        applications should return their response body as iterable instead.
+
+        :param wsgi_app: The wsgi application to serve
+        :type wsgi_app: Callable
+        :param worker_threads: The number of worker threads
+        :type worker_threads: int
+        """
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=worker_threads, thread_name_prefix='asgi-worker')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported asgi scope type "{}"'.format(scope['type']))
+
+        body = await _receive_body(receive)
+        if body is None:
+            return  # the client disconnected
+        try:
+            await self._respond(scope, body, send)
+        finally:
+            body.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _respond(self, scope, body, send):
+        loop = asyncio.get_event_loop()
+        response_start = {}
+        # data passed to the legacy write callable. It is written in a worker thread and sent by the event loop.
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and response_start.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start['status'] = int(status.split(' ', 1)[0])
+            response_start['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+
+            def write(data):
+                written.append(bytes(data))
+            return write
+
+        environ = _create_environ(scope, body)
+        iterable = await loop.run_in_executor(self.executor, self.wsgi_app, environ, start_response)
+        try:
+            iterator = iter(iterable)
+            # start_response can be called until the first chunk is produced
+            chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            response_start['sent'] = True
+            await send({
+                'type': 'http.response.start',
+                'status': response_start['status'],
+                'headers': response_start['headers']
+            })
+            while True:
+                # data passed to write() is sent before the chunk, that was produced after it
+                while written:
+                    await send({'type': 'http.response.body', 'body': written.pop(0), 'more_body': True})
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(iterable, 'close'):
+                await loop.run_in_executor(self.executor, iterable.close)
+
+
+async def _receive_body(receive):
+    """
+    Receives the request body into a temporary file.
+
+    :return: The request body positioned at the start or None, if the client disconnected
+    :rtype: tempfile.SpooledTemporaryFile or None
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORY_BODY_SIZE)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    body.seek(0)
+    return body
+
+
+def _create_environ(scope, body):
+    """
+    Creates the wsgi environment for the given asgi http scope.
+
+    :param scope: The asgi http scope
+    :type scope: dict
+    :param body: The complete request body
+    :type body: tempfile.SpooledTemporaryFile
+    :rtype: dict
+    """
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # wsgi expects the url encoded path decoded as latin-1
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+        environ['REMOTE_PORT'] = str(scope['client'][1])
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = 'HTTP_{}'.format(name)
+        if key in environ:
+            environ[key] = '{},{}'.format(environ[key], value)
+        else:
+            environ[key] = value
+    return environ
+
+
+def create_asgi_app():
+    """
+    Creates the service as asgi application. Any asgi server can serve it, for example:
+
+    uvicorn --factory cc_jupyter_service.service.asgi:create_asgi_app
+
+    The wsgi application created by create_app() stays available for wsgi servers.
+
+    :rtype: AsgiAdapter
+    """
+    return AsgiAdapter(create_app(), conf.asgi_worker_threads)
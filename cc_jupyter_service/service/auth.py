@@ -1,7 +1,10 @@
 import functools
+import sys
+import time
 
 from flask import Blueprint, flash, g, redirect, render_template, request, session, url_for
 
+from cc_jupyter_service.common.cache import TTLCache
 from cc_jupyter_service.common.conf import Conf
 from cc_jupyter_service.common.helper import normalize_url, check_agency, AgencyError
 from cc_jupyter_service.service.db import DatabaseAPI
@@ -9,6 +12,102 @@ from cc_jupyter_service.service.db import DatabaseAPI
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 conf = Conf.from_system()
 
+# The caches are local to every process. Changes made by other processes become visible after user_cache_ttl seconds.
+user_cache = TTLCache(conf.user_cache_size, conf.user_cache_ttl)
+cookie_cache = TTLCache(conf.user_cache_size, conf.user_cache_ttl)
+
+
+def get_user(user_id):
+    """
+    Returns the user with the given id. The user is cached in this process.
+
+    :param user_id: The id of the user
+    :type user_id: int
+    :return: The user or None, if the user does not exist
+    :rtype: DatabaseAPI.User or None
+    """
+    user = user_cache.get(user_id)
+    if user is TTLCache.MISSING:
+        user = DatabaseAPI.create().get_user(user_id=user_id)
+        if user is not None:
+            user_cache.put(user_id, user)
+    return user
+
+
+def get_current_cookies(user_id):
+    """
+    Returns the current agency authorization cookies of the given user. The cookies are cached in this process, until
+    the first of them expires. Then they are loaded again, because the user may have logged in again in another process.
+
+    :param user_id: The id of the user
+    :type user_id: int
+    :return: A dictionary mapping agency urls to the current cookie of the user for this agency. Expired cookies are not
+             included.
+    :rtype: dict[str, DatabaseAPI.Cookie]
+    """
+    cookies = cookie_cache.get(user_id)
+    if cookies is not TTLCache.MISSING and any(cookie.is_expired() for cookie in cookies.values()):
+        cookies = TTLCache.MISSING
+    if cookies is TTLCache.MISSING:
+        cookies = DatabaseAPI.create().get_current_cookies(user_id)
+        if cookies:
+            cookie_cache.put(user_id, cookies, max_ttl=_seconds_until_first_expiry(cookies))
+    return {agency_url: cookie for agency_url, cookie in cookies.items() if not cookie.is_expired()}
+
+
+def _seconds_until_first_expiry(cookies):
+    """
+    :type cookies: dict[str, DatabaseAPI.Cookie]
+    :return: The seconds until the first of the given cookies expires or None, if none of them expires
+    :rtype: float or None
+    """
+    expiry_times = [cookie.expiry_time for cookie in cookies.values() if cookie.expiry_time is not None]
+    if not expiry_times:
+        return None
+    return min(expiry_times) - time.time()
+
+
+def get_current_cookie(user_id, agency_url):
+    """
+    Returns the current authorization cookie of the given user for the given agency.
+
+    :param user_id: The id of the user
+    :type user_id: int
+    :param agency_url: The url of the agency
+    :type agency_url: str
+    :return: The current cookie or None, if the user has no cookie for this agency or the cookie is expired
+    :rtype: DatabaseAPI.Cookie or None
+    """
+    return get_current_cookies(user_id).get(normalize_url(agency_url))
+
+
+def get_agency_urls(agency_url):
+    """
+    Returns the agencies, that can execute notebooks of users of the given agency.
+
+    :param agency_url: The agency of the user
+    :type agency_url: str
+    :return: The federated agencies, if the given agency is one of them, otherwise only the given agency
+    :rtype: list[str]
+    """
+    agency_url = normalize_url(agency_url)
+    if conf.federated_agency_urls:
+        federated_agency_urls = [normalize_url(url) for url in conf.federated_agency_urls]
+        if agency_url in federated_agency_urls:
+            return federated_agency_urls
+    return [agency_url]
+
+
+def invalidate_user(user_id):
+    """
+    Removes the given user and its cookies from the caches of this process.
+
+    :param user_id: The id of the user
+    :type user_id: int
+    """
+    user_cache.invalidate(user_id)
+    cookie_cache.invalidate(user_id)
+
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -19,8 +118,9 @@ def login():
 
         error = None
         authorization_cookie = None
+        expiry_time = None
         try:
-            authorization_cookie = check_agency(agency_url, agency_username, agency_password)
+            authorization_cookie, expiry_time = check_agency(agency_url, agency_username, agency_password)
         except AgencyError as e:
             error = str(e)
 
@@ -36,7 +136,24 @@ def login():
 
             # save authorization cookie
             if authorization_cookie is not None:
-                database_api.create_cookie(authorization_cookie, user_id)
+                database_api.set_current_cookie(authorization_cookie, user_id, agency_url, expiry_time)
+
+            # federated agencies share the user accounts, so the same credentials are used
+            for federated_agency_url in get_agency_urls(agency_url):
+                if federated_agency_url == agency_url:
+                    continue
+                try:
+                    federated_cookie, federated_expiry_time = check_agency(
+                        federated_agency_url, agency_username, agency_password
+                    )
+                except AgencyError as e:
+                    print('Failed to login at federated agency: {}'.format(str(e)), file=sys.stderr)
+                    continue
+                if federated_cookie is not None:
+                    database_api.set_current_cookie(
+                        federated_cookie, user_id, federated_agency_url, federated_expiry_time
+                    )
+            invalidate_user(user_id)
 
             session.clear()
             session['user_id'] = user_id
@@ -59,8 +176,7 @@ def load_logged_in_user():
     if user_id is None:
         g.user = None
     else:
-        database_api = DatabaseAPI.create()
-        g.user = database_api.get_user(user_id=user_id)
+        g.user = get_user(user_id)
 
 
 def login_required(view):
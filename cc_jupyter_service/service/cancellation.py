@@ -0,0 +1,125 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from cc_jupyter_service.common.execution import cancel_batch
+from cc_jupyter_service.common.helper import AgencyError
+from cc_jupyter_service.service import auth
+from cc_jupyter_service.service.db import DatabaseAPI
+
+# the maximal number of concurrent agency requests of one bulk cancellation
+MAX_PARALLEL_CANCELLATIONS = 16
+
+OUTCOME_CANCELLED = 'cancelled'
+OUTCOME_FAILED = 'failed'
+OUTCOME_NOT_CANCELLABLE = 'not_cancellable'
+OUTCOME_NOT_FOUND = 'not_found'
+
+
+class CancelOutcome:
+    def __init__(self, notebook_id, outcome, batch_id=None, error=None):
+        """
+        Describes the result of the cancellation of one notebook.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param outcome: One of the OUTCOME_* constants
+        :type outcome: str
+        :param batch_id: The id of the cancelled batch or None, if no batch was cancelled
+        :type batch_id: str or None
+        :param error: The reason, why the notebook could not be cancelled
+        :type error: str or None
+        """
+        self.notebook_id = notebook_id
+        self.outcome = outcome
+        self.batch_id = batch_id
+        self.error = error
+
+    def to_json(self):
+        return {
+            'notebookId': self.notebook_id,
+            'outcome': self.outcome,
+            'batchId': self.batch_id,
+            'error': self.error
+        }
+
+
+def cancel_notebooks(database_api, user_id, notebooks):
+    """
+    Cancels the given notebooks. Queued notebooks are removed from the queue. The batches of processing notebooks are
+    cancelled with at most MAX_PARALLEL_CANCELLATIONS concurrent agency requests. The status of all cancelled notebooks
+    is set in one transaction for the queued and one for the processing notebooks. Processing notebooks, that finished
+    while their batch was cancelled, keep their status and are reported as not cancellable. A notebook, that is given
+    multiple times, is cancelled and reported once.
+
+    :param database_api: The database to use
+    :type database_api: DatabaseAPI
+    :param user_id: The id of the user owning the notebooks
+    :type user_id: int
+    :param notebooks: The notebooks to cancel
+    :type notebooks: list[DatabaseAPI.Notebook]
+    :return: The outcome for every notebook in the order of their first occurrence
+    :rtype: list[CancelOutcome]
+    """
+    unique_notebooks = OrderedDict()
+    for notebook in notebooks:
+        unique_notebooks.setdefault(notebook.notebook_id, notebook)
+    notebooks = list(unique_notebooks.values())
+
+    outcomes = {}
+
+    queued_ids = [
+        notebook.notebook_id for notebook in notebooks if notebook.status == DatabaseAPI.NotebookStatus.QUEUED
+    ]
+    dequeued_ids = database_api.dequeue_notebooks(queued_ids, DatabaseAPI.NotebookStatus.CANCELLED)
+    for notebook_id in queued_ids:
+        if notebook_id in dequeued_ids:
+            outcomes[notebook_id] = CancelOutcome(notebook_id, OUTCOME_CANCELLED)
+        else:
+            outcomes[notebook_id] = CancelOutcome(
+                notebook_id, OUTCOME_FAILED, error='The notebook is currently submitted to the agency'
+            )
+
+    cancellations = []
+    for notebook in notebooks:
+        if notebook.status == DatabaseAPI.NotebookStatus.PROCESSING:
+            cookie = auth.get_current_cookie(user_id, notebook.agency_url)
+            if cookie is None:
+                outcomes[notebook.notebook_id] = CancelOutcome(
+                    notebook.notebook_id, OUTCOME_FAILED, error='No authorization cookie could be found'
+                )
+            else:
+                cancellations.append((notebook, cookie.cookie_text))
+        elif notebook.status != DatabaseAPI.NotebookStatus.QUEUED:
+            outcomes[notebook.notebook_id] = CancelOutcome(
+                notebook.notebook_id, OUTCOME_NOT_CANCELLABLE,
+                error='The notebook is not running anymore. Status: {}'.format(str(notebook.status))
+            )
+
+    batch_ids = {}
+    if cancellations:
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_CANCELLATIONS, len(cancellations))) as executor:
+            futures = {
+                executor.submit(cancel_batch, notebook.experiment_id, notebook.agency_url, cookie_text): notebook
+                for notebook, cookie_text in cancellations
+            }
+            for future in as_completed(futures):
+                notebook_id = futures[future].notebook_id
+                try:
+                    batch_ids[notebook_id] = future.result()
+                except (ValueError, AgencyError, requests.RequestException) as e:
+                    outcomes[notebook_id] = CancelOutcome(notebook_id, OUTCOME_FAILED, error=str(e))
+
+    cancelled_ids = database_api.cancel_processing_notebooks(list(batch_ids))
+    for notebook_id, batch_id in batch_ids.items():
+        if notebook_id in cancelled_ids:
+            outcomes[notebook_id] = CancelOutcome(notebook_id, OUTCOME_CANCELLED, batch_id=batch_id)
+        else:
+            # the notebook finished, while its batch was cancelled, so its status was kept
+            outcomes[notebook_id] = CancelOutcome(
+                notebook_id, OUTCOME_NOT_CANCELLABLE, batch_id=batch_id,
+                error='The notebook finished, before its batch was cancelled'
+            )
+
+    return [outcomes[notebook.notebook_id] for notebook in notebooks]
@@ -1,3 +1,4 @@
+import collections
 import enum
 import os
 
@@ -9,6 +10,29 @@ from flask import g, current_app, Flask
 from flask.cli import with_appcontext
 from werkzeug.security import generate_password_hash
 
+from cc_jupyter_service.common import metrics, json_codec
+from cc_jupyter_service.common.execution_profile import ExecutionProfile, CellProfile
+from cc_jupyter_service.common.result_index import CellIndexEntry, OutputIndexEntry
+from cc_jupyter_service.common.result_summary import ResultSummary
+from cc_jupyter_service.common.debug_info import DebugInfo
+from cc_jupyter_service.common.usage_stats import UsageRollup, RuntimeBucket, runtime_bucket
+
+# stored instead of a token hash for notebooks without a token. check_password_hash() rejects every token for it,
+# because it is no werkzeug hash. The notebook id keeps it unique.
+UNUSABLE_TOKEN_HASH = '!{}'
+# the lifecycle events of a notebook in the order they happen. Every event is a column of the notebook_lifecycle table.
+LIFECYCLE_EVENTS = (
+    'submitted', 'accepted', 'started', 'requirements_fetched', 'result_upload_started', 'result_received', 'finished'
+)
+# the phases of a notebook execution, as (name, start event, end event)
+LIFECYCLE_PHASES = (
+    ('queued', 'submitted', 'accepted'),
+    ('agency_wait', 'accepted', 'started'),
+    ('execution', 'started', 'result_upload_started'),
+    ('result_upload', 'result_upload_started', 'result_received'),
+    ('status_detection', 'result_received', 'finished')
+)
+
 
 class DatabaseAPI:
     class User:
@@ -27,7 +51,8 @@ class DatabaseAPI:
     class Notebook:
         def __init__(
             self, db_id, notebook_id, notebook_token, experiment_id, status, notebook_filename, execution_time,
-            debug_info, user_id, python_requirements
+            debug_info, user_id, python_requirements, agency_url, execution_key=None, result_notebook_id=None,
+            submission_id=None
         ):
             """
             Creates a Notebook.
@@ -46,12 +71,20 @@ class DatabaseAPI:
             :type notebook_filename: str
             :param execution_time: The timestamp of the execution of this notebook
             :type execution_time: int
-            :param debug_info: The debug information, if the batch failed
+            :param debug_info: The end of the debug information, if the batch failed
             :type debug_info: str or None
             :param user_id: The user id that executed this notebook
             :type user_id: int
             :param python_requirements: The content of a requirements.txt file
             :type python_requirements: str
+            :param agency_url: The url of the agency executing this notebook
+            :type agency_url: str
+            :param execution_key: The hash of the execution inputs or None, if the execution cache is disabled
+            :type execution_key: str or None
+            :param result_notebook_id: The id of the notebook, whose result is reused from the execution cache or None
+            :type result_notebook_id: str or None
+            :param submission_id: The id of the request, that submitted this notebook
+            :type submission_id: str or None
             """
             self.db_id = db_id
             self.notebook_id = notebook_id
@@ -63,6 +96,17 @@ class DatabaseAPI:
             self.debug_info = debug_info
             self.user_id = user_id
             self.python_requirements = python_requirements
+            self.agency_url = agency_url
+            self.execution_key = execution_key
+            self.result_notebook_id = result_notebook_id
+            self.submission_id = submission_id
+
+        def get_result_id(self):
+            """
+            :return: The id of the notebook, whose result file belongs to this notebook
+            :rtype: str
+            """
+            return self.result_notebook_id if self.result_notebook_id is not None else self.notebook_id
 
         def get_filename_without_ext(self):
             """
@@ -72,7 +116,7 @@ class DatabaseAPI:
             return os.path.splitext(self.notebook_filename)[0]
 
     class Cookie:
-        def __init__(self, db_id, cookie_text, creation_time, user_id):
+        def __init__(self, db_id, cookie_text, creation_time, expiry_time, user_id, agency_url):
             """
             Creates a Cookie.
 
@@ -82,23 +126,137 @@ class DatabaseAPI:
             :type cookie_text: str
             :param creation_time: The creation time of the cookie as timestamp
             :type creation_time: float
+            :param expiry_time: The expiry time of the cookie as timestamp or None, if the cookie does not expire
+            :type expiry_time: float or None
             :param user_id: The owning user id
             :type user_id: int
+            :param agency_url: The url of the agency, that issued this cookie
+            :type agency_url: str
             """
             self.db_id = db_id
             self.cookie_text = cookie_text
             self.creation_time = creation_time
+            self.expiry_time = expiry_time
             self.user_id = user_id
+            self.agency_url = agency_url
+
+        def is_expired(self, now=None):
+            """
+            :param now: The timestamp to compare with. Defaults to the current time.
+            :type now: float or None
+            :return: Whether this cookie is expired
+            :rtype: bool
+            """
+            if self.expiry_time is None:
+                return False
+            if now is None:
+                now = time.time()
+            return self.expiry_time <= now
+
+    class Progress:
+        def __init__(self, notebook_id, cell_index, cell_count, elapsed_time, update_time):
+            """
+            Creates a Progress, which describes the latest progress report of a running notebook.
+
+            :param notebook_id: The id of the reporting notebook
+            :type notebook_id: str
+            :param cell_index: The index of the cell that is currently executed
+            :type cell_index: int or None
+            :param cell_count: The number of cells of the notebook
+            :type cell_count: int or None
+            :param elapsed_time: The seconds since the execution started inside the container
+            :type elapsed_time: float
+            :param update_time: The timestamp of the last progress report
+            :type update_time: float
+            """
+            self.notebook_id = notebook_id
+            self.cell_index = cell_index
+            self.cell_count = cell_count
+            self.elapsed_time = elapsed_time
+            self.update_time = update_time
+
+        def to_json(self):
+            return {
+                'cell_index': self.cell_index,
+                'cell_count': self.cell_count,
+                'elapsed_time': self.elapsed_time,
+                'update_time': self.update_time
+            }
+
+    class Lifecycle:
+        def __init__(self, notebook_id, *event_times):
+            """
+            Creates a Lifecycle, which describes when the lifecycle events of a notebook happened.
+
+            :param notebook_id: The id of the notebook
+            :type notebook_id: str
+            :param event_times: The timestamp of every event of LIFECYCLE_EVENTS or None, if the event is unknown
+            :type event_times: float or None
+            """
+            self.notebook_id = notebook_id
+            self.event_times = dict(zip(LIFECYCLE_EVENTS, event_times))
+
+        def get_durations(self):
+            """
+            :return: The seconds spent in every phase of LIFECYCLE_PHASES, whose start and end events are known
+            :rtype: dict[str, float]
+            """
+            durations = {}
+            for phase, start_event, end_event in LIFECYCLE_PHASES:
+                start_time = self.event_times.get(start_event)
+                end_time = self.event_times.get(end_event)
+                if start_time is not None and end_time is not None:
+                    durations[phase] = end_time - start_time
+            return durations
+
+        def to_json(self):
+            return {
+                'events': self.event_times,
+                'durations': self.get_durations()
+            }
+
+    class QueuedSubmission:
+        def __init__(self, notebook_id, user_id, submission_data, queue_time, claim_time):
+            """
+            Creates a QueuedSubmission, which describes a notebook waiting for free agency capacity.
+
+            :param notebook_id: The id of the queued notebook
+            :type notebook_id: str
+            :param user_id: The id of the submitting user
+            :type user_id: int
+            :param submission_data: The execution parameters of the notebook
+            :type submission_data: dict
+            :param queue_time: The timestamp of the submission
+            :type queue_time: float
+            :param claim_time: The timestamp, when a process started to release this submission or None
+            :type claim_time: float or None
+            """
+            self.notebook_id = notebook_id
+            self.user_id = user_id
+            self.submission_data = submission_data
+            self.queue_time = queue_time
+            self.claim_time = claim_time
 
     class NotebookStatus(enum.IntEnum):
         PROCESSING = 0
         SUCCESS = 1
         FAILURE = 2
         CANCELLED = 3
+        QUEUED = 4
 
         def __str__(self):
             return self.name.lower()
 
+        def is_final(self):
+            """
+            :return: Whether a notebook with this status does not change its status anymore
+            :rtype: bool
+            """
+            return self in (
+                DatabaseAPI.NotebookStatus.SUCCESS, DatabaseAPI.NotebookStatus.FAILURE,
+                DatabaseAPI.NotebookStatus.CANCELLED
+            )
+
         @classmethod
         def from_int(cls, value):
             for e in cls:
@@ -139,17 +297,41 @@ class DatabaseAPI:
         """
         return DatabaseAPI(get_db())
 
+    def _execute(self, sql, parameters=()):
+        """
+        Executes the given sql statement and observes its latency.
+
+        :param sql: The sql statement to execute
+        :type sql: str
+        :param parameters: The parameters of the sql statement
+        :return: The cursor of the executed statement
+        :rtype: sqlite3.Cursor
+        """
+        with metrics.time_database(sql.split(None, 1)[0].lower()):
+            return self.db.execute(sql, parameters)
+
+    def _executemany(self, sql, seq_of_parameters):
+        with metrics.time_database(sql.split(None, 1)[0].lower()):
+            return self.db.executemany(sql, seq_of_parameters)
+
+    def _commit(self):
+        with metrics.time_database('commit'):
+            self.db.commit()
+
     def create_notebook(
-            self, notebook_id, notebook_token, user_id, experiment_id, notebook_filename, execution_time,
-            status=NotebookStatus.PROCESSING, python_requirements=None
+            self, notebook_id, notebook_token, user_id, experiment_id, notebook_filename, execution_time, agency_url,
+            status=NotebookStatus.PROCESSING, python_requirements=None, execution_key=None, result_notebook_id=None,
+            submission_id=None, submission_time=None, docker_image=None, gpu_count=0
     ):
         """
         Inserts the given notebook information into the db.
 
         :param notebook_id: The notebook id
         :type notebook_id: str
-        :param notebook_token: The authentication token for the notebook
-        :type notebook_token: str
+        :param notebook_token: The authentication token for the notebook or None, if the notebook is not executed
+                               with a token yet. No request can authorize for a notebook without a token and hashing
+                               a token, that is never used, is avoided.
+        :type notebook_token: str or None
         :param user_id: The id of the user
         :type user_id: int
         :param experiment_id: The id of the experiment executing this notebook
@@ -158,22 +340,45 @@ class DatabaseAPI:
         :type notebook_filename: str
         :param execution_time: The timestamp of the notebook execution in seconds per epoch
         :type execution_time: int
+        :param agency_url: The url of the agency executing this notebook
+        :type agency_url: str
         :param status: The initial status of the notebook. Defaults to PROCESSING
         :type status: DatabaseAPI.NotebookStatus
         :param python_requirements: The python requirements for this notebook
         :type python_requirements: str or None
+        :param execution_key: The hash of the execution inputs, if the execution cache is enabled
+        :type execution_key: str or None
+        :param result_notebook_id: The id of the notebook, whose result is reused from the execution cache
+        :type result_notebook_id: str or None
+        :param submission_id: The id of the request, that submitted this notebook
+        :type submission_id: str or None
+        :param submission_time: The time the request was received. Defaults to now.
+        :type submission_time: float or None
+        :param docker_image: The docker image executing this notebook
+        :type docker_image: str or None
+        :param gpu_count: The number of gpus requested for this notebook
+        :type gpu_count: int
         """
-        self.db.execute(
+        if notebook_token is None:
+            token_hash = UNUSABLE_TOKEN_HASH.format(notebook_id)
+        else:
+            token_hash = generate_password_hash(notebook_token)
+        self._execute(
             'INSERT INTO notebook ('
             'notebook_id, notebook_token, experiment_id, status, notebook_filename, execution_time, user_id, '
-            'python_requirements'
-            ') VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            'python_requirements, agency_url, execution_key, result_notebook_id, submission_id, docker_image, gpu_count'
+            ') VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
             (
-                notebook_id, generate_password_hash(notebook_token), experiment_id, int(status), notebook_filename,
-                execution_time, user_id, python_requirements
+                notebook_id, token_hash, experiment_id, int(status), notebook_filename,
+                execution_time, user_id, python_requirements, agency_url, execution_key, result_notebook_id,
+                submission_id, docker_image, gpu_count
             )
         )
-        self.db.commit()
+        self._record_lifecycle_event(notebook_id, 'submitted', submission_time)
+        if status.is_final():
+            self._record_lifecycle_event(notebook_id, 'finished')
+        self._commit()
+        metrics.NOTEBOOK_STATUS_TRANSITIONS.labels(str(status)).inc()
 
     def update_notebook_status(self, notebook_id, status):
         """
@@ -184,15 +389,42 @@ class DatabaseAPI:
         :param status: The status to set
         :type status: DatabaseAPI.NotebookStatus
         """
-        self.db.execute(
+        self._execute(
             'UPDATE notebook SET status = (?) WHERE notebook_id is ?',
             (int(status), notebook_id)
         )
-        self.db.commit()
+        if status.is_final():
+            self._record_lifecycle_event(notebook_id, 'finished')
+        self._commit()
+        metrics.NOTEBOOK_STATUS_TRANSITIONS.labels(str(status)).inc()
+
+    def cancel_processing_notebooks(self, notebook_ids):
+        """
+        Sets the status of the given notebooks to CANCELLED in one transaction. Notebooks, that are not processing
+        anymore, keep their status.
+
+        :param notebook_ids: The ids of the notebooks, whose batches were cancelled
+        :type notebook_ids: list[str]
+        :return: The ids of the cancelled notebooks
+        :rtype: set[str]
+        """
+        cancelled = set()
+        for notebook_id in notebook_ids:
+            cur = self._execute(
+                'UPDATE notebook SET status = ? WHERE notebook_id = ? AND status = ?',
+                (int(DatabaseAPI.NotebookStatus.CANCELLED), notebook_id, int(DatabaseAPI.NotebookStatus.PROCESSING))
+            )
+            if cur.rowcount == 1:
+                self._record_lifecycle_event(notebook_id, 'finished')
+                cancelled.add(notebook_id)
+        self._commit()
+        metrics.NOTEBOOK_STATUS_TRANSITIONS.labels(str(DatabaseAPI.NotebookStatus.CANCELLED)).inc(len(cancelled))
+        return cancelled
 
     def update_notebook_debug_info(self, notebook_id, debug_info):
         """
-        Updates the debug info in the database
+        Updates the debug info in the database. The notebook holds an excerpt of the debug info, the full debug info is
+        stored compressed in the debug_info table.
 
         :param notebook_id: The notebook id to update the debug info for
         :type notebook_id: str
@@ -200,11 +432,276 @@ class DatabaseAPI:
         :type debug_info: str
         :return:
         """
-        self.db.execute(
+        self._write_debug_info(notebook_id, debug_info)
+        self._commit()
+
+    def _write_debug_info(self, notebook_id, debug_info):
+        stored_debug_info = DebugInfo.from_text(debug_info)
+        self._execute(
             'UPDATE notebook SET debug_info = (?) WHERE notebook_id is ?',
-            (debug_info, notebook_id)
+            (stored_debug_info.excerpt, notebook_id)
+        )
+        self._execute(
+            'INSERT OR REPLACE INTO debug_info (notebook_id, data, size) VALUES (?, ?, ?)',
+            (notebook_id, stored_debug_info.compressed_data, stored_debug_info.size)
+        )
+
+    def get_debug_info(self, notebook_id):
+        """
+        Returns the full debug info of the given notebook.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :return: The debug info or None, if the notebook has no debug info
+        :rtype: DebugInfo or None
+        """
+        cur = self._execute(
+            'SELECT notebook.debug_info, debug_info.data, debug_info.size '
+            'FROM debug_info JOIN notebook ON debug_info.notebook_id = notebook.notebook_id '
+            'WHERE debug_info.notebook_id = ?',
+            (notebook_id,)
         )
-        self.db.commit()
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return DebugInfo(row[0], row[1], row[2])
+
+    def get_debug_info_sizes(self, user_id):
+        """
+        Returns the sizes of the debug infos of the notebooks of the given user.
+
+        :param user_id: The id of the user
+        :type user_id: int
+        :return: A dictionary mapping notebook ids to the size of their debug info in bytes
+        :rtype: dict[str, int]
+        """
+        cur = self._execute(
+            'SELECT debug_info.notebook_id, size '
+            'FROM debug_info JOIN notebook ON debug_info.notebook_id = notebook.notebook_id '
+            'WHERE notebook.user_id is ?',
+            (user_id,)
+        )
+        return {row[0]: row[1] for row in cur}
+
+    def _record_lifecycle_event(self, notebook_id, event, event_time=None):
+        """
+        Records the time of the given lifecycle event without committing. Only the first time of every event is kept.
+        """
+        if event not in LIFECYCLE_EVENTS:
+            raise ValueError('Unknown lifecycle event "{}"'.format(event))
+        if event_time is None:
+            event_time = time.time()
+        self._execute('INSERT OR IGNORE INTO notebook_lifecycle (notebook_id) VALUES (?)', (notebook_id,))
+        # the event is one of LIFECYCLE_EVENTS, so it is safe to use it as column name
+        cur = self._execute(
+            'UPDATE notebook_lifecycle SET {0} = ? WHERE notebook_id = ? AND {0} IS NULL'.format(event),
+            (event_time, notebook_id)
+        )
+        # every notebook is counted once, when its final status is set the first time
+        if event == 'finished' and cur.rowcount == 1:
+            self._update_usage_rollup(notebook_id, event_time)
+
+    def _update_usage_rollup(self, notebook_id, finish_time):
+        """
+        Adds a finished notebook to the usage rollup of its user, docker image, day and status without committing.
+        """
+        cur = self._execute(
+            'SELECT notebook.user_id, notebook.docker_image, notebook.status, notebook.gpu_count, '
+            'notebook_lifecycle.started '
+            'FROM notebook JOIN notebook_lifecycle ON notebook.notebook_id = notebook_lifecycle.notebook_id '
+            'WHERE notebook.notebook_id = ?',
+            (notebook_id,)
+        )
+        row = cur.fetchone()
+        if row is None:
+            return
+        user_id, docker_image, status, gpu_count, start_time = row
+        rollup_key = (user_id, docker_image or '', time.strftime('%Y-%m-%d', time.gmtime(finish_time)), status)
+
+        runtime = max(finish_time - start_time, 0.0) if start_time is not None else None
+        self._execute(
+            'INSERT OR IGNORE INTO usage_rollup (user_id, docker_image, day, status) VALUES (?, ?, ?, ?)', rollup_key
+        )
+        self._execute(
+            'UPDATE usage_rollup SET notebook_count = notebook_count + 1, runtime_count = runtime_count + ?, '
+            'runtime_sum = runtime_sum + ?, gpu_seconds = gpu_seconds + ? '
+            'WHERE user_id = ? AND docker_image = ? AND day = ? AND status = ?',
+            (
+                1 if runtime is not None else 0, runtime or 0.0, (runtime or 0.0) * (gpu_count or 0)
+            ) + rollup_key
+        )
+        if runtime is not None:
+            bucket_key = rollup_key + (runtime_bucket(runtime),)
+            self._execute(
+                'INSERT OR IGNORE INTO usage_runtime_bucket (user_id, docker_image, day, status, bucket) '
+                'VALUES (?, ?, ?, ?, ?)',
+                bucket_key
+            )
+            self._execute(
+                'UPDATE usage_runtime_bucket SET notebook_count = notebook_count + 1 '
+                'WHERE user_id = ? AND docker_image = ? AND day = ? AND status = ? AND bucket = ?',
+                bucket_key
+            )
+
+    def record_lifecycle_event(self, notebook_id, event, event_time=None):
+        """
+        Records the time of the given lifecycle event of a notebook. If the event was recorded before, the first time
+        is kept, so repeated requests of the container do not move the event.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param event: One of LIFECYCLE_EVENTS
+        :type event: str
+        :param event_time: The time of the event. Defaults to now.
+        :type event_time: float or None
+        """
+        self._record_lifecycle_event(notebook_id, event, event_time)
+        self._commit()
+
+    def get_lifecycle(self, notebook_id):
+        """
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :return: The lifecycle of the given notebook or None, if no event was recorded
+        :rtype: DatabaseAPI.Lifecycle or None
+        """
+        cur = self._execute(
+            'SELECT notebook_id, {} FROM notebook_lifecycle WHERE notebook_id = ?'.format(', '.join(LIFECYCLE_EVENTS)),
+            (notebook_id,)
+        )
+        lifecycle_data = cur.fetchone()
+        if lifecycle_data is None:
+            return None
+        return DatabaseAPI.Lifecycle(*lifecycle_data)
+
+    def get_lifecycles(self, user_id):
+        """
+        Returns the lifecycles of the notebooks of the given user.
+
+        :param user_id: The id of the user
+        :type user_id: int
+        :return: A dictionary mapping notebook ids to their lifecycle
+        :rtype: dict[str, DatabaseAPI.Lifecycle]
+        """
+        cur = self._execute(
+            'SELECT notebook_lifecycle.notebook_id, {} '
+            'FROM notebook_lifecycle JOIN notebook ON notebook_lifecycle.notebook_id = notebook.notebook_id '
+            'WHERE notebook.user_id is ?'.format(', '.join(LIFECYCLE_EVENTS)),
+            (user_id,)
+        )
+        lifecycles = {}
+        for lifecycle_data in cur:
+            lifecycle = DatabaseAPI.Lifecycle(*lifecycle_data)
+            lifecycles[lifecycle.notebook_id] = lifecycle
+        return lifecycles
+
+    def get_usage_rollups(self, since_day, user_id=None):
+        """
+        Returns the usage rollups of the days since the given day.
+
+        :param since_day: The first day as YYYY-MM-DD
+        :type since_day: str
+        :param user_id: If given, only the rollups of this user are returned
+        :type user_id: int or None
+        :rtype: list[UsageRollup]
+        """
+        sql = (
+            'SELECT user_id, docker_image, day, status, notebook_count, runtime_count, runtime_sum, gpu_seconds '
+            'FROM usage_rollup WHERE day >= ?'
+        )
+        parameters = (since_day,)
+        if user_id is not None:
+            sql += ' AND user_id = ?'
+            parameters += (user_id,)
+        return [
+            UsageRollup(row[0], row[1], row[2], str(DatabaseAPI.NotebookStatus.from_int(row[3])), *row[4:])
+            for row in self._execute(sql, parameters)
+        ]
+
+    def get_runtime_buckets(self, since_day, user_id=None):
+        """
+        Returns the runtime histogram buckets of the usage rollups of the days since the given day.
+
+        :param since_day: The first day as YYYY-MM-DD
+        :type since_day: str
+        :param user_id: If given, only the buckets of this user are returned
+        :type user_id: int or None
+        :rtype: list[RuntimeBucket]
+        """
+        sql = (
+            'SELECT user_id, docker_image, day, status, bucket, notebook_count FROM usage_runtime_bucket WHERE day >= ?'
+        )
+        parameters = (since_day,)
+        if user_id is not None:
+            sql += ' AND user_id = ?'
+            parameters += (user_id,)
+        return [
+            RuntimeBucket(row[0], row[1], row[2], str(DatabaseAPI.NotebookStatus.from_int(row[3])), *row[4:])
+            for row in self._execute(sql, parameters)
+        ]
+
+    def save_upload(self, user_id, content_hash, size, retention):
+        """
+        Records, that the given user uploaded the notebook file with the given content hash. The size of the file is
+        added to the stored bytes of the user, if the user did not upload it before. Uploads, that were not repeated
+        within retention seconds, are removed and their size is subtracted from the stored bytes of their users.
+
+        :param user_id: The id of the user
+        :type user_id: int
+        :param content_hash: The sha256 hash of the uploaded file
+        :type content_hash: str
+        :param size: The size of the uploaded file in bytes
+        :type size: int
+        :param retention: The seconds an upload is kept after its last upload
+        :type retention: float
+        :return: The content hashes of the removed uploads, that no user uploaded anymore. Their files can be deleted.
+        :rtype: set[str]
+        """
+        now = time.time()
+        cur = self._execute(
+            'INSERT OR IGNORE INTO upload (user_id, content_hash, upload_time, size) VALUES (?, ?, ?, ?)',
+            (user_id, content_hash, now, size)
+        )
+        if cur.rowcount == 1:
+            self._execute('UPDATE user SET stored_bytes = stored_bytes + ? WHERE id = ?', (size, user_id))
+        else:
+            self._execute(
+                'UPDATE upload SET upload_time = ? WHERE user_id = ? AND content_hash = ?', (now, user_id, content_hash)
+            )
+
+        expired_uploads = self._execute(
+            'SELECT user_id, content_hash, size FROM upload WHERE upload_time <= ?', (now - retention,)
+        ).fetchall()
+        for expired_user_id, expired_hash, expired_size in expired_uploads:
+            self._execute('DELETE FROM upload WHERE user_id = ? AND content_hash = ?', (expired_user_id, expired_hash))
+            self._execute(
+                'UPDATE user SET stored_bytes = MAX(0, stored_bytes - ?) WHERE id = ?', (expired_size, expired_user_id)
+            )
+        unreferenced_hashes = {
+            expired_hash for _expired_user_id, expired_hash, _expired_size in expired_uploads
+            if self._execute('SELECT 1 FROM upload WHERE content_hash = ? LIMIT 1', (expired_hash,)).fetchone() is None
+        }
+        self._commit()
+        return unreferenced_hashes
+
+    def get_uploaded_hashes(self, user_id, content_hashes):
+        """
+        Returns the given content hashes, whose notebook files were uploaded by the given user.
+
+        :param user_id: The id of the user
+        :type user_id: int
+        :param content_hashes: The content hashes to check
+        :type content_hashes: list[str]
+        :rtype: set[str]
+        """
+        uploaded_hashes = set()
+        for content_hash in set(content_hashes):
+            cur = self._execute(
+                'SELECT 1 FROM upload WHERE user_id = ? AND content_hash = ?', (user_id, content_hash)
+            )
+            if cur.fetchone() is not None:
+                uploaded_hashes.add(content_hash)
+        return uploaded_hashes
 
     def get_notebook(self, notebook_id):
         """
@@ -216,9 +713,9 @@ class DatabaseAPI:
 
         :raise DatabaseError: If the given notebook_id is not unique or could not be found
         """
-        cur = self.db.execute(
+        cur = self._execute(
             'SELECT id, notebook_id, notebook_token, experiment_id, status, notebook_filename, execution_time, '
-            'debug_info, user_id, python_requirements '
+            'debug_info, user_id, python_requirements, agency_url, execution_key, result_notebook_id, submission_id '
             'FROM notebook WHERE notebook_id is ?',
             (notebook_id,)
         )
@@ -232,7 +729,10 @@ class DatabaseAPI:
         if row is None:
             raise DatabaseError('NotebookID "{}" could not be found'.format(notebook_id))
 
-        return DatabaseAPI.Notebook(row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9])
+        return DatabaseAPI.Notebook(
+            row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[9], row[10], row[11], row[12],
+            row[13]
+        )
 
     def get_notebooks(self, user_id, status=None):
         """
@@ -246,17 +746,19 @@ class DatabaseAPI:
         :rtype: list[DatabaseAPI.Notebook]
         """
         if status is None:
-            cur = self.db.execute(
+            cur = self._execute(
                 'SELECT id, notebook_id, notebook_token, experiment_id, status, notebook_filename, execution_time, '
-                'debug_info, user_id, python_requirements '
+                'debug_info, user_id, python_requirements, agency_url, execution_key, result_notebook_id, '
+                'submission_id '
                 'FROM notebook '
                 'WHERE user_id is ?',
                 (user_id,)
             )
         else:
-            cur = self.db.execute(
+            cur = self._execute(
                 'SELECT id, notebook_id, notebook_token, experiment_id, status, notebook_filename, execution_time, '
-                'debug_info, user_id, python_requirements '
+                'debug_info, user_id, python_requirements, agency_url, execution_key, result_notebook_id, '
+                'submission_id '
                 'FROM notebook '
                 'WHERE user_id is ? AND status is ?',
                 (user_id, int(status))
@@ -274,10 +776,600 @@ class DatabaseAPI:
                 execution_time=notebook_data[6],
                 debug_info=notebook_data[7],
                 user_id=notebook_data[8],
-                python_requirements=notebook_data[9]
+                python_requirements=notebook_data[9],
+                agency_url=notebook_data[10],
+                execution_key=notebook_data[11],
+                result_notebook_id=notebook_data[12],
+                submission_id=notebook_data[13]
             ))
         return notebooks
 
+    def update_notebook_progress(self, notebook_id, cell_index, cell_count, elapsed_time):
+        """
+        Saves the latest progress report of the given notebook. Older reports are replaced.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param cell_index: The index of the cell that is currently executed
+        :type cell_index: int or None
+        :param cell_count: The number of cells of the notebook
+        :type cell_count: int or None
+        :param elapsed_time: The seconds since the execution started inside the container
+        :type elapsed_time: float
+        """
+        self._execute(
+            'INSERT OR REPLACE INTO progress (notebook_id, cell_index, cell_count, elapsed_time, update_time) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (notebook_id, cell_index, cell_count, elapsed_time, time.time())
+        )
+        self._commit()
+
+    def get_notebook_progress(self, notebook_id):
+        """
+        Returns the latest progress report of the given notebook.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :return: The latest progress or None, if the notebook did not report any progress
+        :rtype: DatabaseAPI.Progress or None
+        """
+        cur = self._execute(
+            'SELECT notebook_id, cell_index, cell_count, elapsed_time, update_time FROM progress '
+            'WHERE notebook_id is ?',
+            (notebook_id,)
+        )
+        progress_data = cur.fetchone()
+        if progress_data is None:
+            return None
+
+        return DatabaseAPI.Progress(*progress_data)
+
+    def get_progresses(self, user_id, status=NotebookStatus.PROCESSING):
+        """
+        Returns the latest progress reports of the notebooks of the given user.
+
+        :param user_id: The user id of the executing user
+        :type user_id: int
+        :param status: Only progress reports of notebooks with this status are returned
+        :type status: DatabaseAPI.NotebookStatus
+        :return: A dictionary mapping notebook ids to their latest progress
+        :rtype: dict[str, DatabaseAPI.Progress]
+        """
+        cur = self._execute(
+            'SELECT progress.notebook_id, cell_index, cell_count, elapsed_time, update_time '
+            'FROM progress JOIN notebook ON progress.notebook_id = notebook.notebook_id '
+            'WHERE notebook.user_id is ? AND notebook.status is ?',
+            (user_id, int(status))
+        )
+        progresses = {}
+        for progress_data in cur:
+            progress = DatabaseAPI.Progress(*progress_data)
+            progresses[progress.notebook_id] = progress
+        return progresses
+
+    def save_execution_profile(self, notebook_id, execution_profile):
+        """
+        Saves the execution profile of the given notebook. A previously saved profile is replaced.
+
+        :param notebook_id: The id of the profiled notebook
+        :type notebook_id: str
+        :param execution_profile: The profile extracted from the result notebook
+        :type execution_profile: ExecutionProfile
+        """
+        self._execute('DELETE FROM cell_profile WHERE notebook_id is ?', (notebook_id,))
+        self._execute(
+            'INSERT OR REPLACE INTO execution_profile (notebook_id, kernel_startup_time, pip_install_time) '
+            'VALUES (?, ?, ?)',
+            (notebook_id, execution_profile.kernel_startup_time, execution_profile.pip_install_time)
+        )
+        self._executemany(
+            'INSERT OR REPLACE INTO cell_profile (notebook_id, cell_index, wall_time, cpu_time, peak_rss) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [
+                (notebook_id, c.cell_index, c.wall_time, c.cpu_time, c.peak_rss)
+                for c in execution_profile.cell_profiles
+            ]
+        )
+        self._commit()
+
+    def get_execution_profile(self, notebook_id):
+        """
+        Returns the execution profile of the given notebook.
+
+        :param notebook_id: The id of the profiled notebook
+        :type notebook_id: str
+        :return: The execution profile or None, if no profile was saved for this notebook
+        :rtype: ExecutionProfile or None
+        """
+        cur = self._execute(
+            'SELECT kernel_startup_time, pip_install_time FROM execution_profile WHERE notebook_id is ?',
+            (notebook_id,)
+        )
+        profile_data = cur.fetchone()
+        if profile_data is None:
+            return None
+
+        cur = self._execute(
+            'SELECT cell_index, wall_time, cpu_time, peak_rss FROM cell_profile WHERE notebook_id is ? '
+            'ORDER BY cell_index',
+            (notebook_id,)
+        )
+        cell_profiles = [CellProfile(*cell_data) for cell_data in cur]
+
+        return ExecutionProfile(profile_data[0], profile_data[1], cell_profiles)
+
+    def get_cell_profile_summary(self, user_id, notebook_filename):
+        """
+        Aggregates the cell profiles of all runs of the notebooks with the given filename of the given user.
+
+        :param user_id: The user id of the executing user
+        :type user_id: int
+        :param notebook_filename: The filename of the notebooks to aggregate
+        :type notebook_filename: str
+        :return: A list of per cell statistics sorted by the mean wall time in descending order
+        :rtype: list[dict]
+        """
+        cur = self._execute(
+            'SELECT cell_index, COUNT(*), AVG(wall_time), MAX(wall_time), SUM(wall_time), AVG(cpu_time), '
+            'MAX(peak_rss) '
+            'FROM cell_profile JOIN notebook ON cell_profile.notebook_id = notebook.notebook_id '
+            'WHERE notebook.user_id is ? AND notebook.notebook_filename is ? '
+            'GROUP BY cell_index ORDER BY AVG(wall_time) DESC',
+            (user_id, notebook_filename)
+        )
+        return [
+            {
+                'cell_index': row[0],
+                'runs': row[1],
+                'mean_wall_time': row[2],
+                'max_wall_time': row[3],
+                'total_wall_time': row[4],
+                'mean_cpu_time': row[5],
+                'max_peak_rss': row[6]
+            }
+            for row in cur
+        ]
+
+    def save_result_index(self, notebook_id, cell_entries):
+        """
+        Saves the byte positions of the cells and outputs of the result of the given notebook. A previously saved index
+        is replaced.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param cell_entries: The positions of the cells in the result notebook file
+        :type cell_entries: list[CellIndexEntry]
+        """
+        self._execute('DELETE FROM result_cell WHERE notebook_id = ?', (notebook_id,))
+        self._execute('DELETE FROM result_output WHERE notebook_id = ?', (notebook_id,))
+        self._executemany(
+            'INSERT INTO result_cell ('
+            'notebook_id, cell_index, cell_type, byte_offset, byte_length, source_offset, source_length'
+            ') VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    notebook_id, entry.cell_index, entry.cell_type, entry.offset, entry.length, entry.source_offset,
+                    entry.source_length
+                )
+                for entry in cell_entries
+            ]
+        )
+        self._executemany(
+            'INSERT INTO result_output ('
+            'notebook_id, cell_index, output_index, output_type, mime_types, byte_offset, byte_length'
+            ') VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    notebook_id, output.cell_index, output.output_index, output.output_type,
+                    json_codec.dumps(output.mime_types).decode('utf-8'), output.offset, output.length
+                )
+                for entry in cell_entries
+                for output in entry.outputs
+            ]
+        )
+        self._commit()
+
+    def get_result_index(self, notebook_id, start=0, stop=None):
+        """
+        Returns the byte positions of the given cells of the result of the given notebook.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param start: The index of the first returned cell
+        :type start: int
+        :param stop: The index after the last returned cell or None, to return all cells after start
+        :type stop: int or None
+        :return: The positions of the cells ordered by cell index
+        :rtype: list[CellIndexEntry]
+        """
+        if stop is None:
+            stop = -1
+        cur = self._execute(
+            'SELECT cell_index, cell_type, byte_offset, byte_length, source_offset, source_length FROM result_cell '
+            'WHERE notebook_id = ? AND cell_index >= ? AND (? < 0 OR cell_index < ?) ORDER BY cell_index',
+            (notebook_id, start, stop, stop)
+        )
+        cell_entries = collections.OrderedDict()
+        for row in cur:
+            cell_entries[row[0]] = CellIndexEntry(row[0], row[1], row[2], row[3], row[4], row[5], [])
+
+        cur = self._execute(
+            'SELECT cell_index, output_index, output_type, mime_types, byte_offset, byte_length FROM result_output '
+            'WHERE notebook_id = ? AND cell_index >= ? AND (? < 0 OR cell_index < ?) ORDER BY cell_index, output_index',
+            (notebook_id, start, stop, stop)
+        )
+        for row in cur:
+            cell_entry = cell_entries.get(row[0])
+            if cell_entry is not None:
+                cell_entry.outputs.append(
+                    OutputIndexEntry(row[0], row[1], row[2], json_codec.loads(row[3]), row[4], row[5])
+                )
+        return list(cell_entries.values())
+
+    def has_result_index(self, notebook_id):
+        """
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :return: Whether an index of the result of the given notebook is saved
+        :rtype: bool
+        """
+        cur = self._execute('SELECT 1 FROM result_cell WHERE notebook_id = ? LIMIT 1', (notebook_id,))
+        return cur.fetchone() is not None
+
+    def save_result_summary(self, notebook_id, result_summary):
+        """
+        Saves the summary of the result of the given notebook. A previously saved summary is replaced.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param result_summary: The summary extracted from the result notebook
+        :type result_summary: ResultSummary
+        """
+        self._execute(
+            'INSERT OR REPLACE INTO result_summary ('
+            'notebook_id, cell_count, error_cell_count, first_error_cell_index, first_error, duration, output_bytes, '
+            'image_count, kernel_died'
+            ') VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                notebook_id, result_summary.cell_count, result_summary.error_cell_count,
+                result_summary.first_error_cell_index, result_summary.first_error, result_summary.duration,
+                result_summary.output_bytes, result_summary.image_count, int(result_summary.kernel_died)
+            )
+        )
+        self._commit()
+
+    def get_result_summaries(self, user_id):
+        """
+        Returns the result summaries of the notebooks of the given user.
+
+        :param user_id: The id of the user
+        :type user_id: int
+        :return: A dictionary mapping notebook ids to their result summary
+        :rtype: dict[str, ResultSummary]
+        """
+        cur = self._execute(
+            'SELECT notebook.notebook_id, cell_count, error_cell_count, first_error_cell_index, first_error, '
+            'duration, output_bytes, image_count, kernel_died '
+            'FROM result_summary JOIN notebook '
+            'ON result_summary.notebook_id = COALESCE(notebook.result_notebook_id, notebook.notebook_id) '
+            'WHERE notebook.user_id is ?',
+            (user_id,)
+        )
+        return {
+            row[0]: ResultSummary(row[1], row[2], row[3], row[4], row[5], row[6], row[7], bool(row[8]))
+            for row in cur
+        }
+
+    def get_cached_result(self, user_id, execution_key, ttl):
+        """
+        Returns the notebook, whose result can be reused for the given execution key, and marks the cache entry as
+        recently used.
+
+        :param user_id: The id of the submitting user
+        :type user_id: int
+        :param execution_key: The hash of the execution inputs
+        :type execution_key: str
+        :param ttl: The seconds a cached result can be reused
+        :type ttl: float
+        :return: The id of the notebook holding the result or None, if no result is cached
+        :rtype: str or None
+        """
+        now = time.time()
+        cur = self._execute(
+            'SELECT notebook_id FROM execution_cache WHERE user_id = ? AND execution_key = ? AND creation_time > ?',
+            (user_id, execution_key, now - ttl)
+        )
+        row = cur.fetchone()
+        if row is None:
+            return None
+        self._execute(
+            'UPDATE execution_cache SET access_time = ? WHERE user_id = ? AND execution_key = ?',
+            (now, user_id, execution_key)
+        )
+        self._commit()
+        return row[0]
+
+    def save_cached_result(self, user_id, execution_key, notebook_id, ttl, max_size):
+        """
+        Caches the result of the given notebook for the given execution key. Expired entries are removed and the least
+        recently used entries are evicted, if more than max_size entries are cached.
+
+        :param user_id: The id of the user, that executed the notebook
+        :type user_id: int
+        :param execution_key: The hash of the execution inputs
+        :type execution_key: str
+        :param notebook_id: The id of the notebook holding the result
+        :type notebook_id: str
+        :param ttl: The seconds a cached result can be reused
+        :type ttl: float
+        :param max_size: The maximal number of cached results
+        :type max_size: int
+        """
+        now = time.time()
+        self._execute(
+            'INSERT OR REPLACE INTO execution_cache (user_id, execution_key, notebook_id, creation_time, access_time) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (user_id, execution_key, notebook_id, now, now)
+        )
+        self._execute('DELETE FROM execution_cache WHERE creation_time <= ?', (now - ttl,))
+        self._execute(
+            'DELETE FROM execution_cache WHERE rowid IN ('
+            'SELECT rowid FROM execution_cache ORDER BY access_time DESC LIMIT -1 OFFSET ?'
+            ')',
+            (max_size,)
+        )
+        self._commit()
+
+    def queue_notebook(self, notebook_id, user_id, submission_data):
+        """
+        Adds the given notebook to the admission queue. The notebook has to be created with status QUEUED.
+
+        :param notebook_id: The id of the queued notebook
+        :type notebook_id: str
+        :param user_id: The id of the submitting user
+        :type user_id: int
+        :param submission_data: The execution parameters of the notebook. Has to be json serializable.
+        :type submission_data: dict
+        """
+        self._execute(
+            'INSERT INTO queued_submission (notebook_id, user_id, submission_data, queue_time) VALUES (?, ?, ?, ?)',
+            (notebook_id, user_id, json_codec.dumps(submission_data).decode('utf-8'), time.time())
+        )
+        self._commit()
+
+    def get_queued_submissions(self, claim_timeout):
+        """
+        Returns the queued submissions in submission order. Submissions claimed by a process are skipped, unless the
+        claim is older than claim_timeout seconds.
+
+        :param claim_timeout: The seconds after which a claim is considered abandoned
+        :type claim_timeout: float
+        :rtype: list[DatabaseAPI.QueuedSubmission]
+        """
+        cur = self._execute(
+            'SELECT notebook_id, user_id, submission_data, queue_time, claim_time FROM queued_submission '
+            'WHERE claim_time IS NULL OR claim_time < ? ORDER BY queue_time',
+            (time.time() - claim_timeout,)
+        )
+        return [
+            DatabaseAPI.QueuedSubmission(row[0], row[1], json_codec.loads(row[2]), row[3], row[4])
+            for row in cur
+        ]
+
+    def claim_queued_submission(self, notebook_id, claim_timeout):
+        """
+        Claims the given submission for this process, so no other process releases it concurrently.
+
+        :param notebook_id: The id of the queued notebook
+        :type notebook_id: str
+        :param claim_timeout: The seconds after which a claim of another process is considered abandoned
+        :type claim_timeout: float
+        :return: Whether the submission was claimed
+        :rtype: bool
+        """
+        now = time.time()
+        cur = self._execute(
+            'UPDATE queued_submission SET claim_time = ? '
+            'WHERE notebook_id = ? AND (claim_time IS NULL OR claim_time < ?)',
+            (now, notebook_id, now - claim_timeout)
+        )
+        self._commit()
+        return cur.rowcount == 1
+
+    def unclaim_queued_submission(self, notebook_id):
+        """
+        Returns a claimed submission to the queue.
+
+        :param notebook_id: The id of the queued notebook
+        :type notebook_id: str
+        """
+        self._execute('UPDATE queued_submission SET claim_time = NULL WHERE notebook_id = ?', (notebook_id,))
+        self._commit()
+
+    def set_notebook_token(self, notebook_id, notebook_token):
+        """
+        Replaces the token of the given notebook.
+
+        :param notebook_id: The id of the notebook
+        :type notebook_id: str
+        :param notebook_token: The new token of the notebook
+        :type notebook_token: str
+        """
+        self._execute(
+            'UPDATE notebook SET notebook_token = ? WHERE notebook_id = ?',
+            (generate_password_hash(notebook_token), notebook_id)
+        )
+        self._commit()
+
+    def release_notebook(self, notebook_id, experiment_id, agency_url):
+        """
+        Marks a queued notebook as submitted to the given agency and removes it from the queue.
+
+        :param notebook_id: The id of the queued notebook
+        :type notebook_id: str
+        :param experiment_id: The id of the experiment executing this notebook
+        :type experiment_id: str
+        :param agency_url: The url of the agency executing this notebook
+        :type agency_url: str
+        """
+        self._execute(
+            'UPDATE notebook SET experiment_id = ?, agency_url = ?, status = ? WHERE notebook_id = ?',
+            (experiment_id, agency_url, int(DatabaseAPI.NotebookStatus.PROCESSING), notebook_id)
+        )
+        self._execute('DELETE FROM queued_submission WHERE notebook_id = ?', (notebook_id,))
+        self._record_lifecycle_event(notebook_id, 'accepted')
+        self._commit()
+        metrics.NOTEBOOK_STATUS_TRANSITIONS.labels(str(DatabaseAPI.NotebookStatus.PROCESSING)).inc()
+
+    def dequeue_notebook(self, notebook_id, status, debug_info=None, only_unclaimed=False):
+        """
+        Removes a notebook from the queue without submitting it and sets its final status.
+
+        :param notebook_id: The id of the queued notebook
+        :type notebook_id: str
+        :param status: The status to set
+        :type status: DatabaseAPI.NotebookStatus
+        :param debug_info: The debug info to save or None
+        :type debug_info: str or None
+        :param only_unclaimed: If True, the notebook is only removed, if no process is releasing it
+        :type only_unclaimed: bool
+        :return: Whether the notebook was removed from the queue
+        :rtype: bool
+        """
+        if only_unclaimed:
+            cur = self._execute(
+                'DELETE FROM queued_submission WHERE notebook_id = ? AND claim_time IS NULL', (notebook_id,)
+            )
+        else:
+            cur = self._execute('DELETE FROM queued_submission WHERE notebook_id = ?', (notebook_id,))
+        if cur.rowcount != 1:
+            self._commit()
+            return False
+        self._execute('UPDATE notebook SET status = ? WHERE notebook_id = ?', (int(status), notebook_id))
+        self._record_lifecycle_event(notebook_id, 'finished')
+        if debug_info is not None:
+            self._write_debug_info(notebook_id, debug_info)
+        self._commit()
+        metrics.NOTEBOOK_STATUS_TRANSITIONS.labels(str(status)).inc()
+        return True
+
+    def dequeue_notebooks(self, notebook_ids, status):
+        """
+        Removes the given notebooks from the queue in one transaction and sets their final status. Notebooks, that are
+        claimed by a process releasing them, stay in the queue.
+
+        :param notebook_ids: The ids of the queued notebooks
+        :type notebook_ids: list[str]
+        :param status: The status to set
+        :type status: DatabaseAPI.NotebookStatus
+        :return: The ids of the notebooks, that were removed from the queue
+        :rtype: set[str]
+        """
+        dequeued = set()
+        for notebook_id in notebook_ids:
+            cur = self._execute(
+                'DELETE FROM queued_submission WHERE notebook_id = ? AND claim_time IS NULL', (notebook_id,)
+            )
+            if cur.rowcount == 1:
+                self._execute('UPDATE notebook SET status = ? WHERE notebook_id = ?', (int(status), notebook_id))
+                self._record_lifecycle_event(notebook_id, 'finished')
+                dequeued.add(notebook_id)
+        self._commit()
+        metrics.NOTEBOOK_STATUS_TRANSITIONS.labels(str(status)).inc(len(dequeued))
+        return dequeued
+
+    def count_notebooks_by_user(self, status):
+        """
+        Counts the notebooks with the given status for every user.
+
+        :param status: The status of the counted notebooks
+        :type status: DatabaseAPI.NotebookStatus
+        :return: A dictionary mapping user ids to the number of notebooks with the given status
+        :rtype: dict[int, int]
+        """
+        cur = self._execute(
+            'SELECT user_id, COUNT(*) FROM notebook WHERE status = ? GROUP BY user_id', (int(status),)
+        )
+        return {row[0]: row[1] for row in cur}
+
+    def add_stored_bytes(self, notebook_id, size):
+        """
+        Adds the size of a saved notebook file to the stored bytes of the owner of the given notebook.
+
+        :param notebook_id: The id of the saved notebook
+        :type notebook_id: str
+        :param size: The size of the saved notebook file in bytes
+        :type size: int
+        """
+        self._execute(
+            'UPDATE user SET stored_bytes = stored_bytes + ? '
+            'WHERE id = (SELECT user_id FROM notebook WHERE notebook_id = ?)',
+            (size, notebook_id)
+        )
+        self._commit()
+
+    def get_stored_bytes(self, user_id):
+        """
+        :param user_id: The id of the user
+        :type user_id: int
+        :return: The size of all notebook files of the given user in bytes
+        :rtype: int
+        """
+        row = self._execute('SELECT stored_bytes FROM user WHERE id = ?', (user_id,)).fetchone()
+        if row is None:
+            return 0
+        return row[0]
+
+    def count_active_notebooks(self, user_id):
+        """
+        :param user_id: The id of the user
+        :type user_id: int
+        :return: The number of processing and queued notebooks of the given user
+        :rtype: int
+        """
+        return self._execute(
+            'SELECT COUNT(*) FROM notebook WHERE user_id = ? AND status IN (?, ?)',
+            (user_id, int(DatabaseAPI.NotebookStatus.PROCESSING), int(DatabaseAPI.NotebookStatus.QUEUED))
+        ).fetchone()[0]
+
+    def take_submission_tokens(self, user_id, count, rate, capacity):
+        """
+        Takes tokens from the submission token bucket of the given user. The bucket is refilled with rate tokens per
+        second up to capacity tokens. Refilling and taking happen in one statement, so concurrent service processes
+        share the bucket without locking.
+
+        :param user_id: The id of the user
+        :type user_id: int
+        :param count: The number of tokens to take
+        :type count: int
+        :param rate: The tokens added per second
+        :type rate: float
+        :param capacity: The maximal number of tokens in the bucket
+        :type capacity: float
+        :return: 0, if the tokens were taken, otherwise the seconds until enough tokens are available
+        :rtype: float
+        """
+        if count > capacity:
+            raise ValueError('Cannot take {} tokens from a bucket with capacity {}'.format(count, capacity))
+
+        now = time.time()
+        cur = self._execute(
+            'INSERT INTO submission_bucket (user_id, tokens, update_time) VALUES (?, ?, ?) '
+            'ON CONFLICT (user_id) DO UPDATE SET '
+            'tokens = MIN(?, tokens + (? - update_time) * ?) - ?, update_time = ? '
+            'WHERE MIN(?, tokens + (? - update_time) * ?) >= ?',
+            (user_id, capacity - count, now, capacity, now, rate, count, now, capacity, now, rate, count)
+        )
+        self._commit()
+        if cur.rowcount == 1:
+            return 0
+
+        row = self._execute(
+            'SELECT tokens, update_time FROM submission_bucket WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        available = min(capacity, row[0] + (now - row[1]) * rate)
+        return max(0.0, (count - available) / rate)
+
     def create_user(self, agency_username, agency_url):
         """
         Creates a new user.
@@ -289,11 +1381,10 @@ class DatabaseAPI:
         :return: The id of the created user
         :rtype: int
         """
-        cur = self.db.cursor()
-        cur.execute(
+        cur = self._execute(
             'INSERT INTO user (agency_username, agency_url) VALUES (?, ?)', (agency_username, agency_url)
         )
-        self.db.commit()
+        self._commit()
         return cur.lastrowid
 
     def get_user(self, user_id=None, agency_username_url=None):
@@ -311,12 +1402,12 @@ class DatabaseAPI:
         :raise ValueError: If user_id and agency_username is None
         """
         if user_id is not None:
-            cur = self.db.execute(
+            cur = self._execute(
                 'SELECT id, agency_username, agency_url FROM user WHERE id is ?',
                 (user_id,)
             )
         elif agency_username_url is not None:
-            cur = self.db.execute(
+            cur = self._execute(
                 'SELECT id, agency_username, agency_url FROM user WHERE agency_username is ? AND agency_url is ?',
                 (agency_username_url[0], agency_username_url[1])
             )
@@ -328,63 +1419,54 @@ class DatabaseAPI:
 
         return DatabaseAPI.User(user_data[0], user_data[1], user_data[2])
 
-    def create_cookie(self, cookie_text, user_id):
+    def set_current_cookie(self, cookie_text, user_id, agency_url, expiry_time=None):
         """
-        Creates a new cookie.
+        Sets the current cookie of the given user for the given agency. The previous cookie of the user for this agency
+        is deleted.
 
         :param cookie_text: The text of the cookie
         :type cookie_text: str
         :param user_id: The id of the user
         :type user_id: int
+        :param agency_url: The url of the agency, that issued the cookie
+        :type agency_url: str
+        :param expiry_time: The expiry time of the cookie as timestamp or None, if the cookie does not expire
+        :type expiry_time: float or None
 
         :return: The id of the created cookie
         :rtype: int
         """
-        cur = self.db.cursor()
-        cur.execute(
-            'INSERT INTO cookie (cookie_text, creation_time, user_id) VALUES (?, ?, ?)',
-            (cookie_text, time.time(), user_id)
+        cur = self._execute(
+            'INSERT OR REPLACE INTO cookie (cookie_text, creation_time, expiry_time, user_id, agency_url) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (cookie_text, time.time(), expiry_time, user_id, agency_url)
         )
-        self.db.commit()
+        self._commit()
         return cur.lastrowid
 
-    def get_cookies(self, user_id):
+    def get_current_cookies(self, user_id):
         """
-        Gets the cookies of the given user.
+        Gets the current cookies of the given user id for every agency
 
         :param user_id: The user id
         :type user_id: int
-        :return: The list of cookies of the given user
-        :rtype: list[DatabaseAPI.Cookie]
+        :return: A dictionary mapping agency urls to the current cookie of the user for this agency. Expired cookies are
+                 not included.
+        :rtype: dict[str, DatabaseAPI.Cookie]
         """
-        cur = self.db.execute(
-            'SELECT id, cookie_text, creation_time, user_id FROM cookie WHERE user_id is ?',
+        cur = self._execute(
+            'SELECT id, cookie_text, creation_time, expiry_time, user_id, agency_url FROM cookie WHERE user_id = ?',
             (user_id,)
         )
-        cookies = []
-        for cookie in cur:
-            cookies.append(DatabaseAPI.Cookie(cookie[0], cookie[1], cookie[2], cookie[3]))
-        return cookies
-
-    def get_newest_cookie(self, user_id):
-        """
-        Gets the newest cookie of the given user id
 
-        :param user_id: The user id
-        :type user_id: int
-        :return: The cookie with the highest creation time
-        :rtype: DatabaseAPI.Cookie or None
-        """
-        cur = self.db.execute(
-            'SELECT id, cookie_text, creation_time, user_id FROM cookie WHERE user_id is ? ORDER BY creation_time DESC',
-            (user_id,)
-        )
-
-        cookie_data = cur.fetchone()
-        if cookie_data is None:
-            return None
-
-        return DatabaseAPI.Cookie(cookie_data[0], cookie_data[1], cookie_data[2], cookie_data[3])
+        cookies = {}
+        for cookie_data in cur:
+            cookie = DatabaseAPI.Cookie(
+                cookie_data[0], cookie_data[1], cookie_data[2], cookie_data[3], cookie_data[4], cookie_data[5]
+            )
+            if not cookie.is_expired():
+                cookies[cookie.agency_url] = cookie
+        return cookies
 
 
 def get_db():
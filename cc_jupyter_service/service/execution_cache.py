@@ -0,0 +1,130 @@
+import hashlib
+
+from cc_jupyter_service.common import json_codec
+
+# cell metadata keys, that change the execution of a cell. Papermill injects parameters after the cell tagged with
+# "parameters".
+EXECUTION_CELL_METADATA_KEYS = ('tags',)
+# notebook metadata keys, that change the execution of a notebook
+EXECUTION_NOTEBOOK_METADATA_KEYS = ('kernelspec',)
+
+
+def _canonical_source(source):
+    if isinstance(source, list):
+        return ''.join(line for line in source if isinstance(line, str))
+    return source
+
+
+def _select_keys(data, keys):
+    if not isinstance(data, dict):
+        return {}
+    return {key: data[key] for key in keys if key in data}
+
+
+def canonical_notebook(notebook_data):
+    """
+    Returns the parts of the given notebook, that influence its execution. Outputs, execution counts, cell ids and
+    volatile metadata are removed and the cell sources are joined to strings.
+
+    :param notebook_data: The notebook
+    :type notebook_data: dict
+    :rtype: dict
+    """
+    cells = notebook_data.get('cells') if isinstance(notebook_data, dict) else None
+    if not isinstance(cells, list):
+        return notebook_data
+
+    return {
+        'cells': [
+            {
+                'cell_type': cell.get('cell_type'),
+                'source': _canonical_source(cell.get('source')),
+                'metadata': _select_keys(cell.get('metadata'), EXECUTION_CELL_METADATA_KEYS)
+            } if isinstance(cell, dict) else cell
+            for cell in cells
+        ],
+        'metadata': _select_keys(notebook_data.get('metadata'), EXECUTION_NOTEBOOK_METADATA_KEYS)
+    }
+
+
+def execution_key(notebook_data, docker_image, gpu_requirements, external_data, python_requirements):
+    """
+    Computes a hash over all inputs of a notebook execution. Two submissions with the same key produce the same result,
+    if the notebook is deterministic.
+
+    :param notebook_data: The notebook to execute
+    :type notebook_data: dict
+    :param docker_image: The docker image to use
+    :type docker_image: str
+    :param gpu_requirements: The red gpu requirements or None
+    :type gpu_requirements: dict or None
+    :param external_data: The external data definitions of the request
+    :type external_data: list[dict]
+    :param python_requirements: A dictionary with the keys 'data' and 'filename' or None
+    :type python_requirements: dict or None
+    :return: The hex encoded sha256 hash of the execution inputs
+    :rtype: str
+    """
+    execution_inputs = {
+        'notebook': canonical_notebook(notebook_data),
+        'dockerImage': docker_image,
+        'gpuRequirements': gpu_requirements,
+        'externalData': external_data,
+        'pythonRequirements': python_requirements['data'] if python_requirements is not None else None
+    }
+    return hashlib.sha256(json_codec.dumps(execution_inputs, sort_keys=True)).hexdigest()
+
+
+class ExecutionCache:
+    def __init__(self, ttl, max_size):
+        """
+        Remembers the successful results of every user by the execution key of the notebook, so identical submissions
+        reuse the result instead of executing the notebook again. The entries are stored in the execution_cache table,
+        so they are shared by all service processes.
+
+        :param ttl: The seconds a result can be reused
+        :type ttl: float
+        :param max_size: The maximal number of cached results. The least recently used results are evicted first.
+        :type max_size: int
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+
+    @staticmethod
+    def from_conf(conf):
+        """
+        :type conf: Conf
+        :return: The execution cache or None, if the cache is disabled
+        :rtype: ExecutionCache or None
+        """
+        if not conf.execution_cache:
+            return None
+        return ExecutionCache(conf.execution_cache_ttl, conf.execution_cache_size)
+
+    def lookup(self, database_api, user_id, key):
+        """
+        :param database_api: The database to use
+        :type database_api: DatabaseAPI
+        :param user_id: The id of the submitting user
+        :type user_id: int
+        :param key: The execution key of the submitted notebook
+        :type key: str
+        :return: The id of the notebook, whose result can be reused or None
+        :rtype: str or None
+        """
+        return database_api.get_cached_result(user_id, key, self.ttl)
+
+    def store(self, database_api, user_id, key, notebook_id):
+        """
+        Caches the result of the given notebook and evicts expired and least recently used results.
+
+        :param database_api: The database to use
+        :type database_api: DatabaseAPI
+        :param user_id: The id of the user, that executed the notebook
+        :type user_id: int
+        :param key: The execution key of the notebook
+        :type key: str
+        :param notebook_id: The id of the executed notebook
+        :type notebook_id: str
+        """
+        database_api.save_cached_result(user_id, key, notebook_id, self.ttl, self.max_size)
@@ -0,0 +1,141 @@
+import math
+
+from werkzeug.exceptions import TooManyRequests
+
+# the seconds a user should wait, if too many notebooks are active
+ACTIVE_NOTEBOOKS_RETRY_AFTER = 30
+
+
+class QuotaExceeded(TooManyRequests):
+    def __init__(self, description, retry_after=None):
+        """
+        Is raised, if a user exceeds a submission quota. Creates a response with status code 429 and a Retry-After
+        header.
+
+        :param description: The description of the exceeded quota
+        :type description: str
+        :param retry_after: The seconds until the request could succeed or None, if this is unknown
+        :type retry_after: float or None
+        """
+        super().__init__(description)
+        self.retry_after_seconds = retry_after
+
+    def get_headers(self, *args, **kwargs):
+        headers = [header for header in super().get_headers(*args, **kwargs) if header[0] != 'Retry-After']
+        if self.retry_after_seconds is not None:
+            headers.append(('Retry-After', str(max(1, int(math.ceil(self.retry_after_seconds))))))
+        return headers
+
+
+class SubmissionQuota:
+    def __init__(
+            self, max_notebooks_per_request, max_submissions_per_minute, submission_burst, max_active_notebooks,
+            max_stored_bytes
+    ):
+        """
+        Limits the notebook submissions of every user. Every limit can be None, to disable it.
+
+        :param max_notebooks_per_request: The maximal number of notebooks in one request
+        :type max_notebooks_per_request: int or None
+        :param max_submissions_per_minute: The number of notebooks a user can submit per minute on average
+        :type max_submissions_per_minute: float or None
+        :param submission_burst: The number of notebooks a user can submit at once. Defaults to
+                                 max_submissions_per_minute.
+        :type submission_burst: int or None
+        :param max_active_notebooks: The maximal number of processing and queued notebooks of a user
+        :type max_active_notebooks: int or None
+        :param max_stored_bytes: The maximal size of all notebook files and uploads of a user. If it is reached, no
+                                 further notebooks can be submitted or uploaded.
+        :type max_stored_bytes: int or None
+        """
+        self.max_notebooks_per_request = max_notebooks_per_request
+        self.max_submissions_per_minute = max_submissions_per_minute
+        self.submission_burst = submission_burst
+        if submission_burst is None and max_submissions_per_minute is not None:
+            self.submission_burst = max(1, int(max_submissions_per_minute))
+        self.max_active_notebooks = max_active_notebooks
+        self.max_stored_bytes = max_stored_bytes
+
+    @staticmethod
+    def from_conf(conf):
+        """
+        :type conf: Conf
+        :rtype: SubmissionQuota
+        """
+        return SubmissionQuota(
+            conf.max_notebooks_per_request, conf.max_submissions_per_minute, conf.submission_burst,
+            conf.max_active_notebooks_per_user, conf.max_stored_bytes_per_user
+        )
+
+    def check(self, database_api, user_id, notebook_count):
+        """
+        Checks whether the given user can submit notebook_count notebooks. The cheap checks are done first. If all
+        checks pass, the submissions are taken from the token bucket of the user.
+
+        :param database_api: The database to use
+        :type database_api: DatabaseAPI
+        :param user_id: The id of the submitting user
+        :type user_id: int
+        :param notebook_count: The number of submitted notebooks
+        :type notebook_count: int
+
+        :raise QuotaExceeded: If a quota is exceeded
+        """
+        if self.max_notebooks_per_request is not None and notebook_count > self.max_notebooks_per_request:
+            raise QuotaExceeded(
+                'Too many notebooks in one request. At most {} notebooks can be submitted at once.'.format(
+                    self.max_notebooks_per_request
+                )
+            )
+
+        if self.submission_burst is not None and notebook_count > self.submission_burst:
+            raise QuotaExceeded(
+                'Too many notebooks in one request. At most {} notebooks can be submitted at once.'.format(
+                    self.submission_burst
+                )
+            )
+
+        if self.max_active_notebooks is not None:
+            active_notebooks = database_api.count_active_notebooks(user_id)
+            if active_notebooks + notebook_count > self.max_active_notebooks:
+                raise QuotaExceeded(
+                    'Too many active notebooks. {} of at most {} notebooks are processing or queued.'.format(
+                        active_notebooks, self.max_active_notebooks
+                    ),
+                    retry_after=ACTIVE_NOTEBOOKS_RETRY_AFTER
+                )
+
+        self.check_stored_bytes(database_api, user_id)
+
+        if self.max_submissions_per_minute is not None:
+            wait_time = database_api.take_submission_tokens(
+                user_id, notebook_count, self.max_submissions_per_minute / 60.0, self.submission_burst
+            )
+            if wait_time > 0:
+                raise QuotaExceeded(
+                    'Too many submissions. At most {} notebooks can be submitted per minute.'.format(
+                        self.max_submissions_per_minute
+                    ),
+                    retry_after=wait_time
+                )
+
+    def check_stored_bytes(self, database_api, user_id):
+        """
+        Checks whether the notebook files and uploads of the given user are smaller than the storage quota.
+
+        :param database_api: The database to use
+        :type database_api: DatabaseAPI
+        :param user_id: The id of the user
+        :type user_id: int
+
+        :raise QuotaExceeded: If the storage quota is exceeded
+        """
+        if self.max_stored_bytes is None:
+            return
+        stored_bytes = database_api.get_stored_bytes(user_id)
+        if stored_bytes >= self.max_stored_bytes:
+            raise QuotaExceeded(
+                'Storage quota exceeded. The notebooks of this user use {} of at most {} bytes.'.format(
+                    stored_bytes, self.max_stored_bytes
+                )
+            )
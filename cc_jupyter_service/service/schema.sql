@@ -3,31 +3,224 @@ DROP TABLE IF EXISTS post;
 DROP TABLE IF EXISTS notebook;
 DROP TABLE IF EXISTS experiment;
 DROP TABLE IF EXISTS cookie;
+DROP TABLE IF EXISTS progress;
+DROP TABLE IF EXISTS execution_profile;
+DROP TABLE IF EXISTS cell_profile;
+DROP TABLE IF EXISTS queued_submission;
+DROP TABLE IF EXISTS submission_bucket;
+DROP TABLE IF EXISTS result_cell;
+DROP TABLE IF EXISTS result_output;
+DROP TABLE IF EXISTS result_summary;
+DROP TABLE IF EXISTS execution_cache;
+DROP TABLE IF EXISTS debug_info;
+DROP TABLE IF EXISTS upload;
+DROP TABLE IF EXISTS notebook_lifecycle;
+DROP TABLE IF EXISTS usage_rollup;
+DROP TABLE IF EXISTS usage_runtime_bucket;
 
 CREATE TABLE user (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   agency_username TEXT NOT NULL,
-  agency_url TEXT NOT NULL
+  agency_url TEXT NOT NULL,
+  stored_bytes INTEGER NOT NULL DEFAULT 0  -- the size of all notebook files of this user
 );
 
 CREATE TABLE notebook (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   notebook_id TEXT UNIQUE NOT NULL,
   notebook_token TEXT UNIQUE NOT NULL,
-  experiment_id TEXT NOT NULL,
-  status INTEGER NOT NULL,  -- 0: processing   1: succeeded   2: failed
+  experiment_id TEXT,  -- NULL, while the notebook is queued
+  status INTEGER NOT NULL,  -- 0: processing   1: succeeded   2: failed   3: cancelled   4: queued
   notebook_filename TEXT NOT NULL,
   execution_time INTEGER NOT NULL,
-  debug_info TEXT,
+  debug_info TEXT,  -- the end of the debug info, the full text is stored in the debug_info table
   user_id INTEGER,
   python_requirements TEXT,
+  agency_url TEXT NOT NULL,  -- the agency executing this notebook
+  execution_key TEXT,  -- the hash of the execution inputs, if the execution cache is enabled
+  result_notebook_id TEXT,  -- the notebook, whose result is reused from the execution cache
+  submission_id TEXT,  -- shared by the notebooks submitted in one request
+  docker_image TEXT,
+  gpu_count INTEGER NOT NULL DEFAULT 0,
   FOREIGN KEY (user_id) REFERENCES user (id)
 );
 
+CREATE INDEX notebook_user_id_status ON notebook (user_id, status);
+CREATE INDEX notebook_submission_id ON notebook (submission_id);
+
+-- holds only the current cookie of every user per agency, superseded cookies are replaced
 CREATE TABLE cookie (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   cookie_text TEXT NOT NULL,
   creation_time REAL NOT NULL,
-  user_id INTEGER,
+  expiry_time REAL,  -- NULL, if the agency did not set an expiry
+  user_id INTEGER NOT NULL,
+  agency_url TEXT NOT NULL,
+  UNIQUE (user_id, agency_url),
+  FOREIGN KEY (user_id) REFERENCES user (id)
+);
+
+CREATE TABLE progress (
+  notebook_id TEXT PRIMARY KEY,
+  cell_index INTEGER,
+  cell_count INTEGER,
+  elapsed_time REAL NOT NULL,
+  update_time REAL NOT NULL,
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id)
+);
+
+CREATE TABLE execution_profile (
+  notebook_id TEXT PRIMARY KEY,
+  kernel_startup_time REAL,
+  pip_install_time REAL,
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id)
+);
+
+CREATE TABLE cell_profile (
+  notebook_id TEXT NOT NULL,
+  cell_index INTEGER NOT NULL,
+  wall_time REAL NOT NULL,
+  cpu_time REAL,
+  peak_rss INTEGER,
+  PRIMARY KEY (notebook_id, cell_index),
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id)
+);
+
+-- submissions held back by the admission controller until the agency has free capacity
+CREATE TABLE queued_submission (
+  notebook_id TEXT PRIMARY KEY,
+  user_id INTEGER NOT NULL,
+  submission_data TEXT NOT NULL,  -- json with the execution parameters of the notebook
+  queue_time REAL NOT NULL,
+  claim_time REAL,  -- set while a process releases the submission
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id),
   FOREIGN KEY (user_id) REFERENCES user (id)
 );
+
+CREATE INDEX queued_submission_queue_time ON queued_submission (queue_time);
+
+-- token buckets limiting the submissions of every user, shared by all service processes
+CREATE TABLE submission_bucket (
+  user_id INTEGER PRIMARY KEY,
+  tokens REAL NOT NULL,
+  update_time REAL NOT NULL,
+  FOREIGN KEY (user_id) REFERENCES user (id)
+);
+
+-- byte positions of the cells and outputs in the result notebook files
+CREATE TABLE result_cell (
+  notebook_id TEXT NOT NULL,
+  cell_index INTEGER NOT NULL,
+  cell_type TEXT,
+  byte_offset INTEGER NOT NULL,
+  byte_length INTEGER NOT NULL,
+  source_offset INTEGER,
+  source_length INTEGER,
+  PRIMARY KEY (notebook_id, cell_index),
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id)
+);
+
+CREATE TABLE result_output (
+  notebook_id TEXT NOT NULL,
+  cell_index INTEGER NOT NULL,
+  output_index INTEGER NOT NULL,
+  output_type TEXT,
+  mime_types TEXT NOT NULL,  -- json list
+  byte_offset INTEGER NOT NULL,
+  byte_length INTEGER NOT NULL,
+  PRIMARY KEY (notebook_id, cell_index, output_index),
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id)
+);
+
+-- extracted once from every result notebook, so the result list does not read notebook files
+CREATE TABLE result_summary (
+  notebook_id TEXT PRIMARY KEY,
+  cell_count INTEGER NOT NULL,
+  error_cell_count INTEGER NOT NULL,
+  first_error_cell_index INTEGER,
+  first_error TEXT,
+  duration REAL,  -- NULL, if papermill reported no duration
+  output_bytes INTEGER NOT NULL,
+  image_count INTEGER NOT NULL,
+  kernel_died INTEGER NOT NULL,
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id)
+);
+
+-- successful results, that are reused for identical submissions of the same user
+CREATE TABLE execution_cache (
+  user_id INTEGER NOT NULL,
+  execution_key TEXT NOT NULL,
+  notebook_id TEXT NOT NULL,  -- the notebook holding the result
+  creation_time REAL NOT NULL,
+  access_time REAL NOT NULL,
+  PRIMARY KEY (user_id, execution_key),
+  FOREIGN KEY (user_id) REFERENCES user (id),
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id)
+);
+
+CREATE INDEX execution_cache_access_time ON execution_cache (access_time);
+
+-- the full debug info of failed notebooks, zlib compressed and cut to its end, if it is too large
+CREATE TABLE debug_info (
+  notebook_id TEXT PRIMARY KEY,
+  data BLOB NOT NULL,
+  size INTEGER NOT NULL,  -- the uncompressed size in bytes
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id)
+);
+
+-- notebook files uploaded by a user, stored under the sha256 hash of their content
+CREATE TABLE upload (
+  user_id INTEGER NOT NULL,
+  content_hash TEXT NOT NULL,
+  upload_time REAL NOT NULL,  -- the time of the last upload of this file by this user
+  size INTEGER NOT NULL,  -- the size of the file in bytes, which is counted in the stored bytes of the user
+  PRIMARY KEY (user_id, content_hash),
+  FOREIGN KEY (user_id) REFERENCES user (id)
+);
+
+CREATE INDEX upload_upload_time ON upload (upload_time);
+CREATE INDEX upload_content_hash ON upload (content_hash);
+
+-- the timestamps of the lifecycle events of every notebook. Every event is recorded once, when it becomes known.
+CREATE TABLE notebook_lifecycle (
+  notebook_id TEXT PRIMARY KEY,
+  submitted REAL,  -- the request was received
+  accepted REAL,  -- the agency accepted the experiment
+  started REAL,  -- the container fetched the input notebook
+  requirements_fetched REAL,  -- the container fetched the python requirements
+  result_upload_started REAL,  -- the container started to send the result
+  result_received REAL,  -- the result was stored
+  finished REAL,  -- the final status was set
+  FOREIGN KEY (notebook_id) REFERENCES notebook (notebook_id)
+);
+
+-- the finished notebooks counted per user, docker image, day and final status. The rows are updated, when a notebook
+-- reaches its final status, so statistics do not need to read the notebook table.
+CREATE TABLE usage_rollup (
+  user_id INTEGER NOT NULL,
+  docker_image TEXT NOT NULL,  -- empty, if the docker image is unknown
+  day TEXT NOT NULL,  -- the utc date the notebook finished as YYYY-MM-DD
+  status INTEGER NOT NULL,
+  notebook_count INTEGER NOT NULL DEFAULT 0,
+  runtime_count INTEGER NOT NULL DEFAULT 0,  -- the notebooks, whose container start is known
+  runtime_sum REAL NOT NULL DEFAULT 0,  -- the seconds from the container start to the final status
+  gpu_seconds REAL NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, docker_image, day, status),
+  FOREIGN KEY (user_id) REFERENCES user (id)
+);
+
+CREATE INDEX usage_rollup_day ON usage_rollup (day);
+
+-- the runtime histogram of every usage rollup, used to estimate runtime percentiles
+CREATE TABLE usage_runtime_bucket (
+  user_id INTEGER NOT NULL,
+  docker_image TEXT NOT NULL,
+  day TEXT NOT NULL,
+  status INTEGER NOT NULL,
+  bucket INTEGER NOT NULL,
+  notebook_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, docker_image, day, status, bucket),
+  FOREIGN KEY (user_id) REFERENCES user (id)
+);
+
+CREATE INDEX usage_runtime_bucket_day ON usage_runtime_bucket (day);
@@ -0,0 +1,57 @@
+import fnmatch
+from collections import OrderedDict
+
+from cc_jupyter_service.service.db import DatabaseError
+
+
+def select_notebooks(database_api, user_id, notebook_ids=None, submission_id=None, statuses=None,
+                     filename_pattern=None):
+    """
+    Selects the notebooks of the given user by ids, by submission id or by status and filename.
+
+    :param database_api: The database to use
+    :type database_api: DatabaseAPI
+    :param user_id: The id of the user
+    :type user_id: int
+    :param notebook_ids: The ids of the notebooks to select. Every id is selected once in the order of its first
+                         occurrence.
+    :type notebook_ids: list[str] or None
+    :param submission_id: Selects the notebooks submitted by the request with this id
+    :type submission_id: str or None
+    :param statuses: Selects the notebooks with one of these statuses. If None, notebooks with any status are selected.
+    :type statuses: list[DatabaseAPI.NotebookStatus] or None
+    :param filename_pattern: Selects only notebooks, whose filename matches this shell-style pattern
+    :type filename_pattern: str or None
+    :return: A tuple (notebooks, missing ids). The selected notebooks and the given notebook ids, that could not be
+             found for this user.
+    :rtype: tuple[list[DatabaseAPI.Notebook], list[str]]
+    """
+    if notebook_ids is not None:
+        notebooks = []
+        missing_ids = []
+        for notebook_id in OrderedDict.fromkeys(notebook_ids):
+            try:
+                notebook = database_api.get_notebook(notebook_id)
+            except DatabaseError:
+                notebook = None
+            if notebook is None or notebook.user_id != user_id:
+                missing_ids.append(notebook_id)
+            else:
+                notebooks.append(notebook)
+        return notebooks, missing_ids
+
+    if submission_id is not None:
+        notebooks = database_api.get_notebooks(user_id)
+        return [notebook for notebook in notebooks if notebook.submission_id == submission_id], []
+
+    if statuses is None:
+        notebooks = database_api.get_notebooks(user_id)
+    else:
+        notebooks = []
+        for status in statuses:
+            notebooks.extend(database_api.get_notebooks(user_id, status))
+    if filename_pattern is not None:
+        notebooks = [
+            notebook for notebook in notebooks if fnmatch.fnmatchcase(notebook.notebook_filename, filename_pattern)
+        ]
+    return notebooks, []
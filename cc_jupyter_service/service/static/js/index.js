@@ -2,11 +2,11 @@ $(document).ready(function() {
     const DEFAULT_GPU_VRAM = 2048;
 
     class NotebookEntry {
-        data;
+        file;
         filename;
 
-        constructor(data, filename) {
-            this.data = data;
+        constructor(file, filename) {
+            this.file = file;
             this.filename = filename;
         }
     }
@@ -59,6 +59,8 @@ $(document).ready(function() {
     let resultStates = [];
     let pythonRequirements = null;
     const REFRESH_RESULTS_INTERVAL = 4000;
+    const STALE_PROGRESS_SECONDS = 120;
+    const MAX_DEBUG_INFO_FETCH_SIZE = 256 * 1024;
 
     /**
      * Fetches the predefined docker images from the server
@@ -572,6 +574,18 @@ $(document).ready(function() {
         })
         externalDataSection.append(addExternalDataButton);
 
+        // execution cache
+        const bypassCacheSection = $('<div class="form-check">');
+        const bypassCacheCheckbox = $('<input type="checkbox" id="bypassCache" class="form-check-input">');
+        bypassCacheSection.append(bypassCacheCheckbox);
+        bypassCacheSection.append('<label for="bypassCache" class="form-check-label">Execute again, even if a cached result exists</label>');
+
+        // notebook slimming
+        const skipSlimmingSection = $('<div class="form-check">');
+        const skipSlimmingCheckbox = $('<input type="checkbox" id="skipSlimming" class="form-check-input">');
+        skipSlimmingSection.append(skipSlimmingCheckbox);
+        skipSlimmingSection.append('<label for="skipSlimming" class="form-check-label">Keep the outputs and metadata of the submitted notebooks</label>');
+
         // submit button
         const submitButton = $('<button type="button" name="submitButton" id="submitButton" class="btn btn-outline-primary active">Execute</button>');
 
@@ -583,26 +597,29 @@ $(document).ready(function() {
 
             let url = getUrl('executeNotebook');
 
-            // noinspection JSIgnoredPromiseFromCall
-            $.ajax({
-                url,
-                method: 'POST',
-                dataType: 'json',
-                contentType: 'application/json',
-                data: JSON.stringify({
-                    jupyterNotebooks: jupyterNotebookEntries,
-                    dependencies: dependenciesSelection,
-                    pythonRequirements,
-                    gpuRequirements,
-                    externalData: externalDataInfo
-                })
-            }).fail(function (e, statusText, errorMessage) {
+            uploadNotebooks(jupyterNotebookEntries).then(function (jupyterNotebooks) {
+                return $.ajax({
+                    url,
+                    method: 'POST',
+                    dataType: 'json',
+                    contentType: 'application/json',
+                    data: JSON.stringify({
+                        jupyterNotebooks,
+                        dependencies: dependenciesSelection,
+                        pythonRequirements,
+                        gpuRequirements,
+                        externalData: externalDataInfo,
+                        bypassCache: bypassCacheCheckbox.prop('checked'),
+                        skipSlimming: skipSlimmingCheckbox.prop('checked')
+                    })
+                });
+            }).then(function (_data) {
+                showResultView();
+            }, function (e) {
                 addAlert('danger', 'Failed to execute the given notebook!');
-                console.error(errorMessage, e.responseText);
+                console.error('Failed to execute notebooks\nerror: ', e.responseText || e);
                 submitButton.prop('disabled', false)
-            }).done(function(data, _statusText, _jqXHR) {
-                showResultView();
-            })
+            });
             submitButton.prop('disabled', true)
         });
 
@@ -613,12 +630,85 @@ $(document).ready(function() {
         submain.append(hardwareSection);
         submain.append(externalDataSection);
         submain.append('<br>');
+        submain.append(bypassCacheSection);
+        submain.append(skipSlimmingSection);
+        submain.append('<br>');
         submain.append(submitButton);
         main.append(submain);
 
         clearRefreshResultsInterval();
     }
 
+    /**
+     * Computes the hex encoded sha256 hash of the given file.
+     *
+     * @param file The file to hash
+     * @returns A promise resolving to the hash
+     */
+    function hashFile(file) {
+        return file.arrayBuffer().then(function (buffer) {
+            return window.crypto.subtle.digest('SHA-256', buffer);
+        }).then(function (digest) {
+            return Array.from(new Uint8Array(digest)).map(function (b) {
+                return b.toString(16).padStart(2, '0');
+            }).join('');
+        });
+    }
+
+    /**
+     * Uploads the given notebook files, that are not stored by the service yet. The service is asked for the missing
+     * files by their content hashes first, so files uploaded before are not sent again. If the browser can not compute
+     * hashes, which is the case for pages not served over https, the notebooks are embedded in the execution request.
+     *
+     * @param entries The NotebookEntry objects to upload
+     * @returns A promise resolving to the entries of the jupyterNotebooks list of the execution request
+     */
+    function uploadNotebooks(entries) {
+        if (!(window.crypto && window.crypto.subtle)) {
+            return Promise.all(entries.map(function (entry) {
+                return entry.file.text().then(function (text) {
+                    return {filename: entry.filename, data: JSON.parse(text)};
+                });
+            }));
+        }
+
+        let contentHashes = null;
+        return Promise.all(entries.map(function (entry) { return hashFile(entry.file); })).then(function (hashes) {
+            contentHashes = hashes;
+            return $.ajax({
+                url: getUrl('uploads/missing'),
+                method: 'POST',
+                dataType: 'json',
+                contentType: 'application/json',
+                data: JSON.stringify({contentHashes})
+            });
+        }).then(function (data) {
+            const missingHashes = new Set(data['missingHashes']);
+            if (missingHashes.size === 0) {
+                return null;
+            }
+            const formData = new FormData();
+            entries.forEach(function (entry, index) {
+                // every missing file is sent once, even if it was added multiple times
+                if (missingHashes.delete(contentHashes[index])) {
+                    formData.append(contentHashes[index], entry.file, entry.filename);
+                }
+            });
+            return $.ajax({
+                url: getUrl('uploads'),
+                method: 'POST',
+                dataType: 'json',
+                processData: false,
+                contentType: false,
+                data: formData
+            });
+        }).then(function (_data) {
+            return entries.map(function (entry, index) {
+                return {filename: entry.filename, contentHash: contentHashes[index]};
+            });
+        });
+    }
+
     function refreshRequirements(requirementsList) {
         requirementsList.empty();
         if (pythonRequirements !== null) {
@@ -667,7 +757,105 @@ $(document).ready(function() {
         return timeStr;
     }
 
-    function addResultEntry(elemIndex, resultTable, notebookId, processStatus, notebookFilename, executionTime, debugInfo) {
+    function formatDuration(seconds) {
+        seconds = Math.floor(seconds);
+        const hours = Math.floor(seconds / 3600);
+        const minutes = Math.floor((seconds % 3600) / 60);
+        let durationStr = padZero(minutes) + ':' + padZero(seconds % 60);
+        if (hours > 0) {
+            durationStr = hours + ':' + durationStr;
+        }
+        return durationStr;
+    }
+
+    function isProgressStale(progress) {
+        return Date.now() / 1000 - progress['update_time'] > STALE_PROGRESS_SECONDS;
+    }
+
+    function formatProgress(progress) {
+        let progressStr = '';
+        if (progress['cell_index'] !== null && progress['cell_count'] !== null) {
+            progressStr = 'cell ' + (progress['cell_index'] + 1) + '/' + progress['cell_count'] + ', ';
+        }
+        progressStr = progressStr + formatDuration(progress['elapsed_time']);
+        if (isProgressStale(progress)) {
+            progressStr = progressStr + ', no report since ' + formatDuration(Date.now() / 1000 - progress['update_time']);
+        }
+        return progressStr;
+    }
+
+    function formatBytes(bytes) {
+        const units = ['B', 'KB', 'MB', 'GB'];
+        let unitIndex = 0;
+        while (bytes >= 1024 && unitIndex < units.length - 1) {
+            bytes = bytes / 1024;
+            unitIndex += 1;
+        }
+        return (unitIndex === 0 ? bytes : bytes.toFixed(1)) + ' ' + units[unitIndex];
+    }
+
+    /**
+     * Formats the phase durations of a notebook lifecycle as one line per phase.
+     */
+    function formatLifecycle(lifecycle) {
+        const phaseNames = {
+            'queued': 'queued',
+            'agency_wait': 'waiting for agency',
+            'execution': 'executing',
+            'result_upload': 'sending result',
+            'status_detection': 'detecting status'
+        };
+        const lines = [];
+        for (const phase in phaseNames) {
+            if (phase in lifecycle['durations']) {
+                lines.push(phaseNames[phase] + ': ' + formatDuration(lifecycle['durations'][phase]));
+            }
+        }
+        return lines.join('\n');
+    }
+
+    function escapeHtml(text) {
+        return $('<div>').text(text).html();
+    }
+
+    function formatSummary(summary) {
+        let summaryStr = summary['cell_count'] + ' cells';
+        if (summary['duration'] !== null) {
+            summaryStr = summaryStr + ', ' + formatDuration(summary['duration']);
+        }
+        summaryStr = summaryStr + ', ' + formatBytes(summary['output_bytes']) + ' output';
+        if (summary['image_count'] > 0) {
+            summaryStr = summaryStr + ', ' + summary['image_count'] + ' images';
+        }
+        if (summary['kernel_died']) {
+            summaryStr = summaryStr + '<br><span class="text-danger">kernel died</span>';
+        }
+        if (summary['error_cell_count'] > 0) {
+            summaryStr = summaryStr + '<br><span class="text-danger" title="' + escapeHtml(summary['first_error']) + '">' +
+                summary['error_cell_count'] + ' error cells, first in cell ' + (summary['first_error_cell_index'] + 1) + '</span>';
+        }
+        return summaryStr;
+    }
+
+    function fetchDebugInfo(notebookId, debugInfoBody) {
+        const url = getUrl('debug_info/' + notebookId);
+        // noinspection JSIgnoredPromiseFromCall
+        $.ajax({
+            url,
+            method: 'GET',
+            dataType: 'text',
+            headers: {'Range': 'bytes=-' + MAX_DEBUG_INFO_FETCH_SIZE}
+        }).done(function (data, _statusText, jqXHR) {
+            if (jqXHR.status === 206) {
+                data = '[showing the last ' + formatBytes(MAX_DEBUG_INFO_FETCH_SIZE) + ']\n' + data;
+            }
+            debugInfoBody.text(data);
+        }).fail(function (_a, _b, e) {
+            console.error('Failed to fetch debug info of notebook ', notebookId, '\nerror: ', e);
+        });
+    }
+
+    function addResultEntry(elemIndex, resultTable, notebookId, processStatus, notebookFilename, executionTime, debugInfo, debugInfoTruncated, progress, summary, cached, lifecycle) {
 
         // download button
         const downloadButton = $('<button class="btn btn-sm btn-outline-secondary" data-toggle="tooltip" title="download"><i class="fa fa-download"></i></button>');
@@ -711,15 +899,21 @@ $(document).ready(function() {
                 '<h4 class="modal-title">Debug Information</h4>' +
                 '<button type="button" class="close" data-dismiss="modal">&times;</button>' +
                 '</div>' +
-                '<pre id="debugInfoModalBody' + elemIndex + '" class="modal-body pull">' + debugInfo + '</pre>' +
+                '<pre id="debugInfoModalBody' + elemIndex + '" class="modal-body pull">' + escapeHtml(debugInfo) + '</pre>' +
                 '<div class="modal-footer">' +
                 '<button type="button" class="btn btn-default btn-outline-secondary" data-dismiss="modal">Close</button>'
             );
+            if (debugInfoTruncated) {
+                // the listing only contains the end of the debug info, the full text is fetched on first expand
+                showDebugInfoModal.one('show.bs.modal', function() {
+                    fetchDebugInfo(notebookId, showDebugInfoModal.find('#debugInfoModalBody' + elemIndex));
+                });
+            }
         }
 
         // td
         const td = $('<td>');
-        if (processStatus === 'processing') {
+        if (processStatus === 'processing' || processStatus === 'queued') {
             td.append(cancelButton);
         }
         if (processStatus === 'success') {
@@ -733,9 +927,26 @@ $(document).ready(function() {
         const processTd = $('<td>' + processStatus + '</td>');
         if (processStatus === 'processing') {
             processTd.append('&ensp;<div id="processingSpinner' + elemIndex + '" class="spinner-border spinner-border-sm text-muted"></div>');
+            if (progress) {
+                const progressClass = isProgressStale(progress) ? 'text-warning' : 'text-muted';
+                processTd.append('<br><small class="' + progressClass + '">' + formatProgress(progress) + '</small>');
+            }
+        }
+        if (processStatus === 'queued') {
+            processTd.append('<br><small class="text-muted">waiting for free agency capacity</small>');
+        }
+        if (processStatus === 'success' && summary) {
+            processTd.append('<br><small class="text-muted">' + formatSummary(summary) + '</small>');
+        }
+        if (cached) {
+            processTd.append('<br><small class="text-muted">reused cached result</small>');
         }
         row.append(processTd);
-        row.append('<td>' + formatTimestamp(executionTime) + '</td>');
+        const timeTd = $('<td>' + formatTimestamp(executionTime) + '</td>');
+        if (lifecycle) {
+            timeTd.attr('title', formatLifecycle(lifecycle));
+        }
+        row.append(timeTd);
         row.append(td);
 
         resultTable.append(row);
@@ -752,6 +963,14 @@ $(document).ready(function() {
 
         // result section
         const resultSection = $('<div id="resultSection" class="text-center">')
+        const cancelAllButton = $('<button type="button" id="cancelAllButton" class="btn btn-sm btn-outline-secondary float-right">Cancel all running</button>');
+        cancelAllButton.click(cancelAllNotebooks);
+        resultSection.append(cancelAllButton);
+        const downloadAllButton = $('<button type="button" id="downloadAllButton" class="btn btn-sm btn-outline-secondary float-right mr-2">Download all results</button>');
+        downloadAllButton.click(function () {
+            window.open(getUrl('results_archive'), '_blank');
+        });
+        resultSection.append(downloadAllButton);
         const resultTable = $('<table id="resultTable" class="table table-bordered table-hover table-sm">');
         clearResultTable(resultTable);
         resultSection.append(resultTable);
@@ -761,6 +980,31 @@ $(document).ready(function() {
         refreshResults();
     }
 
+    function cancelAllNotebooks() {
+        if (!window.confirm('Cancel all processing and queued notebooks?')) {
+            return;
+        }
+        const url = getUrl('cancel_notebooks');
+        // noinspection JSIgnoredPromiseFromCall
+        $.ajax({
+            url,
+            method: 'DELETE',
+            dataType: 'json',
+            contentType: 'application/json',
+            data: JSON.stringify({'filter': {}})
+        }).done(function (data, _statusText, _jqXHR) {
+            const failed = data['results'].filter(function(result) { return result['outcome'] === 'failed'; });
+            if (failed.length > 0) {
+                addAlert('danger', 'Failed to cancel ' + failed.length + ' of ' + data['results'].length + ' notebooks');
+                console.error('Failed to cancel notebooks: ', failed);
+            }
+            refreshResults();
+        }).fail(function (_a, _b, e) {
+            addAlert('danger', 'Failed to cancel the notebook executions');
+            console.error('Failed to cancel notebooks\nerror: ', e);
+        });
+    }
+
     function clearResultTable(resultTable) {
         resultTable.empty();
         resultTable.append('<tr><th>Name</th><th>Status</th><th>Time</th><th>Actions</th></tr>')
@@ -770,8 +1014,13 @@ $(document).ready(function() {
         let containsProcessing = false;
         const tempResultStates = [];
         for (const entry of data) {
-            tempResultStates.push(entry['process_status'])
-            if (entry['process_status'] === 'processing') {
+            let resultState = entry['process_status'];
+            const progress = entry['progress'];
+            if (progress) {
+                resultState = resultState + ':' + progress['cell_index'] + ':' + progress['update_time'] + ':' + isProgressStale(progress);
+            }
+            tempResultStates.push(resultState)
+            if (entry['process_status'] === 'processing' || entry['process_status'] === 'queued') {
                 containsProcessing = true;
             }
         }
@@ -815,7 +1064,7 @@ $(document).ready(function() {
             clearResultTable(resultTable);
             let index = 0;
             for (let entry of data) {
-                addResultEntry(index, resultTable, entry['notebook_id'], entry['process_status'], entry['notebook_filename'], entry['execution_time'], entry['debug_info']);
+                addResultEntry(index, resultTable, entry['notebook_id'], entry['process_status'], entry['notebook_filename'], entry['execution_time'], entry['debug_info'], entry['debug_info_truncated'], entry['progress'], entry['summary'], entry['cached'], entry['lifecycle']);
                 index += 1;
             }
             if (data.length === 0) {
@@ -881,7 +1130,7 @@ $(document).ready(function() {
                 console.error('Error while decoding notebook.' + error + '\ncontent was: ' + ev.target.result);
                 return;
             }
-            jupyterNotebookEntries.push(new NotebookEntry(json, file.name));
+            jupyterNotebookEntries.push(new NotebookEntry(file, file.name));
             loadExternalDataFromNotebook(json);
             refreshNotebookList($('#notebookList'));
         };
@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+import pytest
+
+from cc_jupyter_service.common import json_codec
+from cc_jupyter_service.service import db
+
+TEST_CONFIGURATION = '''notebookDirectory: {}
+flaskSecretKey: test
+preventLocalhost: false
+'''
+
+
+def pytest_configure(config):
+    """
+    The service modules load the configuration from the working directory on import, so the tests run in a temporary
+    directory with a minimal configuration.
+    """
+    directory = tempfile.mkdtemp(prefix='cc-jupyter-service-tests-')
+    with open(os.path.join(directory, 'cc-jupyter-service-config.yml'), 'w') as f:
+        f.write(TEST_CONFIGURATION.format(os.path.join(directory, 'notebooks')))
+    os.chdir(directory)
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def json_backend(request, monkeypatch):
+    """
+    Runs a test once with orjson and once with the json module of the standard library as backend of json_codec.
+    """
+    if request.param == 'orjson':
+        if json_codec.orjson is None:
+            pytest.skip('orjson is not installed')
+    else:
+        monkeypatch.setattr(json_codec, 'orjson', None)
+    return request.param
+
+
+class FakeClock:
+    """
+    Replaces the time module of the database module. Only time() is faked, every other function is the real one.
+    """
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Fixes the current time of the database module at 2020-09-13 12:26:40 utc. Tests move it by changing clock.now.
+    """
+    fake_clock = FakeClock(1600000000.0)
+    monkeypatch.setattr(db, 'time', fake_clock)
+    return fake_clock
+
+
+@pytest.fixture
+def database_api(tmp_path):
+    """
+    A DatabaseAPI for an empty database with the schema of the service.
+    """
+    connection = sqlite3.connect(str(tmp_path / 'service.sqlite'), detect_types=sqlite3.PARSE_DECLTYPES)
+    connection.row_factory = sqlite3.Row
+    with open(os.path.join(os.path.dirname(db.__file__), 'schema.sql'), 'r') as f:
+        connection.executescript(f.read())
+    yield db.DatabaseAPI(connection)
+    connection.close()
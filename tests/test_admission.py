@@ -0,0 +1,108 @@
+import pytest
+import requests
+
+from cc_jupyter_service.common import capacity
+from cc_jupyter_service.common.capacity import AgencyCapacity, NodeCapacity
+from cc_jupyter_service.common.red_file_template import RED_FILE_TEMPLATE
+from cc_jupyter_service.service import admission
+from cc_jupyter_service.service.admission import AdmissionController
+from cc_jupyter_service.service.db import DatabaseAPI
+
+AGENCY_URL = 'https://agency.example/'
+RAM = RED_FILE_TEMPLATE['container']['settings']['ram']
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.agency_url = AGENCY_URL
+        self.agency_username = 'user{}'.format(user_id)
+
+
+class FakeCookie:
+    def __init__(self, cookie_text):
+        self.cookie_text = cookie_text
+
+
+class FakeDatabaseAPI:
+    NotebookStatus = DatabaseAPI.NotebookStatus
+
+    def __init__(self, submissions):
+        self.submissions = submissions
+
+    def get_queued_submissions(self, _claim_timeout):
+        return list(self.submissions)
+
+    def count_notebooks_by_user(self, _status):
+        return {}
+
+
+@pytest.fixture
+def released(monkeypatch):
+    """
+    Replaces the database, the users and the agency submission. Returns a list of (notebook id, agency url) of every
+    released notebook.
+    """
+    released_notebooks = []
+    submissions = [
+        DatabaseAPI.QueuedSubmission('notebook-1', 1, {'gpuRequirements': None}, 1.0, None),
+        DatabaseAPI.QueuedSubmission('notebook-2', 2, {'gpuRequirements': None}, 2.0, None)
+    ]
+    database_api = FakeDatabaseAPI(submissions)
+    monkeypatch.setattr(admission.DatabaseAPI, 'create', staticmethod(lambda: database_api))
+    monkeypatch.setattr(admission.auth, 'get_user', FakeUser)
+    monkeypatch.setattr(admission.auth, 'get_current_cookies', lambda _user_id: {AGENCY_URL: FakeCookie('cookie')})
+    monkeypatch.setattr(admission.auth, 'get_agency_urls', lambda agency_url: [agency_url])
+
+    def release(_database_api, submission, _user, agency_url, _authorization_cookie):
+        released_notebooks.append((submission.notebook_id, agency_url))
+        return True
+
+    monkeypatch.setattr(admission, '_release', release)
+    return released_notebooks
+
+
+def _release_with_nodes(monkeypatch, fetch_agency_capacity):
+    monkeypatch.setattr(capacity, 'fetch_agency_capacity', fetch_agency_capacity)
+    return AdmissionController(None, 1, None).release_submissions()
+
+
+def test_failed_nodes_request_keeps_submissions_queued(monkeypatch, released):
+    def fetch_agency_capacity(agency_url, _authorization_cookie):
+        raise requests.ConnectionError('agency is not reachable')
+
+    assert _release_with_nodes(monkeypatch, fetch_agency_capacity) == 0
+    assert released == []
+
+
+def test_no_online_nodes_keeps_submissions_queued(monkeypatch, released):
+    def fetch_agency_capacity(agency_url, _authorization_cookie):
+        return AgencyCapacity(agency_url, [])
+
+    assert _release_with_nodes(monkeypatch, fetch_agency_capacity) == 0
+    assert released == []
+
+
+def test_busy_nodes_keep_submissions_queued(monkeypatch, released):
+    def fetch_agency_capacity(agency_url, _authorization_cookie):
+        return AgencyCapacity(agency_url, [NodeCapacity('node', 2 * RAM, RAM // 2, [], [])])
+
+    assert _release_with_nodes(monkeypatch, fetch_agency_capacity) == 0
+    assert released == []
+
+
+def test_free_capacity_releases_submissions(monkeypatch, released):
+    def fetch_agency_capacity(agency_url, _authorization_cookie):
+        return AgencyCapacity(agency_url, [NodeCapacity('node', 2 * RAM, RAM + RAM // 2, [], [])])
+
+    # the second notebook does not fit on the node after the reservation of the first notebook
+    assert _release_with_nodes(monkeypatch, fetch_agency_capacity) == 1
+    assert released == [('notebook-1', AGENCY_URL)]
+
+
+def test_too_small_nodes_release_to_default_agency(monkeypatch, released):
+    def fetch_agency_capacity(agency_url, _authorization_cookie):
+        return AgencyCapacity(agency_url, [NodeCapacity('node', RAM // 2, RAM // 2, [], [])])
+
+    assert _release_with_nodes(monkeypatch, fetch_agency_capacity) == 2
+    assert released == [('notebook-1', AGENCY_URL), ('notebook-2', AGENCY_URL)]
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+
+from cc_jupyter_service.service import asgi
+from cc_jupyter_service.service.asgi import AsgiAdapter
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def _scope(headers=None, method='POST', path='/'):
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': b'',
+        'headers': headers or [],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 12345)
+    }
+
+
+async def _request(asgi_app, scope, body_chunks=(b'',), send_delay=0):
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': index < len(body_chunks) - 1}
+        for index, chunk in enumerate(body_chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        if send_delay and message['type'] == 'http.response.body':
+            await asyncio.sleep(send_delay)
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    return sent
+
+
+def _response_body(sent):
+    return b''.join(message.get('body', b'') for message in sent if message['type'] == 'http.response.body')
+
+
+def test_body_spooling(monkeypatch):
+    def echo_app(environ, start_response):
+        body = environ['wsgi.input'].read()
+        start_response('200 OK', [('Content-Type', 'application/octet-stream')])
+        return [body]
+
+    # the body is larger than the part, that is kept in memory
+    monkeypatch.setattr(asgi, 'MAX_MEMORY_BODY_SIZE', 60000)
+    body_chunks = [bytes([index]) * 50000 for index in range(4)]
+    sent = _run(_request(AsgiAdapter(echo_app, 2), _scope(), body_chunks))
+
+    assert sent[0]['status'] == 200
+    assert _response_body(sent) == b''.join(body_chunks)
+
+
+def test_header_merging():
+    def header_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [
+            '{}|{}|{}'.format(environ['HTTP_ACCEPT'], environ['CONTENT_TYPE'], environ['HTTP_X_CUSTOM']).encode()
+        ]
+
+    headers = [
+        (b'accept', b'text/html'),
+        (b'accept', b'application/json'),
+        (b'content-type', b'application/json'),
+        (b'x-custom', b'value')
+    ]
+    sent = _run(_request(AsgiAdapter(header_app, 2), _scope(headers=headers)))
+
+    assert _response_body(sent) == b'text/html,application/json|application/json|value'
+    assert (b'content-type', b'text/plain') in sent[0]['headers']
+
+
+def test_streaming():
+    produced = []
+
+    def streaming_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        for chunk in [b'first', b'second', b'third']:
+            produced.append(chunk)
+            yield chunk
+
+    sent = _run(_request(AsgiAdapter(streaming_app, 2), _scope(method='GET')))
+
+    assert sent[0]['type'] == 'http.response.start'
+    body_messages = [message for message in sent[1:] if message.get('body')]
+    assert [message['body'] for message in body_messages] == [b'first', b'second', b'third']
+    assert all(message['more_body'] for message in body_messages)
+    assert not sent[-1].get('more_body', False)
+
+
+def test_write_callable():
+    def writing_app(environ, start_response):
+        write = start_response('200 OK', [('Content-Type', 'text/plain')])
+        write(b'written ')
+        return [b'returned']
+
+    sent = _run(_request(AsgiAdapter(writing_app, 1), _scope(method='GET')))
+
+    assert sent[0]['status'] == 200
+    assert _response_body(sent) == b'written returned'
+
+
+def test_slow_client_does_not_hold_worker_thread():
+    events = []
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        if environ['PATH_INFO'] == '/slow':
+            return [b'first', b'second', b'third']
+        events.append('fast request processed')
+        return [b'fast']
+
+    asgi_app = AsgiAdapter(app, 1)
+
+    async def slow_request():
+        sent = await _request(asgi_app, _scope(method='GET', path='/slow'), send_delay=0.2)
+        events.append('slow transfer finished')
+        return sent
+
+    async def both_requests():
+        slow = asyncio.ensure_future(slow_request())
+        await asyncio.sleep(0.1)
+        fast = await _request(asgi_app, _scope(method='GET', path='/fast'))
+        return await slow, fast
+
+    slow, fast = _run(both_requests())
+
+    # the only worker thread processes the fast request, while the slow client receives its response
+    assert events == ['fast request processed', 'slow transfer finished']
+    assert _response_body(slow) == b'firstsecondthird'
+    assert _response_body(fast) == b'fast'
+
+
+def test_requests_run_in_parallel():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def waiting_app(environ, start_response):
+        # fails with BrokenBarrierError, if the requests are processed one after another
+        barrier.wait()
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [threading.current_thread().name.encode()]
+
+    asgi_app = AsgiAdapter(waiting_app, 2)
+
+    async def both_requests():
+        return await asyncio.gather(
+            _request(asgi_app, _scope(method='GET')), _request(asgi_app, _scope(method='GET'))
+        )
+
+    responses = _run(both_requests())
+
+    assert [sent[0]['status'] for sent in responses] == [200, 200]
+    assert all(_response_body(sent).startswith(b'asgi-worker') for sent in responses)
+
+
+def test_lifespan():
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    _run(AsgiAdapter(None, 1)({'type': 'lifespan'}, receive, send))
+
+    assert [message['type'] for message in sent] == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
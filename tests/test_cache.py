@@ -0,0 +1,25 @@
+from cc_jupyter_service.common import cache
+from cc_jupyter_service.common.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_max_ttl_shortens_the_entry_lifetime(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, 'time', clock)
+    ttl_cache = TTLCache(10, 60)
+    ttl_cache.put('short', 1, max_ttl=5)
+    ttl_cache.put('long', 2, max_ttl=600)
+
+    clock.now += 10
+    assert ttl_cache.get('short') is TTLCache.MISSING
+    assert ttl_cache.get('long') == 2
+
+    clock.now += 60
+    assert ttl_cache.get('long') is TTLCache.MISSING
@@ -0,0 +1,87 @@
+from cc_jupyter_service.service import cancellation
+from cc_jupyter_service.service.db import DatabaseAPI
+from cc_jupyter_service.service.selection import select_notebooks
+
+
+class FakeNotebook:
+    def __init__(self, notebook_id, status):
+        self.notebook_id = notebook_id
+        self.status = status
+        self.experiment_id = 'experiment-' + notebook_id
+        self.agency_url = 'https://agency.example/'
+
+
+class FakeCookie:
+    cookie_text = 'cookie'
+
+
+class FakeDatabaseAPI:
+    def __init__(self, finished_ids):
+        self.finished_ids = finished_ids
+
+    def dequeue_notebooks(self, notebook_ids, status):
+        return set(notebook_ids)
+
+    def cancel_processing_notebooks(self, notebook_ids):
+        return {notebook_id for notebook_id in notebook_ids if notebook_id not in self.finished_ids}
+
+
+def test_finished_notebooks_are_not_reported_as_cancelled(monkeypatch):
+    monkeypatch.setattr(cancellation.auth, 'get_current_cookie', lambda user_id, agency_url: FakeCookie())
+    monkeypatch.setattr(
+        cancellation, 'cancel_batch', lambda experiment_id, agency_url, cookie_text: 'batch-' + experiment_id
+    )
+    notebooks = [
+        FakeNotebook('running', DatabaseAPI.NotebookStatus.PROCESSING),
+        FakeNotebook('finished', DatabaseAPI.NotebookStatus.PROCESSING),
+        FakeNotebook('queued', DatabaseAPI.NotebookStatus.QUEUED),
+    ]
+
+    outcomes = cancellation.cancel_notebooks(FakeDatabaseAPI({'finished'}), 1, notebooks)
+
+    assert [outcome.outcome for outcome in outcomes] == [
+        cancellation.OUTCOME_CANCELLED, cancellation.OUTCOME_NOT_CANCELLABLE, cancellation.OUTCOME_CANCELLED
+    ]
+    assert outcomes[0].batch_id == 'batch-experiment-running'
+
+
+def test_duplicate_notebooks_are_cancelled_once(monkeypatch):
+    cancelled_experiments = []
+
+    def cancel_batch(experiment_id, agency_url, cookie_text):
+        cancelled_experiments.append(experiment_id)
+        return 'batch-' + experiment_id
+
+    monkeypatch.setattr(cancellation.auth, 'get_current_cookie', lambda user_id, agency_url: FakeCookie())
+    monkeypatch.setattr(cancellation, 'cancel_batch', cancel_batch)
+    running = FakeNotebook('running', DatabaseAPI.NotebookStatus.PROCESSING)
+    queued = FakeNotebook('queued', DatabaseAPI.NotebookStatus.QUEUED)
+
+    outcomes = cancellation.cancel_notebooks(FakeDatabaseAPI(set()), 1, [queued, running, queued, running])
+
+    assert [outcome.notebook_id for outcome in outcomes] == ['queued', 'running']
+    assert cancelled_experiments == ['experiment-running']
+
+
+class FakeSelectionDatabaseAPI:
+    def __init__(self, notebooks):
+        self.notebooks = notebooks
+        self.requested_ids = []
+
+    def get_notebook(self, notebook_id):
+        self.requested_ids.append(notebook_id)
+        return self.notebooks.get(notebook_id)
+
+
+def test_duplicate_notebook_ids_are_selected_once():
+    running = FakeNotebook('running', DatabaseAPI.NotebookStatus.PROCESSING)
+    running.user_id = 1
+    database_api = FakeSelectionDatabaseAPI({'running': running})
+
+    notebooks, missing_ids = select_notebooks(
+        database_api, 1, notebook_ids=['running', 'missing', 'running', 'missing']
+    )
+
+    assert notebooks == [running]
+    assert missing_ids == ['missing']
+    assert database_api.requested_ids == ['running', 'missing']
@@ -0,0 +1,30 @@
+from cc_jupyter_service.common.capacity import AgencyCapacity, AgencyRouter, NodeCapacity
+
+AGENCY_URL = 'https://agency.example/'
+
+
+def _router(nodes):
+    return AgencyRouter({AGENCY_URL: 'cookie'}, AGENCY_URL, {AGENCY_URL: AgencyCapacity(AGENCY_URL, nodes)})
+
+
+def test_reserve_now_reserves_ram_and_gpus():
+    node = NodeCapacity('node', 1000, 1000, [8000, 16000], [8000, 16000])
+    reservation = _router([node]).reserve_now(600, {'devices': [{'vramMin': 10000}]})
+
+    assert reservation.agency_url == AGENCY_URL
+    assert node.free_ram == 400
+    assert node.free_gpus == [8000]
+
+
+def test_cancelled_reservation_frees_capacity():
+    node = NodeCapacity('node', 1000, 1000, [8000, 16000], [8000, 16000])
+    router = _router([node])
+    reservation = router.reserve_now(600, {'devices': [{'vramMin': 10000}]})
+    assert router.reserve_now(600, None) is None
+
+    reservation.cancel()
+    reservation.cancel()
+
+    assert node.free_ram == 1000
+    assert sorted(node.free_gpus) == [8000, 16000]
+    assert router.route_now(600, None) == AGENCY_URL
@@ -0,0 +1,61 @@
+import zlib
+
+from cc_jupyter_service.common import debug_info as debug_info_module
+from cc_jupyter_service.common.debug_info import DebugInfo, TRUNCATION_MARKER, DEBUG_INFO_EXCERPT_LENGTH
+from cc_jupyter_service.service.db import DatabaseAPI
+
+
+def test_short_debug_info_is_complete():
+    debug_info = DebugInfo.from_text('Traceback: ✗ failed')
+
+    assert debug_info.excerpt == 'Traceback: ✗ failed'
+    assert debug_info.size == len('Traceback: ✗ failed'.encode('utf-8'))
+    assert debug_info.is_excerpt_complete()
+    assert debug_info.get_data() == 'Traceback: ✗ failed'.encode('utf-8')
+
+
+def test_excerpt_contains_the_end():
+    text = 'start\n' + 'x' * DEBUG_INFO_EXCERPT_LENGTH + '\nerror at the end'
+
+    debug_info = DebugInfo.from_text(text)
+
+    assert len(debug_info.excerpt) == DEBUG_INFO_EXCERPT_LENGTH
+    assert debug_info.excerpt.startswith('...')
+    assert text.endswith(debug_info.excerpt[3:])
+    assert not debug_info.is_excerpt_complete()
+    assert debug_info.get_data() == text.encode('utf-8')
+
+
+def test_large_debug_info_is_truncated_at_the_start(monkeypatch):
+    monkeypatch.setattr(debug_info_module, 'MAX_DEBUG_INFO_SIZE', 100)
+    # the cut at 100 bytes from the end splits a three byte character
+    text = 'a' * 50 + '✗' * 40 + 'error at the end!'
+
+    debug_info = DebugInfo.from_text(text)
+
+    data = debug_info.get_data()
+    assert data == zlib.decompress(debug_info.compressed_data)
+    assert debug_info.size == len(data)
+    truncated_text = data.decode('utf-8')
+    truncated_bytes = len(text.encode('utf-8')) - 100
+    assert truncated_text == TRUNCATION_MARKER.format(truncated_bytes) + '✗' * 27 + 'error at the end!'
+    assert debug_info.excerpt == truncated_text
+    assert debug_info.is_excerpt_complete()
+
+
+def test_debug_info_is_stored(database_api):
+    user_id = database_api.create_user('user', 'https://agency.example/')
+    database_api.create_notebook(
+        'notebook', 'token', user_id, 'experiment', 'notebook.ipynb', 0, 'https://agency.example/',
+        status=DatabaseAPI.NotebookStatus.FAILURE
+    )
+    text = 'log line\n' * 100
+
+    assert database_api.get_debug_info('notebook') is None
+    database_api.update_notebook_debug_info('notebook', text)
+
+    debug_info = database_api.get_debug_info('notebook')
+    assert debug_info.get_data() == text.encode('utf-8')
+    assert not debug_info.is_excerpt_complete()
+    assert database_api.get_notebook('notebook').debug_info == debug_info.excerpt
+    assert database_api.get_debug_info_sizes(user_id) == {'notebook': len(text)}
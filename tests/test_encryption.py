@@ -0,0 +1,20 @@
+import pytest
+
+from cc_jupyter_service.common import encryption
+
+pytestmark = pytest.mark.skipif(not encryption.is_available(), reason='cryptography is not installed')
+
+EXTERNAL_DATA = [{'inputName': 'data', 'connectorType': 'SSH', 'username': 'user', 'password': 'secret'}]
+
+
+def test_round_trip():
+    token = encryption.encrypt(EXTERNAL_DATA, 'key', 'purpose')
+    assert 'secret' not in token
+    assert encryption.decrypt(token, 'key', 'purpose') == EXTERNAL_DATA
+
+
+@pytest.mark.parametrize('secret_key, purpose', [('other key', 'purpose'), ('key', 'other purpose')])
+def test_decrypt_requires_same_key_and_purpose(secret_key, purpose):
+    token = encryption.encrypt(EXTERNAL_DATA, 'key', 'purpose')
+    with pytest.raises(encryption.DecryptionError):
+        encryption.decrypt(token, secret_key, purpose)
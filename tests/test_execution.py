@@ -0,0 +1,43 @@
+from cc_jupyter_service.common.execution import _create_red_data
+
+URL_ROOT = 'https://service.example/'
+
+
+def _red_data(execution_reports):
+    return _create_red_data(
+        'notebook-id', 'notebook-token', 'https://agency.example/', 'agency-user', URL_ROOT, 'image', None, [], None,
+        execution_reports
+    )
+
+
+def _option_prefixes(red_data):
+    return {
+        cli_input['inputBinding'].get('prefix')
+        for cli_input in red_data['cli']['inputs'].values()
+        if cli_input['inputBinding'].get('prefix')
+    }
+
+
+def test_report_options_are_disabled_by_default():
+    red_data = _red_data(False)
+
+    assert '--progress-url=' not in _option_prefixes(red_data)
+    assert '--status-url=' not in _option_prefixes(red_data)
+    assert '--service-token-file=' not in _option_prefixes(red_data)
+    assert 'progressUrl' not in red_data['inputs']
+    assert 'serviceTokenFile' not in red_data['inputs']
+
+
+def test_report_options():
+    red_data = _red_data(True)
+
+    assert {'--progress-url=', '--status-url=', '--service-username=', '--service-token-file='} <= \
+        _option_prefixes(red_data)
+    assert red_data['inputs']['progressUrl'] == URL_ROOT + 'progress/notebook-id'
+    assert red_data['inputs']['statusUrl'] == URL_ROOT + 'status/notebook-id'
+    assert red_data['inputs']['serviceUsername'] == 'agency-user'
+    token_access = red_data['inputs']['serviceTokenFile']['connector']['access']
+    assert token_access['url'] == URL_ROOT + 'service_token/notebook-id'
+    assert token_access['auth'] == {'username': 'agency-user', 'password': 'notebook-token'}
+    # every cli input has a value
+    assert set(red_data['cli']['inputs']) - {'pythonRequirements'} <= set(red_data['inputs'])
@@ -0,0 +1,102 @@
+import io
+import json
+import math
+
+import flask
+import pytest
+
+from cc_jupyter_service.common import json_codec
+
+# inputs both backends have to serialize to json with the same data
+DUMPS_INPUTS = [
+    {'cells': [{'source': ['print("hi")\n'], 'outputs': []}], 'metadata': {}, 'nbformat': 4},
+    {'unicode': '\u00e4\u00f6\u00fc \u20ac \u2028', 'escapes': '"\\\n\t\x00'},
+    {'float': 0.1, 'negative': -1.5e-10, 'int': -2 ** 63, 'bool': True, 'none': None},
+    {'big': 2 ** 70, 'nested': [[2 ** 64]]},
+    {'b': 1, 'a': [2, {'d': 3, 'c': 4}]},
+]
+# inputs both backends have to parse to the same data
+LOADS_INPUTS = [
+    b'{"a": [1, 2.5, "x", true, false, null]}',
+    b'{"nan": NaN, "inf": Infinity, "-inf": -Infinity}',
+    '{"text": "\\u00e4\\u20ac"}',
+    b'[1e400]',
+]
+
+
+def _normalize(data):
+    """
+    Replaces NaN, which is never equal to itself, so parsed data can be compared.
+    """
+    if isinstance(data, float) and math.isnan(data):
+        return 'NaN'
+    if isinstance(data, list):
+        return [_normalize(value) for value in data]
+    if isinstance(data, dict):
+        return {key: _normalize(value) for key, value in data.items()}
+    return data
+
+
+@pytest.mark.parametrize('data', DUMPS_INPUTS)
+def test_dumps_matches_stdlib(json_backend, data):
+    assert json.loads(json_codec.dumps(data).decode('utf-8')) == data
+
+
+@pytest.mark.parametrize('data', DUMPS_INPUTS)
+def test_dumps_sorts_keys(json_backend, data):
+    def key_order(text):
+        return json.loads(text, object_pairs_hook=lambda pairs: [(key, value) for key, value in pairs])
+
+    expected = key_order(json.dumps(data, sort_keys=True))
+    assert key_order(json_codec.dumps(data, sort_keys=True).decode('utf-8')) == expected
+
+
+@pytest.mark.parametrize('data', DUMPS_INPUTS)
+def test_dump_matches_dumps(json_backend, data):
+    file = io.BytesIO()
+    json_codec.dump(data, file)
+    assert json.loads(file.getvalue().decode('utf-8')) == json.loads(json_codec.dumps(data).decode('utf-8'))
+
+
+@pytest.mark.parametrize('data', LOADS_INPUTS)
+def test_loads_matches_stdlib(json_backend, data):
+    expected = json.loads(data.decode('utf-8') if isinstance(data, bytes) else data)
+    assert _normalize(json_codec.loads(data)) == _normalize(expected)
+
+
+def test_load_reads_binary_file(json_backend):
+    assert json_codec.load(io.BytesIO(b'{"a": NaN}'))['a'] != 0
+
+
+@pytest.mark.parametrize('data', [
+    {'a': float('nan'), 'b': [float('inf')], 'c': None},
+    {'cells': [{'outputs': [{'data': {'x': [1.0, float('-inf')]}}]}], 'metadata': None},
+    (0.5, float('nan')),
+])
+def test_non_finite_floats_round_trip(json_backend, data):
+    expected = _normalize(json.loads(json.dumps(data)))
+    assert _normalize(json_codec.loads(json_codec.dumps(data))) == expected
+    assert _normalize(json_codec.loads(json_codec.dumps(data, sort_keys=True))) == expected
+
+    file = io.BytesIO()
+    json_codec.dump(data, file)
+    assert _normalize(json_codec.load(io.BytesIO(file.getvalue()))) == expected
+
+
+def test_json_provider_keeps_non_finite_floats(json_backend):
+    if json_codec.FastJSONProvider is None or json_codec.orjson is None:
+        pytest.skip('flask has no json providers or orjson is not installed')
+    app = flask.Flask(__name__)
+    json_codec.init_app(app)
+    data = {'a': float('nan'), 'b': None}
+
+    assert _normalize(json_codec.loads(app.json.dumps(data))) == {'a': 'NaN', 'b': None}
+    with app.app_context():
+        response = app.json.response(data)
+    assert _normalize(json_codec.loads(response.get_data())) == {'a': 'NaN', 'b': None}
+
+
+@pytest.mark.parametrize('data', [b'{"a": }', b'', b'[1, 2', b'{"a": nan}'])
+def test_loads_rejects_invalid_json(json_backend, data):
+    with pytest.raises(ValueError):
+        json_codec.loads(data)
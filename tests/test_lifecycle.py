@@ -0,0 +1,77 @@
+import pytest
+
+from cc_jupyter_service.service.db import DatabaseAPI, LIFECYCLE_EVENTS
+
+# the time of the clock fixture
+SUBMISSION_TIME = 1600000000.0
+
+
+@pytest.fixture
+def user_id(database_api):
+    return database_api.create_user('user', 'https://agency.example/')
+
+
+def _create_notebook(database_api, user_id, notebook_id, status=DatabaseAPI.NotebookStatus.PROCESSING):
+    database_api.create_notebook(
+        notebook_id, 'token', user_id, 'experiment', 'notebook.ipynb', 0, 'https://agency.example/', status=status
+    )
+
+
+def test_events_and_durations(database_api, user_id, clock):
+    _create_notebook(database_api, user_id, 'notebook')
+    for offset, event in enumerate(LIFECYCLE_EVENTS[1:-1], start=1):
+        database_api.record_lifecycle_event('notebook', event, SUBMISSION_TIME + 10 * offset)
+    clock.now = SUBMISSION_TIME + 100
+    database_api.update_notebook_status('notebook', DatabaseAPI.NotebookStatus.SUCCESS)
+
+    lifecycle = database_api.get_lifecycle('notebook')
+
+    assert lifecycle.event_times == {
+        'submitted': SUBMISSION_TIME,
+        'accepted': SUBMISSION_TIME + 10,
+        'started': SUBMISSION_TIME + 20,
+        'requirements_fetched': SUBMISSION_TIME + 30,
+        'result_upload_started': SUBMISSION_TIME + 40,
+        'result_received': SUBMISSION_TIME + 50,
+        'finished': SUBMISSION_TIME + 100
+    }
+    assert lifecycle.get_durations() == {
+        'queued': 10, 'agency_wait': 10, 'execution': 20, 'result_upload': 10, 'status_detection': 50
+    }
+
+
+def test_first_event_time_is_kept(database_api, user_id, clock):
+    _create_notebook(database_api, user_id, 'notebook')
+
+    database_api.record_lifecycle_event('notebook', 'started', SUBMISSION_TIME + 5)
+    database_api.record_lifecycle_event('notebook', 'started', SUBMISSION_TIME + 50)
+    database_api.update_notebook_status('notebook', DatabaseAPI.NotebookStatus.FAILURE)
+    clock.now += 100
+    database_api.update_notebook_status('notebook', DatabaseAPI.NotebookStatus.SUCCESS)
+
+    event_times = database_api.get_lifecycle('notebook').event_times
+    assert event_times['started'] == SUBMISSION_TIME + 5
+    assert event_times['finished'] == SUBMISSION_TIME
+    assert event_times['result_received'] is None
+
+
+def test_unknown_event(database_api, user_id):
+    _create_notebook(database_api, user_id, 'notebook')
+
+    with pytest.raises(ValueError):
+        database_api.record_lifecycle_event('notebook', 'notebook_id', 0)
+
+
+def test_lifecycles_of_user(database_api, user_id, clock):
+    other_user_id = database_api.create_user('other', 'https://agency.example/')
+    _create_notebook(database_api, user_id, 'processing')
+    _create_notebook(database_api, user_id, 'cached', DatabaseAPI.NotebookStatus.SUCCESS)
+    _create_notebook(database_api, other_user_id, 'other')
+
+    lifecycles = database_api.get_lifecycles(user_id)
+
+    assert sorted(lifecycles) == ['cached', 'processing']
+    assert lifecycles['processing'].event_times['finished'] is None
+    # notebooks created with a final status finish immediately
+    assert lifecycles['cached'].to_json()['events']['finished'] == SUBMISSION_TIME
+    assert database_api.get_lifecycle('unknown') is None
@@ -0,0 +1,97 @@
+import copy
+
+from cc_jupyter_service.common import json_codec
+from cc_jupyter_service.common.notebook_slimming import slim_notebook, DEFAULT_SLIM_METADATA_KEYS
+
+KERNELSPEC = {'name': 'python3', 'display_name': 'Python 3', 'language': 'python'}
+
+
+def _notebook():
+    return {
+        'cells': [
+            {
+                'cell_type': 'markdown',
+                'metadata': {'ExecuteTime': {'end_time': '2020-09-13T12:26:40Z'}},
+                'source': '# Überschrift'
+            },
+            {
+                'cell_type': 'code',
+                'execution_count': 12,
+                'metadata': {'tags': ['parameters'], 'execution': {'iopub.status.busy': '2020-09-13T12:26:40Z'}},
+                'source': 'a = 1',
+                'outputs': [
+                    {'output_type': 'stream', 'name': 'stdout', 'text': 'ausgabe ✓\n' * 100},
+                    {'output_type': 'display_data', 'metadata': {}, 'data': {'image/png': 'iVBORw0KGgo=' * 100}}
+                ]
+            },
+            {
+                'cell_type': 'code',
+                'execution_count': None,
+                'metadata': {},
+                'source': 'b = 2',
+                'outputs': []
+            }
+        ],
+        'metadata': {
+            'kernelspec': KERNELSPEC,
+            'widgets': {'application/vnd.jupyter.widget-state+json': {'state': {'model': 'x' * 1000}}}
+        },
+        'nbformat': 4,
+        'nbformat_minor': 4
+    }
+
+
+def test_outputs_and_metadata_are_removed(json_backend):
+    notebook = _notebook()
+    original = copy.deepcopy(notebook)
+
+    slimmed_notebook, _bytes_saved = slim_notebook(notebook, DEFAULT_SLIM_METADATA_KEYS)
+
+    # the given notebook is not modified and unchanged cells are shared
+    assert notebook == original
+    assert slimmed_notebook['cells'][2] is notebook['cells'][2]
+    assert slimmed_notebook['metadata'] == {'kernelspec': KERNELSPEC}
+    markdown_cell, code_cell, empty_cell = slimmed_notebook['cells']
+    assert markdown_cell == dict(original['cells'][0], metadata={})
+    assert code_cell == dict(
+        original['cells'][1], outputs=[], execution_count=None, metadata={'tags': ['parameters']}
+    )
+    assert empty_cell == original['cells'][2]
+
+
+def test_bytes_saved_matches_serialized_size(json_backend):
+    notebook = _notebook()
+
+    slimmed_notebook, bytes_saved = slim_notebook(notebook, DEFAULT_SLIM_METADATA_KEYS)
+
+    serialized_bytes_saved = len(json_codec.dumps(notebook)) - len(json_codec.dumps(slimmed_notebook))
+    # the commas between the removed metadata keys and the remaining keys are not counted: one in the notebook
+    # metadata and one in the metadata of the code cell
+    assert serialized_bytes_saved == bytes_saved + 2
+
+
+def test_bytes_saved_is_exact_without_separators(json_backend):
+    notebook = {
+        'cells': [{
+            'cell_type': 'code',
+            'execution_count': 3,
+            'metadata': {'ExecuteTime': {}},
+            'source': '',
+            'outputs': [{'output_type': 'stream', 'name': 'stdout', 'text': 'ausgabe ✓'}]
+        }],
+        'metadata': {'widgets': {'state': {}}}
+    }
+
+    slimmed_notebook, bytes_saved = slim_notebook(notebook, DEFAULT_SLIM_METADATA_KEYS)
+
+    assert bytes_saved == len(json_codec.dumps(notebook)) - len(json_codec.dumps(slimmed_notebook))
+
+
+def test_slim_notebook_without_changes(json_backend):
+    notebook = {'cells': [{'cell_type': 'raw', 'metadata': {}, 'source': 'raw'}], 'metadata': {}}
+
+    slimmed_notebook, bytes_saved = slim_notebook(notebook, [])
+
+    assert slimmed_notebook == notebook
+    assert bytes_saved == 0
+    assert slim_notebook({'metadata': {}}, DEFAULT_SLIM_METADATA_KEYS) == ({'metadata': {}}, 0)
@@ -0,0 +1,95 @@
+import pytest
+
+from cc_jupyter_service.service.db import DatabaseAPI
+from cc_jupyter_service.service.quota import SubmissionQuota, QuotaExceeded, ACTIVE_NOTEBOOKS_RETRY_AFTER
+
+
+@pytest.fixture
+def user_id(database_api):
+    return database_api.create_user('user', 'https://agency.example/')
+
+
+def _create_notebook(database_api, user_id, notebook_id, status):
+    database_api.create_notebook(
+        notebook_id, 'token', user_id, 'experiment', 'notebook.ipynb', 0, 'https://agency.example/', status=status
+    )
+
+
+def _retry_after(exception):
+    return exception.get_response().headers.get('Retry-After')
+
+
+def test_token_bucket_is_refilled(database_api, user_id, clock):
+    # one notebook per second with a burst of 3 notebooks
+    quota = SubmissionQuota(None, 60, 3, None, None)
+
+    quota.check(database_api, user_id, 3)
+    with pytest.raises(QuotaExceeded) as exception_info:
+        quota.check(database_api, user_id, 2)
+    assert exception_info.value.code == 429
+    assert exception_info.value.retry_after_seconds == pytest.approx(2.0)
+    assert _retry_after(exception_info.value) == '2'
+
+    # the failed request did not take any tokens, so half a second later one and a half token is missing
+    clock.now += 0.5
+    with pytest.raises(QuotaExceeded) as exception_info:
+        quota.check(database_api, user_id, 2)
+    assert exception_info.value.retry_after_seconds == pytest.approx(1.5)
+    assert _retry_after(exception_info.value) == '2'
+
+    clock.now += 1.5
+    quota.check(database_api, user_id, 2)
+
+    # the bucket is never filled beyond the burst
+    clock.now += 3600
+    quota.check(database_api, user_id, 3)
+    with pytest.raises(QuotaExceeded):
+        quota.check(database_api, user_id, 1)
+
+
+def test_token_buckets_are_per_user(database_api, user_id, clock):
+    other_user_id = database_api.create_user('other', 'https://agency.example/')
+    quota = SubmissionQuota(None, 60, 2, None, None)
+
+    quota.check(database_api, user_id, 2)
+    quota.check(database_api, other_user_id, 2)
+    with pytest.raises(QuotaExceeded):
+        quota.check(database_api, user_id, 1)
+
+
+def test_request_larger_than_burst_is_rejected(database_api, user_id, clock):
+    quota = SubmissionQuota(10, 60, 5, None, None)
+
+    with pytest.raises(QuotaExceeded) as exception_info:
+        quota.check(database_api, user_id, 6)
+    # waiting does not help
+    assert _retry_after(exception_info.value) is None
+
+
+def test_active_notebooks(database_api, user_id):
+    quota = SubmissionQuota(None, None, None, 3, None)
+    _create_notebook(database_api, user_id, 'processing', DatabaseAPI.NotebookStatus.PROCESSING)
+    _create_notebook(database_api, user_id, 'queued', DatabaseAPI.NotebookStatus.QUEUED)
+    _create_notebook(database_api, user_id, 'finished', DatabaseAPI.NotebookStatus.SUCCESS)
+
+    quota.check(database_api, user_id, 1)
+    with pytest.raises(QuotaExceeded) as exception_info:
+        quota.check(database_api, user_id, 2)
+    assert _retry_after(exception_info.value) == str(ACTIVE_NOTEBOOKS_RETRY_AFTER)
+
+
+def test_stored_bytes(database_api, user_id):
+    quota = SubmissionQuota(None, None, None, None, 1000)
+    _create_notebook(database_api, user_id, 'notebook', DatabaseAPI.NotebookStatus.SUCCESS)
+
+    database_api.add_stored_bytes('notebook', 999)
+    quota.check(database_api, user_id, 1)
+    database_api.add_stored_bytes('notebook', 1)
+    with pytest.raises(QuotaExceeded) as exception_info:
+        quota.check(database_api, user_id, 1)
+    assert _retry_after(exception_info.value) is None
+
+
+def test_retry_after_is_rounded_up():
+    assert QuotaExceeded('quota', retry_after=0.1).get_response().headers['Retry-After'] == '1'
+    assert QuotaExceeded('quota', retry_after=2.01).get_response().headers['Retry-After'] == '3'
@@ -0,0 +1,118 @@
+import io
+import os
+import zipfile
+
+from cc_jupyter_service.common import json_codec
+from cc_jupyter_service.common.result_archive import iter_result_archive, choose_compress_type, MANIFEST_FILENAME, \
+    COMPRESSION_SAMPLE_SIZE
+
+COMPRESSIBLE_RESULT = b'{"cells": []}' + b' ' * (3 * COMPRESSION_SAMPLE_SIZE)
+# random bytes do not shrink, like base64 encoded images in a result
+INCOMPRESSIBLE_RESULT = os.urandom(3 * COMPRESSION_SAMPLE_SIZE)
+
+
+class FakeNotebook:
+    def __init__(self, notebook_id, notebook_filename, status='success', execution_time=1600000000):
+        self.notebook_id = notebook_id
+        self.notebook_filename = notebook_filename
+        self.status = status
+        self.execution_time = execution_time
+
+    def get_result_id(self):
+        return 'result-' + self.notebook_id
+
+    def get_filename_without_ext(self):
+        return self.notebook_filename[:-len('.ipynb')]
+
+
+class FakeNotebookDatabase:
+    """
+    Serves the result files in blocks, like the notebook database reads them from disk.
+    """
+    BLOCK_SIZE = 10000
+
+    def __init__(self, results):
+        self.results = results
+
+    def check_notebook(self, notebook_id, is_result=False):
+        return is_result and notebook_id in self.results
+
+    def get_notebook_size(self, notebook_id, is_result=False):
+        return len(self.results[notebook_id])
+
+    def iter_notebook_file(self, notebook_id, is_result=False):
+        data = self.results[notebook_id]
+        for start in range(0, len(data), FakeNotebookDatabase.BLOCK_SIZE):
+            yield data[start:start + FakeNotebookDatabase.BLOCK_SIZE]
+
+
+def _read_archive(notebook_database, notebooks):
+    chunks = list(iter_result_archive(notebook_database, notebooks))
+    assert all(chunks)
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+def test_choose_compress_type():
+    assert choose_compress_type(b'') == zipfile.ZIP_STORED
+    assert choose_compress_type(COMPRESSIBLE_RESULT) == zipfile.ZIP_DEFLATED
+    assert choose_compress_type(INCOMPRESSIBLE_RESULT) == zipfile.ZIP_STORED
+
+
+def test_results_are_stored_or_deflated():
+    notebook_database = FakeNotebookDatabase({
+        'result-text': COMPRESSIBLE_RESULT,
+        'result-images': INCOMPRESSIBLE_RESULT
+    })
+    notebooks = [FakeNotebook('text', 'text.ipynb'), FakeNotebook('images', 'images.ipynb')]
+
+    with _read_archive(notebook_database, notebooks) as archive:
+        assert archive.testzip() is None
+        text_info = archive.getinfo('textResult.ipynb')
+        images_info = archive.getinfo('imagesResult.ipynb')
+        assert text_info.compress_type == zipfile.ZIP_DEFLATED
+        assert text_info.compress_size < text_info.file_size
+        assert images_info.compress_type == zipfile.ZIP_STORED
+        assert images_info.compress_size == len(INCOMPRESSIBLE_RESULT)
+        assert archive.read('textResult.ipynb') == COMPRESSIBLE_RESULT
+        assert archive.read('imagesResult.ipynb') == INCOMPRESSIBLE_RESULT
+        assert archive.namelist()[-1] == MANIFEST_FILENAME
+
+
+def test_manifest_lists_every_notebook():
+    notebook_database = FakeNotebookDatabase({
+        'result-first': COMPRESSIBLE_RESULT,
+        'result-second': b'{}'
+    })
+    notebooks = [
+        FakeNotebook('first', 'sweep.ipynb'),
+        FakeNotebook('second', 'sweep.ipynb', execution_time=1600000100),
+        FakeNotebook('failed', 'broken.ipynb', status='failure')
+    ]
+
+    with _read_archive(notebook_database, notebooks) as archive:
+        manifest = json_codec.loads(archive.read(MANIFEST_FILENAME))
+        # the result of the second notebook with the same filename is stored under a path containing its id
+        assert archive.read('sweepResult_second.ipynb') == b'{}'
+
+    assert manifest == {'notebooks': [
+        {
+            'notebookId': 'first', 'filename': 'sweep.ipynb', 'status': 'success', 'executionTime': 1600000000,
+            'path': 'sweepResult.ipynb'
+        },
+        {
+            'notebookId': 'second', 'filename': 'sweep.ipynb', 'status': 'success', 'executionTime': 1600000100,
+            'path': 'sweepResult_second.ipynb'
+        },
+        {
+            'notebookId': 'failed', 'filename': 'broken.ipynb', 'status': 'failure', 'executionTime': 1600000000,
+            'path': None
+        }
+    ]}
+
+
+def test_archive_without_results_contains_the_manifest():
+    with _read_archive(FakeNotebookDatabase({}), [FakeNotebook('queued', 'queued.ipynb', status='queued')]) as archive:
+        assert archive.namelist() == [MANIFEST_FILENAME]
+        manifest = json_codec.loads(archive.read(MANIFEST_FILENAME))
+
+    assert [entry['path'] for entry in manifest['notebooks']] == [None]
@@ -0,0 +1,141 @@
+import io
+import os
+import zipfile
+
+from cc_jupyter_service.common import json_codec
+from cc_jupyter_service.common.notebook_database import NotebookDatabase
+from cc_jupyter_service.common.result_archive import iter_result_archive, MANIFEST_FILENAME
+from cc_jupyter_service.common.result_index import dump_indexed, BLOB_REFERENCE_PREFIX
+
+LARGE_TEXT = 'large output ' * 100
+
+
+def _notebook():
+    return {
+        'cells': [
+            {
+                'cell_type': 'markdown',
+                'metadata': {},
+                'source': '# Überschrift ✓'
+            },
+            {
+                'cell_type': 'code',
+                'execution_count': 1,
+                'metadata': {'tags': ['parameters']},
+                'source': ['a = 1\n', 'print(a)'],
+                'outputs': [
+                    {'output_type': 'stream', 'name': 'stdout', 'text': LARGE_TEXT},
+                    {
+                        'output_type': 'display_data',
+                        'metadata': {},
+                        'data': {'text/plain': 'small', 'text/html': '<p>{}</p>'.format(LARGE_TEXT)}
+                    },
+                    {'output_type': 'execute_result', 'execution_count': 1, 'metadata': {}, 'data': {'x': 1.5}}
+                ]
+            },
+            {
+                'cell_type': 'code',
+                'execution_count': None,
+                'metadata': {},
+                'source': '',
+                'outputs': []
+            }
+        ],
+        'metadata': {'kernelspec': {'name': 'python3', 'display_name': 'Python 3', 'language': 'python'}},
+        'nbformat': 4,
+        'nbformat_minor': 4
+    }
+
+
+class FakeNotebook:
+    def __init__(self, notebook_id, notebook_filename, execution_time=1600000000):
+        self.notebook_id = notebook_id
+        self.notebook_filename = notebook_filename
+        self.status = 'success'
+        self.execution_time = execution_time
+
+    def get_result_id(self):
+        return self.notebook_id
+
+    def get_filename_without_ext(self):
+        return self.notebook_filename[:-len('.ipynb')]
+
+
+def test_dump_indexed_matches_dumps(json_backend):
+    notebook = _notebook()
+    file = io.BytesIO()
+
+    cell_entries = dump_indexed(notebook, file)
+
+    data = file.getvalue()
+    assert data == json_codec.dumps(notebook)
+    assert len(cell_entries) == len(notebook['cells'])
+    for cell, cell_entry in zip(notebook['cells'], cell_entries):
+        assert json_codec.loads(data[cell_entry.offset:cell_entry.offset + cell_entry.length]) == cell
+        source = data[cell_entry.source_offset:cell_entry.source_offset + cell_entry.source_length]
+        assert json_codec.loads(source) == cell['source']
+        for output, output_entry in zip(cell.get('outputs', []), cell_entry.outputs):
+            assert json_codec.loads(data[output_entry.offset:output_entry.offset + output_entry.length]) == output
+
+
+def test_dump_indexed_without_cells(json_backend):
+    file = io.BytesIO()
+
+    assert dump_indexed({'metadata': {}}, file) == []
+    assert file.getvalue() == json_codec.dumps({'metadata': {}})
+
+
+def test_blob_round_trip(json_backend, tmp_path):
+    notebook = _notebook()
+    notebook_database = NotebookDatabase(str(tmp_path), blob_threshold=len(LARGE_TEXT))
+
+    size, cell_entries = notebook_database.save_indexed_notebook(notebook, 'notebook-id')
+
+    blob_references = notebook_database.get_blob_references('notebook-id')
+    assert [blob_reference.mime_type for blob_reference in blob_references] == ['text/plain', 'text/html']
+
+    # the notebook file contains the reference strings and the blob files contain the serialized output data
+    references = notebook_database.read_ranges(
+        'notebook-id', [(blob_reference.offset, blob_reference.length) for blob_reference in blob_references]
+    )
+    for blob_reference, reference in zip(blob_references, references):
+        assert json_codec.loads(reference) == BLOB_REFERENCE_PREFIX + blob_reference.blob_key
+        with notebook_database.open_blob(blob_reference.blob_key) as blob_file:
+            assert len(blob_file.read()) == blob_reference.blob_size
+
+    # the positions of the cells without blobs can be read directly
+    markdown_entry = cell_entries[0]
+    cell, = notebook_database.read_ranges('notebook-id', [(markdown_entry.offset, markdown_entry.length)])
+    assert json_codec.loads(cell) == notebook['cells'][0]
+
+    full_notebook = b''.join(notebook_database.iter_notebook_file('notebook-id', is_result=True))
+    assert full_notebook == json_codec.dumps(notebook)
+    # the saved size includes the reference strings in the notebook file
+    file_size = os.path.getsize(notebook_database.notebook_id_to_path('notebook-id', True))
+    assert size == file_size + sum(blob_reference.blob_size for blob_reference in blob_references)
+    assert notebook_database.get_notebook_size('notebook-id', is_result=True) == len(full_notebook)
+    assert notebook_database.get_notebook('notebook-id', is_result=True) == notebook
+
+
+def test_result_archive(json_backend, tmp_path):
+    notebook = _notebook()
+    notebook_database = NotebookDatabase(str(tmp_path), blob_threshold=len(LARGE_TEXT))
+    notebook_database.save_indexed_notebook(notebook, 'with-blobs')
+    notebook_database.save_indexed_notebook({'cells': [], 'metadata': {}}, 'small')
+    notebooks = [
+        FakeNotebook('with-blobs', 'analysis.ipynb'),
+        FakeNotebook('small', 'analysis.ipynb'),
+        FakeNotebook('without-result', 'missing.ipynb')
+    ]
+
+    data = b''.join(iter_result_archive(notebook_database, notebooks))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.read('analysisResult.ipynb') == json_codec.dumps(notebook)
+        assert json_codec.loads(archive.read('analysisResult_small.ipynb')) == {'cells': [], 'metadata': {}}
+        manifest = json_codec.loads(archive.read(MANIFEST_FILENAME))
+
+    assert [entry['path'] for entry in manifest['notebooks']] == [
+        'analysisResult.ipynb', 'analysisResult_small.ipynb', None
+    ]
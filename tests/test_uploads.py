@@ -0,0 +1,107 @@
+import hashlib
+import io
+import os
+
+import nbformat
+import pytest
+
+from cc_jupyter_service.common import json_codec
+from cc_jupyter_service.service import app as app_module
+from cc_jupyter_service.service import db as database_module
+from cc_jupyter_service.service.db import DatabaseAPI
+
+
+def _notebook_file(source):
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells.append(nbformat.v4.new_code_cell(source, id='cell'))
+    data = json_codec.dumps(notebook)
+    return hashlib.sha256(data).hexdigest(), data
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """
+    Creates the service with an empty database. Returns the flask app, a test client logged in as a new user and the
+    id of this user.
+    """
+    monkeypatch.setattr(app_module.conf, 'notebook_directory', str(tmp_path / 'notebooks'))
+    app = app_module.create_app()
+    app.config.update(DATABASE=str(tmp_path / 'service.sqlite'), TESTING=True)
+    with app.app_context():
+        database_module.init_db()
+        user_id = DatabaseAPI.create().create_user('user', 'https://agency.example/')
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return app, client, user_id
+
+
+def _upload(client, files):
+    return client.post('/uploads', data={
+        content_hash: (io.BytesIO(data), 'notebook.ipynb') for content_hash, data in files
+    }, content_type='multipart/form-data')
+
+
+def _stored_bytes(app, user_id):
+    with app.app_context():
+        return DatabaseAPI.create().get_stored_bytes(user_id)
+
+
+def test_upload_is_stored_once(service, monkeypatch):
+    app, client, user_id = service
+    spooled = []
+    open_upload_spool = app_module.NotebookDatabase.open_upload_spool
+
+    def counting_open_upload_spool(notebook_database):
+        spool = open_upload_spool(notebook_database)
+        spooled.append(spool)
+        return spool
+
+    monkeypatch.setattr(app_module.NotebookDatabase, 'open_upload_spool', counting_open_upload_spool)
+    first = _notebook_file('a = 1')
+    second = _notebook_file('b = 2' * 100000)
+
+    response = _upload(client, [first, second])
+
+    assert response.status_code == 200
+    assert sorted(response.get_json()['contentHashes']) == sorted([first[0], second[0]])
+    # every part is written to its spool in the upload directory, which is renamed to the final path
+    assert sorted(spool.size for spool in spooled) == sorted([len(first[1]), len(second[1])])
+    upload_directory = os.path.join(app_module.conf.notebook_directory, 'uploads')
+    assert sorted(os.listdir(upload_directory)) == sorted(['{}.ipynb'.format(first[0]), '{}.ipynb'.format(second[0])])
+    assert _stored_bytes(app, user_id) == len(first[1]) + len(second[1])
+
+    # uploading a file again does not count it twice
+    assert _upload(client, [first]).status_code == 200
+    assert _stored_bytes(app, user_id) == len(first[1]) + len(second[1])
+
+
+def test_invalid_upload_is_discarded(service):
+    app, client, user_id = service
+    content_hash, data = _notebook_file('a = 1')
+
+    response = _upload(client, [(hashlib.sha256(b'other').hexdigest(), data)])
+
+    assert response.status_code == 400
+    assert os.listdir(os.path.join(app_module.conf.notebook_directory, 'uploads')) == []
+    assert _stored_bytes(app, user_id) == 0
+
+
+def test_expired_uploads_are_removed(service, clock, monkeypatch):
+    app, client, user_id = service
+    monkeypatch.setattr(app_module.conf, 'upload_retention', 60)
+    old = _notebook_file('a = 1')
+    kept = _notebook_file('b = 2')
+    new = _notebook_file('c = 3')
+    assert _upload(client, [old, kept]).status_code == 200
+
+    clock.now += 30
+    assert _upload(client, [kept]).status_code == 200
+    clock.now += 40
+    assert _upload(client, [new]).status_code == 200
+
+    upload_directory = os.path.join(app_module.conf.notebook_directory, 'uploads')
+    assert sorted(os.listdir(upload_directory)) == sorted(['{}.ipynb'.format(kept[0]), '{}.ipynb'.format(new[0])])
+    assert _stored_bytes(app, user_id) == len(kept[1]) + len(new[1])
+    missing_hashes = client.post('/uploads/missing', json={'contentHashes': [old[0], kept[0]]}).get_json()
+    assert missing_hashes == {'missingHashes': [old[0]]}
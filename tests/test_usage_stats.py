@@ -0,0 +1,127 @@
+import pytest
+
+from cc_jupyter_service.common.usage_stats import aggregate_usage, runtime_bucket, bucket_upper_bound, UsageRollup, \
+    RuntimeBucket
+from cc_jupyter_service.service.db import DatabaseAPI
+
+# the time of the clock fixture
+START_TIME = 1600000000.0
+DAY = '2020-09-13'
+
+
+@pytest.fixture
+def user_id(database_api):
+    return database_api.create_user('user', 'https://agency.example/')
+
+
+def _start_notebook(database_api, user_id, notebook_id, gpu_count=0):
+    database_api.create_notebook(
+        notebook_id, 'token', user_id, 'experiment', 'notebook.ipynb', 0, 'https://agency.example/',
+        docker_image='image', gpu_count=gpu_count
+    )
+    database_api.record_lifecycle_event(notebook_id, 'started', START_TIME)
+
+
+def _rollups(database_api):
+    return {
+        rollup.status: (rollup.notebook_count, rollup.runtime_count, rollup.runtime_sum, rollup.gpu_seconds)
+        for rollup in database_api.get_usage_rollups(DAY)
+    }
+
+
+def _runtime_buckets(database_api):
+    return {
+        (runtime_bucket_entry.status, runtime_bucket_entry.bucket): runtime_bucket_entry.notebook_count
+        for runtime_bucket_entry in database_api.get_runtime_buckets(DAY)
+    }
+
+
+def test_rollup_counts_after_result_and_cancel(database_api, user_id, clock):
+    _start_notebook(database_api, user_id, 'succeeded', gpu_count=2)
+    _start_notebook(database_api, user_id, 'failed')
+    _start_notebook(database_api, user_id, 'cancelled')
+
+    clock.now = START_TIME + 10
+    database_api.update_notebook_status('succeeded', DatabaseAPI.NotebookStatus.SUCCESS)
+    clock.now = START_TIME + 20
+    database_api.update_notebook_status('failed', DatabaseAPI.NotebookStatus.FAILURE)
+    clock.now = START_TIME + 30
+    assert database_api.cancel_processing_notebooks(['cancelled', 'succeeded']) == {'cancelled'}
+    # a repeated status report does not count the notebook again
+    database_api.update_notebook_status('succeeded', DatabaseAPI.NotebookStatus.SUCCESS)
+
+    assert _rollups(database_api) == {
+        'success': (1, 1, 10.0, 20.0),
+        'failure': (1, 1, 20.0, 0.0),
+        'cancelled': (1, 1, 30.0, 0.0)
+    }
+    assert _runtime_buckets(database_api) == {
+        ('success', runtime_bucket(10)): 1,
+        ('failure', runtime_bucket(20)): 1,
+        ('cancelled', runtime_bucket(30)): 1
+    }
+
+
+def test_dequeued_notebooks_have_no_runtime(database_api, user_id, clock):
+    database_api.create_notebook(
+        'queued', None, user_id, None, 'notebook.ipynb', 0, 'https://agency.example/',
+        status=DatabaseAPI.NotebookStatus.QUEUED, docker_image='image'
+    )
+    database_api.queue_notebook('queued', user_id, {})
+
+    assert database_api.dequeue_notebooks(['queued'], DatabaseAPI.NotebookStatus.CANCELLED) == {'queued'}
+
+    assert _rollups(database_api) == {'cancelled': (1, 0, 0.0, 0.0)}
+    assert _runtime_buckets(database_api) == {}
+
+
+def test_rollups_are_filtered_by_day_and_user(database_api, user_id, clock):
+    other_user_id = database_api.create_user('other', 'https://agency.example/')
+    _start_notebook(database_api, user_id, 'today')
+    _start_notebook(database_api, other_user_id, 'other')
+    database_api.update_notebook_status('today', DatabaseAPI.NotebookStatus.SUCCESS)
+    database_api.update_notebook_status('other', DatabaseAPI.NotebookStatus.SUCCESS)
+
+    assert len(database_api.get_usage_rollups(DAY)) == 2
+    assert [rollup.user_id for rollup in database_api.get_usage_rollups(DAY, other_user_id)] == [other_user_id]
+    assert database_api.get_usage_rollups('2020-09-14') == []
+    assert database_api.get_runtime_buckets('2020-09-14') == []
+
+
+def test_runtime_buckets():
+    assert runtime_bucket(0) == 0
+    assert runtime_bucket(1) == 0
+    assert runtime_bucket(2) == 4
+    assert runtime_bucket(10 ** 9) == runtime_bucket(10 ** 12)
+    for runtime in [1.5, 10, 3600, 86400]:
+        bucket = runtime_bucket(runtime)
+        assert bucket_upper_bound(bucket - 1) < runtime <= bucket_upper_bound(bucket)
+
+
+def test_aggregate_usage():
+    rollups = [
+        UsageRollup(1, 'image-a', DAY, 'success', 3, 3, 30.0, 7200.0),
+        UsageRollup(1, 'image-a', DAY, 'failure', 1, 1, 100.0, 0.0),
+        UsageRollup(2, 'image-b', DAY, 'success', 2, 2, 4.0, 0.0)
+    ]
+    runtime_buckets = [
+        RuntimeBucket(1, 'image-a', DAY, 'success', runtime_bucket(10), 3),
+        RuntimeBucket(1, 'image-a', DAY, 'failure', runtime_bucket(100), 1),
+        RuntimeBucket(2, 'image-b', DAY, 'success', runtime_bucket(2), 2)
+    ]
+
+    by_user = aggregate_usage(rollups, runtime_buckets, ['user'], {1: 'alice'})
+
+    assert [group.key for group in by_user] == [{'user': '2'}, {'user': 'alice'}]
+    alice = by_user[1].to_json()
+    assert alice['notebookCount'] == 4
+    assert alice['statusCounts'] == {'success': 3, 'failure': 1}
+    assert alice['failureRate'] == 0.25
+    assert alice['runtime']['mean'] == 32.5
+    assert alice['runtime']['p50'] == bucket_upper_bound(runtime_bucket(10))
+    assert alice['runtime']['p95'] == bucket_upper_bound(runtime_bucket(100))
+    assert alice['gpuHours'] == 2.0
+
+    everything, = aggregate_usage(rollups, runtime_buckets, [], {})
+    assert everything.key == {}
+    assert everything.to_json()['notebookCount'] == 6
@@ -0,0 +1,76 @@
+import nbformat
+import pytest
+
+from cc_jupyter_service.common import validation
+from cc_jupyter_service.common.validation import NotebookValidator
+
+
+def _notebook(source):
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells.append(nbformat.v4.new_code_cell(source))
+    return nbformat.from_dict(notebook)
+
+
+INVALID_NOTEBOOK = {'cells': 'invalid', 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 4}
+
+
+@pytest.fixture
+def count_serializations(monkeypatch):
+    serialized = []
+    serialize_notebook = validation.serialize_notebook
+
+    def counting_serialize_notebook(notebook_data):
+        serialized.append(notebook_data)
+        return serialize_notebook(notebook_data)
+
+    monkeypatch.setattr(validation, 'serialize_notebook', counting_serialize_notebook)
+    return serialized
+
+
+def test_validation_results_are_cached():
+    validator = NotebookValidator(cache_size=16, parallel_threshold=100, max_processes=1)
+    valid_notebook = _notebook('a = 1')
+
+    errors = validator.validate_notebooks([valid_notebook, INVALID_NOTEBOOK])
+    assert errors[0] is None
+    assert errors[1] is not None
+
+    error = validator.cache.get(validation.notebook_hash(validation.serialize_notebook(INVALID_NOTEBOOK)))
+    assert error == errors[1]
+    assert validator.cache.get(validation.notebook_hash(validation.serialize_notebook(valid_notebook))) is None
+
+
+def test_disabled_cache_does_not_serialize(count_serializations):
+    validator = NotebookValidator(cache_size=0, parallel_threshold=100, max_processes=1)
+
+    errors = validator.validate_notebooks([_notebook('a = 1'), INVALID_NOTEBOOK])
+
+    assert errors[0] is None
+    assert errors[1] is not None
+    assert count_serializations == []
+
+
+def test_content_hashes_are_used_as_keys(count_serializations):
+    validator = NotebookValidator(cache_size=16, parallel_threshold=100, max_processes=1)
+
+    errors = validator.validate_notebooks([INVALID_NOTEBOOK], ['content-hash'])
+
+    assert count_serializations == []
+    assert validator.cache.get('content-hash') == errors[0]
+
+
+def test_parallel_validation_uses_spawned_processes():
+    validator = NotebookValidator(cache_size=16, parallel_threshold=2, max_processes=2)
+    # the pool is only created, when notebooks are validated in parallel
+    validator.validate_notebooks([_notebook('a = 1')])
+    assert validator._pool is None
+    try:
+        errors = validator.validate_notebooks([_notebook('a = 1'), INVALID_NOTEBOOK, _notebook('b = 2')])
+        assert validator._pool._mp_context.get_start_method() == 'spawn'
+    finally:
+        validator.shutdown()
+    assert validator._pool is None
+
+    assert errors[0] is None
+    assert errors[1] is not None
+    assert errors[2] is None